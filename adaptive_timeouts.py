@@ -0,0 +1,131 @@
+"""
+基于耗时分布的自适应超时
+按阶段（等待处理、页面导航、文件选择框）记录最近的耗时，超时取 p99 × 系数，
+并限制在下限和上限之间；样本不足时使用原来的固定超时
+
+大图本来就慢：记录耗时的同时记录文件大小，比同类图片大的文件按比例放宽超时，
+避免把正常的慢任务误判为卡住
+
+超时的任务不知道真实耗时，按超时值记一个样本（真实耗时至少这么长）；连续超时时超时加倍，
+直到上限——服务整体变慢时超时能跟着变长，不会停在下限附近把所有任务都判为超时
+"""
+import statistics
+from collections import deque
+from typing import Dict, Optional
+
+
+class LatencyTracker:
+    """分阶段的滚动耗时分布"""
+
+    # 阶段 -> (下限, 上限, 样本不足时的默认值)，单位秒
+    STAGE_LIMITS = {
+        'processing': (30.0, 240.0, 120.0),
+        'navigation': (10.0, 60.0, 30.0),
+        'file_chooser': (3.0, 20.0, 10.0),
+    }
+
+    def __init__(self, window: int = 200, percentile: float = 0.99, factor: float = 2.0,
+                 min_samples: int = 10, max_size_scale: float = 3.0,
+                 hedge_percentile: float = 0.95, hedge_factor: float = 1.5):
+        """
+        Args:
+            window: 每个阶段保留的最近样本数
+            percentile: 计算超时所用的分位数
+            factor: 超时 = 分位数耗时 × factor
+            min_samples: 样本数达到该值后才使用自适应超时
+            max_size_scale: 大文件放宽超时的最大倍数
+            hedge_percentile: 计算重复提交时机所用的分位数
+            hedge_factor: 耗时超过 分位数耗时 × hedge_factor 时重复提交
+        """
+        self.window = window
+        self.percentile = percentile
+        self.factor = factor
+        self.min_samples = min_samples
+        self.max_size_scale = max_size_scale
+        self.hedge_percentile = hedge_percentile
+        self.hedge_factor = hedge_factor
+        self._samples: Dict[str, deque] = {}
+        self._weights: Dict[str, deque] = {}
+        self._timeouts: Dict[str, int] = {}  # 阶段 -> 连续超时次数
+
+    def record(self, stage: str, seconds: float, weight: Optional[float] = None):
+        """
+        记录一次耗时
+
+        Args:
+            stage: 阶段名
+            seconds: 耗时（秒）
+            weight: 任务大小（例如文件字节数），用于按大小放宽超时
+        """
+        self._samples.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+        if weight:
+            self._weights.setdefault(stage, deque(maxlen=self.window)).append(weight)
+        self._timeouts[stage] = 0
+
+    def record_timeout(self, stage: str, seconds: float, weight: Optional[float] = None):
+        """
+        记录一次超时：按超时值记为样本，并累计连续超时次数
+
+        Args:
+            stage: 阶段名
+            seconds: 当时使用的超时（秒）
+            weight: 任务大小
+        """
+        self.record(stage, seconds, weight)
+        self._timeouts[stage] = self._timeouts.get(stage, 0) + 1
+
+    def ceiling(self, stage: str) -> float:
+        """阶段超时的上限（秒）"""
+        return self.STAGE_LIMITS.get(stage, (1.0, 600.0, 60.0))[1]
+
+    def quantile(self, stage: str, q: float) -> Optional[float]:
+        """阶段耗时的分位数；样本不足时返回 None"""
+        samples = self._samples.get(stage)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def _size_scale(self, stage: str, weight: Optional[float]) -> float:
+        weights = self._weights.get(stage)
+        if not weight or not weights:
+            return 1.0
+        return min(self.max_size_scale, max(1.0, weight / statistics.median(weights)))
+
+    def timeout(self, stage: str, weight: Optional[float] = None, default: Optional[float] = None) -> float:
+        """
+        阶段超时（秒）
+
+        Args:
+            stage: 阶段名
+            weight: 当前任务大小
+            default: 样本不足时的超时（默认使用 STAGE_LIMITS 中的默认值）
+        """
+        floor, ceiling, stage_default = self.STAGE_LIMITS.get(stage, (1.0, 600.0, 60.0))
+        value = self.quantile(stage, self.percentile)
+        if value is None:
+            return default if default is not None else stage_default
+        scaled = value * self.factor * self._size_scale(stage, weight)
+        # 连续超时：每次加倍（退避到上限）
+        scaled *= 2 ** min(self._timeouts.get(stage, 0), 10)
+        return min(ceiling, max(floor, scaled))
+
+    def hedge_delay(self, stage: str, weight: Optional[float] = None) -> Optional[float]:
+        """等待多久后重复提交（远超同类任务的耗时）；样本不足时返回 None"""
+        value = self.quantile(stage, self.hedge_percentile)
+        if value is None:
+            return None
+        return value * self.hedge_factor * self._size_scale(stage, weight)
+
+    def snapshot(self) -> dict:
+        """各阶段的样本数、中位数、p99 和当前超时"""
+        result = {}
+        for stage, samples in self._samples.items():
+            result[stage] = {
+                'samples': len(samples),
+                'p50': statistics.median(samples),
+                'p99': self.quantile(stage, 0.99),
+                'timeout': self.timeout(stage),
+                'consecutive_timeouts': self._timeouts.get(stage, 0),
+            }
+        return result
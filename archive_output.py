@@ -0,0 +1,362 @@
+"""
+归档输出
+结果不再逐个写成文件，而是在完成时直接流式写入 ZIP 或 tar 归档，交给阅卷系统时不必再手动打包上千个小文件：
+
+- 每张结果只在内存中停留一次写入的时间，不产生中间文件；大文件（拼接结果、多页文档）按块复制
+- 归档达到大小或数量上限时自动换下一个文件
+- 写入中的归档带 .partial 后缀，旁边的日志文件逐条记录每个条目对应的源文件；
+  正常关闭时把日志作为 index.jsonl 写入归档末尾并去掉 .partial 后缀
+- 中断运行留下的 .partial 归档可以恢复：保留校验通过的完整条目，补写索引后得到正常的归档
+"""
+import argparse
+import io
+import json
+import struct
+import tarfile
+import threading
+import time
+import zipfile
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+ARCHIVE_FORMATS = {'zip': '.zip', 'tar': '.tar'}
+PARTIAL_SUFFIX = ".partial"
+JOURNAL_SUFFIX = ".jsonl"  # 写入中的条目日志：<归档>.partial.jsonl
+INDEX_NAME = "index.jsonl"
+
+_ZIP_LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+_ZIP_LOCAL_SIGNATURE = b'PK\x03\x04'
+
+
+def split_entry(location) -> Tuple[Path, str]:
+    """把 "<归档路径>/<条目名>" 拆成归档路径和条目名"""
+    location = Path(location)
+    for archive in location.parents:
+        if archive.suffix in ARCHIVE_FORMATS.values():
+            return archive, location.relative_to(archive).as_posix()
+    raise ValueError(f"不是归档中的条目: {location}")
+
+
+def read_entry(archive: Path, name: str) -> bytes:
+    """读取已关闭归档中的一个条目"""
+    if archive.suffix == '.zip':
+        with zipfile.ZipFile(archive) as zf:
+            return zf.read(name)
+    with tarfile.open(archive, 'r:') as tf:
+        return tf.extractfile(name).read()
+
+
+class ArchiveSink:
+    """把结果流式写入 ZIP / tar 归档，按大小或数量滚动到下一个归档（线程安全）"""
+
+    def __init__(self, output_dir: str, format: str = 'zip', prefix: str = "去手写结果",
+                 max_bytes: int = 2 * 1024 ** 3, max_entries: int = 5000):
+        """
+        Args:
+            output_dir: 归档所在文件夹
+            format: zip 或 tar
+            prefix: 归档文件名前缀
+            max_bytes: 单个归档的大小上限（字节）
+            max_entries: 单个归档的条目数上限
+        """
+        if format not in ARCHIVE_FORMATS:
+            raise ValueError(f"不支持的归档格式: {format}")
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.format = format
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.archives: List[Path] = []  # 已完成的归档
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._path: Optional[Path] = None  # 当前归档的最终文件名
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._tar: Optional[tarfile.TarFile] = None
+        self._journal = None
+        self._members: dict = {}  # 当前 tar 归档中条目的数据位置（写入期间读取重复页结果用）
+        self._entries = 0
+        self._bytes = 0
+
+    @property
+    def partial_path(self) -> Optional[Path]:
+        return self._path.with_name(self._path.name + PARTIAL_SUFFIX) if self._path else None
+
+    def _open(self):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        while True:
+            # 同一秒内开始的上一批归档可能已经占用了这个名字
+            self._sequence += 1
+            self._path = self.output_dir / f"{self.prefix}_{timestamp}_{self._sequence:03d}{ARCHIVE_FORMATS[self.format]}"
+            partial = self.partial_path
+            if not self._path.exists() and not partial.exists():
+                break
+        if self.format == 'zip':
+            # 图片本身已经压缩，直接存储
+            self._zip = zipfile.ZipFile(partial, 'w', compression=zipfile.ZIP_STORED)
+        else:
+            self._tar = tarfile.open(partial, 'w', format=tarfile.PAX_FORMAT)
+        self._journal = open(str(partial) + JOURNAL_SUFFIX, 'a', encoding='utf-8')
+        self._members = {}
+        self._entries = 0
+        self._bytes = 0
+        print(f"🗜️  开始写入归档: {self._path.name}")
+
+    def _rollover_if_needed(self, size: int):
+        if self._path is not None and self._entries and (
+                self._entries >= self.max_entries or self._bytes + size > self.max_bytes):
+            self._finish()
+        if self._path is None:
+            self._open()
+
+    def _remember_member(self, name: str, size: int):
+        # addfile 之后 offset 指向按 512 字节补齐的数据末尾（文件名含中文时头部长度不固定，只能倒推）
+        padded = (size + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE * tarfile.BLOCKSIZE
+        self._members[name] = (self._tar.offset - padded, size)
+
+    def _flush(self):
+        # 每个条目写完立即落盘，中断时最多丢失正在写的一个条目
+        (self._zip.fp if self._zip is not None else self._tar.fileobj).flush()
+
+    def _log(self, name: str, size: int, source: Optional[str]):
+        self._journal.write(json.dumps({'name': name, 'source': source, 'size': size, 'time': time.time()},
+                                       ensure_ascii=False) + "\n")
+        self._journal.flush()
+        self._entries += 1
+        self._bytes += size
+
+    def add(self, name: str, data: bytes, source: Optional[str] = None) -> Path:
+        """
+        写入一个条目
+
+        Args:
+            name: 条目名（归档内的相对路径）
+            data: 内容
+            source: 对应的源文件（写入索引）
+
+        Returns:
+            Path: "<归档路径>/<条目名>"，可用 read() 读回
+        """
+        with self._lock:
+            self._rollover_if_needed(len(data))
+            if self._zip is not None:
+                info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                self._zip.writestr(info, data)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = int(time.time())
+                self._tar.addfile(info, io.BytesIO(data))
+                self._remember_member(name, len(data))
+            self._flush()
+            self._log(name, len(data), source)
+            return self._path / name
+
+    def add_file(self, name: str, path: str, source: Optional[str] = None) -> Path:
+        """按块复制一个文件到归档（参数和返回值同 add）"""
+        size = Path(path).stat().st_size
+        with self._lock:
+            self._rollover_if_needed(size)
+            if self._zip is not None:
+                self._zip.write(path, name)
+            else:
+                info = self._tar.gettarinfo(path, name)
+                with open(path, 'rb') as f:
+                    self._tar.addfile(info, f)
+                self._remember_member(name, info.size)
+            self._flush()
+            self._log(name, size, source)
+            return self._path / name
+
+    def read(self, location) -> bytes:
+        """读回 add() 返回的条目（当前正在写入的归档也可以读取）"""
+        archive, name = split_entry(location)
+        with self._lock:
+            if archive == self._path:
+                if self._zip is not None:
+                    return self._zip.read(name)
+                offset, size = self._members[name]
+                with open(self.partial_path, 'rb') as f:
+                    f.seek(offset)
+                    return f.read(size)
+        return read_entry(archive, name)
+
+    def _finish(self):
+        """写入索引并关闭当前归档，去掉 .partial 后缀"""
+        partial = self.partial_path
+        self._journal.close()
+        journal = Path(str(partial) + JOURNAL_SUFFIX)
+        index = journal.read_bytes()
+        if self._zip is not None:
+            self._zip.writestr(zipfile.ZipInfo(INDEX_NAME, date_time=time.localtime()[:6]), index,
+                               compress_type=zipfile.ZIP_DEFLATED)
+            self._zip.close()
+        else:
+            info = tarfile.TarInfo(INDEX_NAME)
+            info.size = len(index)
+            info.mtime = int(time.time())
+            self._tar.addfile(info, io.BytesIO(index))
+            self._tar.close()
+        partial.replace(self._path)
+        journal.unlink()
+        print(f"🗜️  归档已完成: {self._path.name}（{self._entries} 个文件，{self._bytes / 1024 / 1024:.1f}MB）")
+        self.archives.append(self._path)
+        self._path = self._zip = self._tar = self._journal = None
+        self._members = {}
+
+    def close(self) -> List[Path]:
+        """关闭当前归档，返回本次写入的全部归档"""
+        with self._lock:
+            if self._path is not None:
+                self._finish()
+            return list(self.archives)
+
+
+def _iter_zip_entries(path: Path) -> Iterator[Tuple[zipfile.ZipInfo, bytes]]:
+    """顺序扫描 ZIP 的本地文件头，逐个返回内容完整、校验通过的条目（不依赖末尾的中央目录）"""
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(_ZIP_LOCAL_HEADER.size)
+            if len(header) < _ZIP_LOCAL_HEADER.size:
+                return
+            (signature, _, flags, method, mod_time, mod_date, crc,
+             compressed_size, _, name_length, extra_length) = _ZIP_LOCAL_HEADER.unpack(header)
+            # 数据描述符（大小写在数据之后）和 ZIP64 条目无法可靠地顺序扫描，到此为止
+            if signature != _ZIP_LOCAL_SIGNATURE or flags & 0x08 or compressed_size == 0xFFFFFFFF:
+                return
+            name_bytes = f.read(name_length)
+            f.read(extra_length)
+            data = f.read(compressed_size)
+            if len(data) < compressed_size:
+                return
+            if method == zipfile.ZIP_DEFLATED:
+                try:
+                    data = zlib.decompress(data, -15)
+                except zlib.error:
+                    return
+            elif method != zipfile.ZIP_STORED:
+                return
+            if zlib.crc32(data) != crc:
+                return
+            name = name_bytes.decode('utf-8' if flags & 0x800 else 'cp437')
+            date_time = (((mod_date >> 9) & 0x7F) + 1980, (mod_date >> 5) & 0x0F, mod_date & 0x1F,
+                         mod_time >> 11, (mod_time >> 5) & 0x3F, (mod_time & 0x1F) * 2)
+            yield zipfile.ZipInfo(name, date_time=date_time), data
+
+
+def _iter_tar_entries(path: Path) -> Iterator[Tuple[tarfile.TarInfo, bytes]]:
+    """逐个返回 tar 中内容完整的条目，遇到被截断的条目为止"""
+    size = path.stat().st_size
+    try:
+        with tarfile.open(path, 'r:') as tf:
+            for info in tf:
+                if not info.isfile() or info.offset_data + info.size > size:
+                    return
+                yield info, tf.extractfile(info).read()
+    except (tarfile.TarError, EOFError, OSError):
+        return
+
+
+def recover_archive(partial: Path) -> Optional[Path]:
+    """
+    恢复中断运行留下的 .partial 归档：保留完整的条目，按日志补写索引，得到正常的归档
+
+    Returns:
+        Path: 恢复后的归档（没有可恢复的条目时删除残留文件并返回 None）
+    """
+    partial = Path(partial)
+    target = partial.with_name(partial.name[:-len(PARTIAL_SUFFIX)])
+    journal = Path(str(partial) + JOURNAL_SUFFIX)
+    sources = {}
+    if journal.exists():
+        for line in journal.read_text(encoding='utf-8').splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 最后一行可能只写了一半
+            sources[record['name']] = record
+
+    rebuilt = target.with_name(target.name + ".recovering")
+    index = []
+    if target.suffix == '.zip':
+        with zipfile.ZipFile(rebuilt, 'w', compression=zipfile.ZIP_STORED) as out:
+            for info, data in _iter_zip_entries(partial):
+                if info.filename == INDEX_NAME:
+                    continue
+                out.writestr(info, data)
+                index.append(dict(sources.get(info.filename, {}), name=info.filename, size=len(data)))
+            if index:
+                out.writestr(INDEX_NAME, "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in index),
+                             compress_type=zipfile.ZIP_DEFLATED)
+    else:
+        with tarfile.open(rebuilt, 'w', format=tarfile.PAX_FORMAT) as out:
+            for info, data in _iter_tar_entries(partial):
+                if info.name == INDEX_NAME:
+                    continue
+                out.addfile(info, io.BytesIO(data))
+                index.append(dict(sources.get(info.name, {}), name=info.name, size=len(data)))
+            if index:
+                data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in index).encode('utf-8')
+                info = tarfile.TarInfo(INDEX_NAME)
+                info.size = len(data)
+                info.mtime = int(time.time())
+                out.addfile(info, io.BytesIO(data))
+
+    if index:
+        rebuilt.replace(target)
+    else:
+        rebuilt.unlink()
+    partial.unlink()
+    if journal.exists():
+        journal.unlink()
+    return target if index else None
+
+
+def recover_archives(directory: str, stale_seconds: float = 0) -> List[Tuple[Path, int]]:
+    """
+    恢复文件夹中所有中断的归档
+
+    Args:
+        directory: 归档所在文件夹
+        stale_seconds: 只恢复超过该时长未写入的归档（其他进程可能正在写入同一文件夹）
+
+    Returns:
+        list: (恢复后的归档, 条目数)
+    """
+    recovered = []
+    now = time.time()
+    for suffix in ARCHIVE_FORMATS.values():
+        for partial in sorted(Path(directory).glob(f"*{suffix}{PARTIAL_SUFFIX}")):
+            journal = Path(str(partial) + JOURNAL_SUFFIX)
+            modified = max(p.stat().st_mtime for p in (partial, journal) if p.exists())
+            if now - modified < stale_seconds:
+                continue
+            try:
+                target = recover_archive(partial)
+            except Exception as e:
+                print(f"⚠️  恢复归档失败: {partial.name} - {e}")
+                continue
+            if target is not None:
+                with (zipfile.ZipFile(target) if target.suffix == '.zip' else tarfile.open(target, 'r:')) as archive:
+                    names = archive.namelist() if target.suffix == '.zip' else archive.getnames()
+                recovered.append((target, len(names) - 1))
+    return recovered
+
+
+def main():
+    """命令行入口：恢复中断的归档"""
+    parser = argparse.ArgumentParser(description="恢复中断运行留下的 .partial 归档")
+    parser.add_argument('folder', nargs='?', default="./output", help="归档所在文件夹")
+    args = parser.parse_args()
+
+    recovered = recover_archives(args.folder)
+    for target, count in recovered:
+        print(f"✅ 已恢复 {target.name}（{count} 个文件）")
+    if not recovered:
+        print("没有需要恢复的归档")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+后台事件循环
+GUI 在一个常驻线程中运行唯一的 asyncio 事件循环，通过任务接口提交、取消和等待协程。
+浏览器客户端创建在这个循环中，可以跨多次处理复用，不必每次重新启动 Chromium 和检查登录
+"""
+import asyncio
+import concurrent.futures
+import threading
+import warnings
+from typing import Callable, Coroutine, Optional
+
+
+class BackgroundJob:
+    """提交到后台事件循环的一个任务（可在任意线程中取消、等待）"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._task: Optional[asyncio.Task] = None
+        self.future = concurrent.futures.Future()
+
+    def _start(self, coro: Coroutine):
+        self._task = self._loop.create_task(coro)
+        self._task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        if task.cancelled():
+            self.future.cancel()
+        elif task.exception() is not None:
+            self.future.set_exception(task.exception())
+        else:
+            self.future.set_result(task.result())
+
+    def cancel(self):
+        """请求取消；任务中的清理代码执行完、任务真正结束后才触发完成回调"""
+        self._loop.call_soon_threadsafe(lambda: self._task is not None and self._task.cancel())
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: Optional[float] = None):
+        """等待任务结束并返回结果（取消时抛出 concurrent.futures.CancelledError）"""
+        return self.future.result(timeout)
+
+    def add_done_callback(self, callback: Callable[['BackgroundJob'], None]):
+        """任务结束后回调（在事件循环线程中执行）"""
+        self.future.add_done_callback(lambda _: callback(self))
+
+
+class BackgroundLoop:
+    """在后台线程中常驻运行的事件循环"""
+
+    def __init__(self, name: str = "rhw-event-loop"):
+        """
+        Args:
+            name: 线程名
+        """
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def start(self):
+        """启动后台线程（等待事件循环就绪后返回）"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        # 抑制 Windows asyncio 的资源警告
+        warnings.filterwarnings('ignore', category=ResourceWarning)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            # 取消剩余任务并等待其清理完成
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, coro: Coroutine) -> BackgroundJob:
+        """提交协程，立即返回任务对象"""
+        if not self.running:
+            coro.close()
+            raise RuntimeError("后台事件循环未运行")
+        job = BackgroundJob(self.loop)
+        self.loop.call_soon_threadsafe(job._start, coro)
+        return job
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None):
+        """提交协程并阻塞等待结果（不要在事件循环线程中调用）"""
+        return self.submit(coro).result(timeout)
+
+    def call_soon(self, callback: Callable, *args):
+        """在事件循环线程中执行回调"""
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self, timeout: float = 10.0):
+        """停止事件循环（剩余任务被取消），最多等待 timeout 秒"""
+        if not self.running:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
@@ -3,6 +3,13 @@
 负责浏览器操作、图片上传下载等核心功能
 """
 import asyncio
+import functools
+import inspect
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 import sys
@@ -16,7 +23,23 @@ except ImportError:
     from playwright.async_api import async_playwright, Browser, Page, BrowserContext
     USING_PATCHRIGHT = False
 
+from adaptive_timeouts import LatencyTracker
+from archive_output import ArchiveSink, recover_archives
+from concurrency_control import AIMDController
 from cookie_manager import CookieManager
+from dedupe import find_duplicates
+from diagnostics import ImageTrace, TraceBuffer
+import document_input
+import output_encoder
+from output_layout import Manifest, OutputLayout, manifest_name
+import page_probe
+import preflight
+from qr_login import REFRESH_EXPIRED_QRCODE, LoginEventWatcher
+from resource_monitor import ResourceMonitor
+from scheduler import ImageScheduler
+import tiling
+from output_encoder import OutputOptions
+from upload_strategy import STRATEGIES, UploadStrategyLearner
 
 # Windows: 使用Proactor事件循环以支持子进程（patchright/playwright需要）
 if sys.platform.startswith('win'):
@@ -29,14 +52,37 @@ if sys.platform.startswith('win'):
 class BaiduPicFilter:
     """百度网盘试卷去手写自动化客户端"""
     
-    def __init__(self, headless: bool = False, output_dir: str = "./output", display_login_ui=None):
+    # 工作客户端从主客户端继承的配置项
+    _WORKER_SHARED_ATTRS = (
+        'base_url', 'cookie_manager', 'page_load_strategy', 'page_load_timeout', 'nav_timeout',
+        'reset_selectors', 'reset_verify_timeout', 'output_options', 'concurrency_controller',
+        'latency_tracker', 'hedging', 'upload_learner', 'resource_monitor', 'diagnostics',
+        'progress_callback', 'output_layout', 'tiling', 'tile_max_side', 'tile_max_pixels',
+    )
+    
+    def __init__(self, headless: bool = False, output_dir: str = "./output", display_login_ui=None,
+                 batch_submit_size: int = 1, concurrency: int = 1, tiling: bool = False,
+                 output_options: Optional[OutputOptions] = None, cookie_file: str = "baidu_cookies.json",
+                 adaptive_concurrency: bool = False, diagnostics: bool = False, dedupe: bool = False,
+                 output_layout: str = 'flat', archive_format: Optional[str] = None):
         """
         初始化客户端
         
         Args:
             headless: 是否无头模式（默认False，显示浏览器）
             output_dir: 输出文件夹路径
-            display_login_ui: 显示登录UI的回调函数（用于GUI集成）
+            display_login_ui: 显示登录UI的回调函数（用于GUI集成），以 qrcode_bytes=二维码图片字节 调用显示/更新，
+                              登录结束时以 done=True 调用关闭
+            batch_submit_size: 多文件提交时每组图片数（1 表示始终单张上传）
+            concurrency: 并行处理的页面数（用于图块、多页文档等可并行的任务）
+            tiling: 是否对超大图片启用分块处理
+            output_options: 输出编码选项（默认原样保存服务端返回的图片）
+            cookie_file: Cookie保存文件（多账号/多进程时每个账号使用独立文件）
+            adaptive_concurrency: 是否根据处理耗时和失败情况自动调整并行度（此时 concurrency 为上限）
+            diagnostics: 是否启用诊断模式（失败或过慢的图片在输出文件夹的 .diagnostics 下保存轨迹、截图和网络记录）
+            dedupe: 批量处理前是否检测近似重复的图片（每组只处理一张，结果复制给其他图片）
+            output_layout: 输出目录布局，flat 全部写入输出文件夹，mirror 按输入文件夹层级建立子文件夹
+            archive_format: 结果流式写入的归档格式（zip / tar，None 表示逐个写成文件）
         """
         self.headless = headless
         self.output_dir = Path(output_dir)
@@ -44,6 +90,7 @@ class BaiduPicFilter:
         
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
+        self.round_trips = page_probe.RoundTripCounter()  # 本客户端发出的驱动调用次数
         self.page: Optional[Page] = None
         self.base_url = "https://pan.baidu.com/aipan/uploadimg?key=ai_tools_to_write"
         
@@ -51,22 +98,163 @@ class BaiduPicFilter:
         self.display_login_ui = display_login_ui
         
         # Cookie管理
-        self.cookie_manager = CookieManager("baidu_cookies.json")
+        self.cookie_manager = CookieManager(cookie_file)
         self._logged_in = False
+        self._login_ui_shown = False
+        self._login_ui_task = None
+        
+        # 扫码登录：没有页面事件时多久检查一次二维码是否失效；二维码不是图片请求时多久重新截取一次
+        self.login_fallback_interval = 10.0
+        self.qrcode_capture_interval = 30.0
         
         # 页面加载配置（快速加载模式）
         self.page_load_strategy = 'domcontentloaded'  # 'load' 或 'domcontentloaded'，而不是 'networkidle'
         self.page_load_timeout = 30000  # 页面加载超时30秒
         self.nav_timeout = 30000  # 导航超时30秒
         
+        # 页面内重置控件（单页应用，出结果后点击"重新上传"即可回到上传状态）
+        self.reset_selectors = [
+            'text=/重新上传|再传一张|继续上传/',
+            'button:has-text("重新上传")',
+        ]
+        self.reset_verify_timeout = 5  # 重置后确认控件恢复的超时（秒）
+        
+        # 多文件提交（控件支持 multiple 时，一次交互提交一组图片）
+        self.batch_submit_size = max(1, batch_submit_size)
+        self.chunk_timeout_base = 120  # 分组处理基础超时（秒）
+        self.chunk_timeout_per_image = 20  # 每多一张图片增加的超时（秒）
+        self._multi_upload_supported: Optional[bool] = None
+        self._multi_upload_page: Optional[Page] = None
+        
+        # 并行工作页（同一浏览器上下文中的多个标签页）
+        self.concurrency = max(1, concurrency)
+        self._workers: list = []
+        self._owner: Optional['BaiduPicFilter'] = None  # 工作客户端所属的主客户端
+        self._restart_lock = asyncio.Lock()
+        
+        # 自适应并行度：批量图片经工作页池并行处理，同时在服务端处理的数量由控制器决定
+        self.concurrency_controller: Optional[AIMDController] = (
+            AIMDController(initial=1, max_limit=self.concurrency) if adaptive_concurrency else None
+        )
+        self.last_wait_outcome = 'ok'  # 最近一次等待处理的结果：ok / error / timeout
+        
+        # 自适应超时：按各阶段最近的耗时分布计算超时，样本不足时沿用上面的固定值
+        self.latency_tracker: Optional[LatencyTracker] = LatencyTracker()
+        # 重复提交：耗时远超同类图片时在备用页面上再提交一次，先出结果的为准（会多消耗一次服务端处理，默认关闭）
+        self.hedging = False
+        self._hedge_worker: Optional['BaiduPicFilter'] = None
+        self._hedge_lock = asyncio.Lock()
+        
+        # 上传方式：记住当前页面布局下成功的方式并优先使用
+        self.upload_learner = UploadStrategyLearner()
+        
+        # 资源监控：浏览器内存/页面 JS 堆超限或处理张数达到阈值时，在两张图片之间回收页面或上下文
+        self.resource_monitor: Optional[ResourceMonitor] = ResourceMonitor()
+        self._cdp_session = None
+        
+        # 诊断模式：滚动记录最近几张图片的驱动调用、网络请求和页面状态，失败或过慢时才写入磁盘
+        self.diagnostics: Optional[TraceBuffer] = (
+            TraceBuffer(self.output_dir / '.diagnostics') if diagnostics else None
+        )
+        self._trace: Optional[ImageTrace] = None
+        
+        # 超大图片分块处理
+        self.tiling = tiling
+        self.tile_max_side = 4096  # 最长边超过该值时分块
+        self.tile_max_pixels = 16_000_000  # 像素数超过该值时分块
+        self.tile_size = 2048  # 图块边长
+        self.tile_overlap = 128  # 相邻图块重叠宽度（用于羽化拼接）
+        self.cpu_workers = 2  # 切分/拼接进程数（同时也限制拼接时的内存占用）
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        
+        # 多页文档（PDF / TIFF）栅格化分辨率
+        self.document_dpi = 200
+        
+        # 输出编码（格式/质量/灰度/尺寸），在后台进程池中执行
+        self.output_options: Optional[OutputOptions] = output_options
+        self.output_workers = max(1, (os.cpu_count() or 2) - 1)
+        self._output_pool: Optional[ProcessPoolExecutor] = None
+        self._pending_outputs: set = set()
+        self.last_output_path: Optional[Path] = None  # 最近一张图片的输出路径
+        
+        # 输出目录布局（大文件夹按哈希前缀分片）和结果清单（源文件 -> 输出文件、哈希、耗时、状态）
+        self.output_layout = OutputLayout(output_layout)
+        self.keep_manifest = True
+        # 多个进程或多台电脑共用输出文件夹时设置为各自的节点名：每个节点写自己的清单文件，且不使用 WAL
+        self.manifest_node: Optional[str] = None
+        self._manifest: Optional[Manifest] = None
+        
+        # 归档输出：结果完成时直接写入 ZIP / tar 归档，按大小或数量滚动，批量结束时写入索引并关闭
+        self.archive_format = archive_format
+        self.archive_max_bytes = 2 * 1024 ** 3
+        self.archive_max_entries = 5000
+        self.archive_recover_after = 600  # 输出文件夹中超过该秒数未写入的 .partial 归档视为中断，自动恢复
+        self._archive: Optional[ArchiveSink] = None
+        
+        # 近似重复图片：每组只处理代表图片，批量结束后把结果复制给组内其他图片
+        self.dedupe = dedupe
+        self.dedupe_distance = 4  # 感知哈希汉明距离不超过该值视为重复（64 位）
+        self._representative_outputs: dict = {}  # 代表图片 -> 输出路径
+        
+        # 输入预检：上传前拒绝空文件、被截断或无法识别的图片，能修正的问题生成修正后的副本
+        self.preflight_limits: Optional[preflight.PreflightLimits] = preflight.PreflightLimits()
+        self.preflight_workers = 8  # 批量预检的线程数
+        self._preflight_results: dict = {}  # 批量预检的结果，处理到该图片时取用
+        self._preflight_dir: Optional[str] = None
+        
+        # 批量处理顺序：'sjf' 按优先级、截止时间、文件夹轮转和文件大小调度；'input' 保持输入顺序
+        self.schedule_order = 'sjf'
+        self.schedule_aging_seconds = 60.0  # 文件夹等待多久相当于提升一级优先级
+        
+        # 暂停 / 收尾：暂停时不再开始新的图片，正在处理的图片照常完成；收尾时未开始的图片留在 stats['unprocessed']
+        self._admission = asyncio.Event()
+        self._admission.set()
+        self._draining = False
+        self._unstarted: list = []  # 已从调度器取出、但因收尾没有开始的图片
+        
+        # 逐个文件的处理进度（GUI 任务表）：以事件字典调用，
+        # {'path', 'state': running/done/failed, 'stage', 'retries', 'error', 'time'}
+        self.progress_callback = None
+        self._progress_path: Optional[str] = None  # 正在处理的原始文件
+        self._progress_started: Optional[float] = None
+        self._progress_retries = 0
+        
         # 统计信息
         self.stats = {
             'total': 0,
             'success': 0,
             'failed': 0,
-            'failed_files': []
+            'failed_files': [],
+            'reset_in_place': 0,  # 页面内重置次数
+            'reset_navigate': 0,  # 整页导航次数
+            'batched_images': 0,  # 通过多文件提交完成的图片数
+            'batch_fallbacks': 0,  # 分组提交降级为单张模式的次数
+            'hedged': 0,  # 重复提交次数
+            'hedge_wins': 0,  # 重复提交先出结果的次数
+            'round_trips': 0,  # 处理图片期间的驱动往返次数
+            'probed_images': 0,  # 计入往返统计的图片数
+            'page_recycles': 0,  # 因资源占用回收页面的次数
+            'context_recycles': 0,  # 因资源占用回收浏览器上下文的次数
+            'deduplicated': 0,  # 与其他图片重复、直接复用结果的图片数
+            'preflight_fixed': 0,  # 预检时修正后继续处理的图片数
+            'rejected': [],  # 预检未通过的图片及原因
+            'unprocessed': []  # 收尾停止时尚未开始处理的图片
         }
     
+    @property
+    def page(self) -> Optional[Page]:
+        return self._page
+    
+    @page.setter
+    def page(self, value):
+        # 所有页面都经过往返计数包装
+        self._page = page_probe.wrap_page(value, self.round_trips)
+        # 换了页面：资源监控从新页面重新计数
+        monitor = getattr(self, 'resource_monitor', None)
+        self._page_images = 0
+        self._page_generation = monitor.generation if monitor is not None else 0
+        self._cdp_session = None
+    
     async def start(self):
         """启动浏览器（完整反检测）"""
         global USING_PATCHRIGHT
@@ -112,7 +300,18 @@ class BaiduPicFilter:
                 ]
             )
         
-        # 创建上下文
+        await self._open_context()
+        
+        self.page = await self.context.new_page()
+        print("✅ 浏览器已启动")
+    
+    async def _open_context(self, storage_state: Optional[dict] = None):
+        """
+        创建浏览器上下文并注入反检测脚本
+        
+        Args:
+            storage_state: 沿用的 Cookie/本地存储（回收上下文时保持登录状态）
+        """
         context_options = {
             'viewport': {'width': 1920, 'height': 1080},
             'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
@@ -131,13 +330,13 @@ class BaiduPicFilter:
                 }
             })
         
+        if storage_state is not None:
+            context_options['storage_state'] = storage_state
+        
         self.context = await self.browser.new_context(**context_options)
         
         # 注入反检测脚本
         await self._inject_stealth_scripts()
-        
-        self.page = await self.context.new_page()
-        print("✅ 浏览器已启动")
     
     async def _inject_stealth_scripts(self):
         """注入JavaScript反检测代码"""
@@ -215,7 +414,7 @@ class BaiduPicFilter:
             await self._load_cookies(saved_cookies)
             
             # 访问页面验证
-            await self.page.goto(self.base_url, wait_until='domcontentloaded', timeout=self.nav_timeout)
+            await self.page.goto(self.base_url, wait_until='domcontentloaded', timeout=self._nav_timeout_ms())
             await asyncio.sleep(2)
             
             if await self._check_login_status():
@@ -241,8 +440,8 @@ class BaiduPicFilter:
             })
         await self.context.add_cookies(cookie_list)
     
-    async def _manual_login(self):
-        """手动登录流程 - 通过点击上传按钮弹出登录框"""
+    async def _manual_login(self, timeout: float = 300):
+        """手动登录流程 - 通过点击上传按钮弹出登录框，扫码后由页面事件立即检测到登录"""
         print("\n" + "="*60)
         print("🔐 首次使用或Cookie已过期，请扫码登录")
         print("="*60)
@@ -253,126 +452,105 @@ class BaiduPicFilter:
         print("  4. 登录成功后，脚本会自动保存Cookie")
         print("="*60 + "\n")
         
-        await self.page.goto(self.base_url, wait_until='domcontentloaded', timeout=self.nav_timeout)
-        await asyncio.sleep(2)
-        
-        # 尝试点击"选择本地图片"按钮以弹出登录框
-        print("📷 点击以弹出登录框...")
+        # 先挂上监听，登录框里的二维码请求和之后的跳转都不会漏掉
+        watcher = LoginEventWatcher(self.page)
+        watcher.attach()
+        await watcher.snapshot_cookies()
         try:
-            # 方法1: 优先点击登录检查遮罩层（如果存在）来弹出登录框
-            login_mask = await self.page.query_selector('.aiTools-upload-file__login-check')
+            await self.page.goto(self.base_url, wait_until='domcontentloaded', timeout=self._nav_timeout_ms())
+            await asyncio.sleep(2)
             
-            if login_mask:
-                print("   ✓ 检测到登录检查遮罩层，点击遮罩层弹出登录框...")
-                await login_mask.click()
-                await asyncio.sleep(2)
-                print("   ✓ 登录框应该已弹出")
-            else:
-                # 方法2: 如果没有遮罩层，则点击上传按钮
-                print("   ✓ 未检测到遮罩层，点击上传按钮...")
-                upload_button = await self.page.query_selector('button.aiTools-upload-local__button')
-                
-                if upload_button:
-                    await upload_button.click()
-                    await asyncio.sleep(2)
-                    print("   ✓ 按钮已点击，登录框应该已弹出")
-                else:
-                    print("   ⚠️  未找到上传按钮，尝试导航到登录页面")
-                    # 备选方案：直接导航到登录页面
-                    await self.page.goto("https://passport.baidu.com/v3/login", wait_until='domcontentloaded', timeout=self.nav_timeout)
-                    await asyncio.sleep(2)
-        except Exception as e:
-            print(f"   ⚠️  点击出错: {e}")
-        
-        # 等待登录框出现并显示二维码
-        print("\n⏳ 等待登录框和二维码加载...")
-        qrcode_displayed = False
-        
-        for attempt in range(15):  # 尝试15次，每次2秒，共30秒
+            # 尝试点击"选择本地图片"按钮以弹出登录框
+            print("📷 点击以弹出登录框...")
             try:
-                # 检查当前URL，看是否已经跳回目标页面
-                current_url = self.page.url
-                print(f"   当前URL: {current_url[:60]}...")
-                
-                # 检查是否已跳回目标页面（登录成功的最终标志）
-                if await self._check_login_status():
-                    print("✅ 登录成功！")
-                    self._logged_in = True
-                    await self._save_cookies()
-                    return
+                # 方法1: 优先点击登录检查遮罩层（如果存在）来弹出登录框
+                login_mask = await self.page.query_selector('.aiTools-upload-file__login-check')
                 
-                # 检测二维码元素并显示
-                qrcode_elem = await self.page.query_selector('#TANGRAM__PSP_11__footerQrcodeBtn, [id*="Qrcode"], .qrcode-img, img[src*="qrcode"]')
-                
-                if qrcode_elem:
-                    is_visible = await qrcode_elem.is_visible()
-                    if is_visible:
-                        print("   ✓ 检测到二维码！")
-                        
-                        if not qrcode_displayed:
-                            # 截图二维码区域
-                            await self._capture_and_display_qrcode()
-                            qrcode_displayed = True
-                        
-                        print("\n✅ 请使用手机扫描上方二维码进行登录...")
-                        print("   (或在浏览器中输入账号密码登录)\n")
+                if login_mask:
+                    print("   ✓ 检测到登录检查遮罩层，点击遮罩层弹出登录框...")
+                    await login_mask.click()
+                    print("   ✓ 登录框应该已弹出")
+                else:
+                    # 方法2: 如果没有遮罩层，则点击上传按钮
+                    print("   ✓ 未检测到遮罩层，点击上传按钮...")
+                    upload_button = await self.page.query_selector('button.aiTools-upload-local__button')
+                    
+                    if upload_button:
+                        await upload_button.click()
+                        print("   ✓ 按钮已点击，登录框应该已弹出")
+                    else:
+                        print("   ⚠️  未找到上传按钮，尝试导航到登录页面")
+                        # 备选方案：直接导航到登录页面
+                        await self.page.goto("https://passport.baidu.com/v3/login", wait_until='domcontentloaded', timeout=self._nav_timeout_ms())
             except Exception as e:
-                pass
-            
-            # 尝试自动跳转回目标页面
-            if await self._auto_return_to_target():
-                # 重新检查登录状态
-                await asyncio.sleep(2)
-                if await self._check_login_status():
-                    print("✅ 登录成功！")
-                    self._logged_in = True
-                    await self._save_cookies()
-                    return
+                print(f"   ⚠️  点击出错: {e}")
             
-            await asyncio.sleep(3)  # 增加等待时间到3秒
-        
-        # 如果未检测到二维码，提示用户在浏览器中手动登录
-        if not qrcode_displayed:
-            print("⚠️  未能检测到二维码，请在浏览器中手动登录")
-            print("   选择'扫码登录'或输入账号密码")
+            await self._wait_for_qr_login(watcher, timeout)
+        finally:
+            watcher.detach()
+            await self._show_login_ui(done=True)
+    
+    async def _wait_for_qr_login(self, watcher: LoginEventWatcher, timeout: float):
+        """
+        等待扫码登录完成
         
-        # 等待用户完成登录（最多5分钟）
-        print("\n⏳ 等待登录完成（扫码后请稍候）...")
-        login_success = False
+        导航、登录 Cookie 写入或新二维码到达时立即检查；一段时间没有事件时检查二维码是否失效并刷新
+        """
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        shown_version = 0  # 已显示的二维码版本
+        captured = None  # 从页面截取的二维码（网络响应中没有二维码图片时使用）
+        last_capture = None
+        cookie_handled = False  # 已针对登录 Cookie 跳回过目标页面
         
-        for i in range(60):  # 最多5分钟
-            await asyncio.sleep(5)
-            
-            # 尝试自动跳转
-            await self._auto_return_to_target()
-            
-            # 检查登录状态
-            if await self._check_login_status():
-                login_success = True
-                print("✅ 检测到登录成功！")
-                break
+        print("\n⏳ 等待扫码登录（扫码后自动继续）...")
+        while loop.time() < deadline:
+            watcher.changed.clear()
             
-            # 检查是否在个人中心页面（登录成功的标志之一）
+            # 登录后的中间页（ucenter / 网盘首页）：跳回目标页面再检查
             current_url = self.page.url
-            if 'ucenter' in current_url or 'disk' in current_url:
+            if not await self._auto_return_to_target() and ('ucenter' in current_url or '/disk' in current_url):
                 print("✅ 检测到已跳转到个人中心，正在返回目标页面...")
-                await self.page.goto(self.base_url, wait_until='domcontentloaded', timeout=self.nav_timeout)
-                await asyncio.sleep(2)
-                if await self._check_login_status():
-                    login_success = True
-                    break
+                await self.page.goto(self.base_url, wait_until='domcontentloaded', timeout=self._nav_timeout_ms())
             
-            if i % 6 == 0 and i > 0:
-                print(f"   仍在等待登录... ({i*5}秒)")
-        
-        if not login_success:
-            raise Exception("登录超时（5分钟），请重新运行脚本")
-        
-        print("✅ 登录成功！")
-        self._logged_in = True
+            # 登录 Cookie 已写入但页面还停在登录框或登录页：不等页面自己跳转，直接回到目标页面确认
+            if watcher.login_cookie_seen and not cookie_handled:
+                cookie_handled = True
+                if not await self._check_login_status():
+                    print("✅ 检测到登录 Cookie，正在返回目标页面...")
+                    await self.page.goto(self.base_url, wait_until='domcontentloaded', timeout=self._nav_timeout_ms())
+            
+            if await self._check_login_status():
+                print("✅ 登录成功！")
+                self._logged_in = True
+                await self._save_cookies()
+                return
+            
+            if watcher.qrcode_version != shown_version:
+                print("   ✓ 检测到二维码！" if not shown_version else "   🔄 二维码已更新")
+                shown_version = watcher.qrcode_version
+                await self._show_qrcode(watcher.qrcode_bytes)
+            elif not shown_version and (last_capture is None or loop.time() - last_capture > self.qrcode_capture_interval):
+                # 二维码不是单独的图片请求（例如 data: 图片），直接从页面截取
+                last_capture = loop.time()
+                image_bytes = await self._capture_qrcode()
+                if image_bytes and image_bytes != captured:
+                    captured = image_bytes
+                    await self._show_qrcode(image_bytes)
+            
+            remaining = deadline - loop.time()
+            if not await watcher.wait(min(self.login_fallback_interval, max(0.0, remaining))):
+                if not cookie_handled and await watcher.poll_cookies():
+                    continue
+                try:
+                    if await self.page.evaluate(REFRESH_EXPIRED_QRCODE):
+                        print("   🔄 二维码已失效，正在刷新...")
+                        captured = None
+                        last_capture = None
+                except Exception:
+                    pass
         
-        # 保存Cookie
-        await self._save_cookies()
+        raise Exception(f"登录超时（{int(timeout // 60)}分钟），请重新运行脚本")
     
     async def _save_cookies(self):
         """保存当前Cookie"""
@@ -390,21 +568,9 @@ class BaiduPicFilter:
             if 'passport.baidu.com' in current_url or 'login' in current_url.lower():
                 return False
             
-            # 检查是否有登录按钮
-            login_button = await self.page.query_selector('text=/登录|登入/i')
-            if login_button and await login_button.is_visible():
-                return False
-            
-            # 检查是否有上传按钮（已登录的标志）
-            upload_button = await self.page.query_selector('text=/上传图片|选择本地图片/i')
-            if upload_button and await upload_button.is_visible():
-                return True
-            
-            # 如果在目标页面且没有明显登录提示，认为已登录
-            if self.base_url in current_url:
-                return True
-            
-            return False
+            # 没有可见的登录按钮，且有上传按钮或位于目标页面时认为已登录（一次探针完成全部检查）
+            state = await self._probe_page()
+            return state['loggedIn']
             
         except Exception as e:
             print(f"⚠️  检查登录状态时出错: {e}")
@@ -419,7 +585,7 @@ class BaiduPicFilter:
             if 'passport.baidu.com' in current_url and 'ucenter' in current_url:
                 print("   📍 检测到在 ucenter 页面，自动跳回目标界面...")
                 await asyncio.sleep(2)  # 等待页面稳定
-                await self.page.goto(self.base_url, wait_until='domcontentloaded', timeout=self.nav_timeout)
+                await self.page.goto(self.base_url, wait_until='domcontentloaded', timeout=self._nav_timeout_ms())
                 await asyncio.sleep(2)
                 print("   ✓ 已跳回目标界面")
                 return True
@@ -429,36 +595,595 @@ class BaiduPicFilter:
             print(f"   ⚠️  自动跳转出错: {e}")
             return False
     
-    async def process_batch(self, image_paths: list):
-        """批量处理图片"""
+    async def process_batch(self, image_paths: list, priorities: Optional[dict] = None,
+                            deadlines: Optional[dict] = None):
+        """
+        批量处理图片
+        
+        Args:
+            image_paths: 图片路径列表
+            priorities: 文件或文件夹路径 -> 优先级（越大越先处理，默认 0）
+            deadlines: 文件或文件夹路径 -> 截止时间（time.time() 时间戳），来不及时优先处理
+        """
         total = len(image_paths)
         self.stats['total'] = total  # 设置总数
         self.stats['success'] = 0  # 重置成功数
         self.stats['failed'] = 0  # 重置失败数
         self.stats['failed_files'] = []  # 重置失败文件列表
+        self.stats['reset_in_place'] = 0
+        self.stats['reset_navigate'] = 0
+        self.stats['batched_images'] = 0
+        self.stats['batch_fallbacks'] = 0
+        self.stats['hedged'] = 0
+        self.stats['hedge_wins'] = 0
+        self.stats['round_trips'] = 0
+        self.stats['probed_images'] = 0
+        self.stats['page_recycles'] = 0
+        self.stats['context_recycles'] = 0
+        self.stats['deduplicated'] = 0
+        self.stats['preflight_fixed'] = 0
+        self.stats['rejected'] = []
+        self.stats['unprocessed'] = []
+        self.start_intake()
         
         print(f"\n{'='*60}")
         print(f"📊 开始批量处理 {total} 张图片")
         print(f"{'='*60}\n")
         
-        for index, image_path in enumerate(image_paths, 1):
-            success = await self.process_image(image_path, index, total)
+        # 镜像输出时以本批图片的公共上级为根目录，图片很多的文件夹按哈希前缀分片
+        self.output_layout.plan(image_paths)
+        
+        # 并行预检全部输入，坏文件在处理到时直接记为失败
+        await self._preflight_many(image_paths)
+        
+        # 近似重复的图片只处理一张（统计总数仍按全部图片计算）
+        duplicates = {}
+        if self.dedupe and total > 1:
+            image_paths, duplicates = await self._find_duplicates(image_paths)
+            total = len(image_paths)
+        
+        # 按优先级、截止时间、文件大小和文件夹轮转决定处理顺序
+        scheduler = self._build_scheduler(image_paths, priorities, deadlines)
+        
+        if self.concurrency_controller is not None and self.batch_submit_size == 1:
+            # 自适应并行：所有图片进入工作页池，由控制器限制同时处理的数量；
+            # 队列只预取一两张，工作页空闲时才由调度器决定下一张（截止时间、优先级按当时状态生效）
+            loop = asyncio.get_event_loop()
+            queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+            
+            async def feed():
+                for index in range(1, total + 1):
+                    if not await self.admit():
+                        break
+                    job = functools.partial(BaiduPicFilter._process_scheduled, scheduler=scheduler,
+                                            image_path=scheduler.pop(), index=index, total=total)
+                    await queue.put((job, loop.create_future()))
+                await queue.put(None)
+            
+            feeder = asyncio.ensure_future(feed())
+            try:
+                await self.run_job_queue(queue, min(self.concurrency, total))
+            finally:
+                feeder.cancel()
+                await asyncio.gather(feeder, return_exceptions=True)
+            finished = f"（最终并行度 {self.concurrency_controller.limit}）"
+        else:
+            index = 0
+            while len(scheduler) and await self.admit():
+                # 多文件提交：控件支持 multiple 时一次提交一组图片
+                if self.batch_submit_size > 1 and len(scheduler) > 1 and await self._supports_multi_upload():
+                    chunk = [scheduler.pop() for _ in range(min(self.batch_submit_size, len(scheduler)))]
+                    
+                    # 多页文档和需要分块的超大图片不参与分组提交
+                    standalone = [
+                        p for p in chunk
+                        if document_input.is_document(p) or (self.tiling and await self._needs_tiling(p))
+                    ]
+                    regular = [p for p in chunk if p not in standalone]
+                    started = asyncio.get_event_loop().time()
+                    remaining = await self._process_chunk(regular, index + 1, total) if len(regular) > 1 else regular
+                    if len(regular) > 1:
+                        scheduler.observe((asyncio.get_event_loop().time() - started) / len(regular))
+                    
+                    # 未能取回结果的图片降级为单张模式
+                    for position, image_path in enumerate(chunk):
+                        if image_path in remaining or image_path in standalone:
+                            await self._process_scheduled(scheduler, image_path, index + position + 1, total)
+                    index += len(chunk)
+                else:
+                    # 成功/失败统计在 process_image 内完成
+                    await self._process_scheduled(scheduler, scheduler.pop(), index + 1, total)
+                    index += 1
+                
+                # 每次提交之间暂停一下
+                if len(scheduler):
+                    await asyncio.sleep(2)
             
-            if success:
+            finished = ""
+        
+        # 收尾停止：未开始的图片（以及它们的重复页）不计为失败，留给下一次处理
+        unprocessed = self._unstarted + [scheduler.pop() for _ in range(len(scheduler))]
+        for image_path in list(unprocessed):
+            unprocessed.extend(duplicates.pop(str(image_path), []))
+            self._representative_outputs.pop(str(image_path), None)
+        self.stats['unprocessed'] = unprocessed
+        if unprocessed:
+            finished = f"（已停止，{len(unprocessed)} 张图片未开始处理）"
+        
+        await self.flush_outputs()
+        self._fan_out_duplicates(duplicates)
+        self.close_archive()
+        if self._manifest is not None:
+            await asyncio.get_event_loop().run_in_executor(None, self._manifest.flush)
+        
+        print(f"\n{'='*60}")
+        print(f"✅ 批量处理完成{finished}")
+        print(f"{'='*60}\n")
+    
+    def pause(self):
+        """暂停：不再开始新的图片，正在处理的图片照常完成（在事件循环线程中调用）"""
+        if self._admission.is_set() and not self._draining:
+            print("⏸️  已暂停：进行中的图片完成后不再开始新的图片")
+        self._admission.clear()
+    
+    def resume(self):
+        """从暂停处继续，沿用同一浏览器和工作页"""
+        if not self._admission.is_set():
+            print("▶️  继续处理")
+        self._admission.set()
+    
+    def drain(self):
+        """收尾：不再开始新的图片，进行中的图片完成后批量处理返回，未开始的图片记入 stats['unprocessed']"""
+        if not self._draining:
+            print("⏹️  正在收尾：等待进行中的图片完成，不再开始新的图片")
+        self._draining = True
+        self._admission.set()  # 唤醒暂停中等待的任务，让它们看到收尾状态
+    
+    @property
+    def paused(self) -> bool:
+        return not self._admission.is_set()
+    
+    def start_intake(self):
+        """开始新一轮处理：清除上一轮的收尾状态（暂停状态保持不变）"""
+        self._draining = False
+        self._unstarted = []
+    
+    async def admit(self) -> bool:
+        """
+        开始一张新图片之前调用：暂停时等待继续
+        
+        Returns:
+            bool: 是否可以开始；正在收尾时返回 False
+        """
+        root = self._owner or self
+        await root._admission.wait()
+        return not root._draining
+    
+    def _build_scheduler(self, image_paths: list, priorities: Optional[dict] = None,
+                         deadlines: Optional[dict] = None) -> ImageScheduler:
+        """按 schedule_order 把本批图片放入调度器"""
+        scheduler = ImageScheduler(aging_seconds=self.schedule_aging_seconds,
+                                   parallelism=self.concurrency if self.concurrency_controller is not None else 1)
+        scheduler.add_many(image_paths, priorities, deadlines, keep_order=self.schedule_order == 'input')
+        return scheduler
+    
+    async def _process_scheduled(self, scheduler: ImageScheduler, image_path: str, index: int, total: int) -> bool:
+        """处理调度器取出的一张图片，并把耗时反馈给调度器（估算能否赶上截止时间）"""
+        if not await self.admit():
+            # 工作页取到图片时已经开始收尾
+            (self._owner or self)._unstarted.append(image_path)
+            return False
+        started = asyncio.get_event_loop().time()
+        try:
+            return await self.process_image(image_path, index, total)
+        finally:
+            scheduler.observe(asyncio.get_event_loop().time() - started)
+    
+    async def _find_duplicates(self, image_paths: list) -> tuple:
+        """
+        检测近似重复的图片（哈希在进程池中计算，不阻塞事件循环）
+        
+        同一路径在输入中出现多次时只处理一次，不参与哈希比较
+        
+        Returns:
+            (需要处理的图片, {代表图片: [重复图片]})
+        """
+        root = self._owner or self
+        unique = {}
+        for p in image_paths:
+            unique.setdefault(str(p), p)
+        image_paths = list(unique.values())
+        candidates = [
+            str(p) for p in image_paths
+            if not document_input.is_document(p)
+            and root._preflight_results.get(str(p), {}).get('status') != 'rejected'
+        ]
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        try:
+            groups = await loop.run_in_executor(
+                None, functools.partial(find_duplicates, candidates, self.dedupe_distance,
+                                        executor=self._get_process_pool())
+            )
+        except Exception as e:
+            print(f"⚠️  重复检测失败，全部图片照常处理: {e}")
+            return image_paths, {}
+        
+        # 代表图片本身永远不跳过
+        representatives = {str(r) for r in groups}
+        groups = {
+            representative: [p for p in copies if str(p) not in representatives]
+            for representative, copies in groups.items()
+        }
+        groups = {representative: copies for representative, copies in groups.items() if copies}
+        skipped = {str(p) for copies in groups.values() for p in copies}
+        if skipped:
+            print(f"♊ 检测到 {len(skipped)} 张近似重复的图片（{len(groups)} 组，"
+                  f"耗时 {loop.time() - started:.1f}s），每组只处理一张")
+        for representative in groups:
+            self._representative_outputs[representative] = None
+        return [p for p in image_paths if str(p) not in skipped], groups
+    
+    def _fan_out_duplicates(self, duplicates: dict):
+        """把代表图片的结果复制给组内其他图片；代表图片失败时其他图片同样记为失败"""
+        archive = self._get_archive()
+        for representative, copies in duplicates.items():
+            output = self._representative_outputs.pop(representative, None)
+            for copy in copies:
+                name = Path(copy).name
+                try:
+                    if output is None or (archive is None and not Path(output).exists()):
+                        raise Exception(f"代表图片 {Path(representative).name} 处理失败")
+                    target = self._build_output_path(copy, suffix=Path(output).suffix)
+                    if archive is not None:
+                        target = archive.add(self._archive_name(target), archive.read(output), str(copy))
+                    else:
+                        shutil.copyfile(output, target)
+                except Exception as e:
+                    print(f"❌ 处理失败: {name} - {e}")
+                    self.stats['failed'] += 1
+                    self.stats['failed_files'].append(name)
+                    self._report_progress(state='failed', error=str(e), image_path=copy)
+                    continue
+                print(f"♊ {name} 与 {Path(representative).name} 重复，已复制结果: {target}")
+                self._report_progress('复用重复页结果', state='done', image_path=copy, output=target)
                 self.stats['success'] += 1
+                self.stats['deduplicated'] += 1
+    
+    async def _supports_multi_upload(self) -> bool:
+        """运行时检测上传控件是否接受多个文件（结果按页面缓存）"""
+        if self._multi_upload_page is self.page and self._multi_upload_supported is not None:
+            return self._multi_upload_supported
+        
+        try:
+            await self._ensure_tool_ready()
+            supported = await self.page.evaluate('''() => {
+                const input = document.querySelector('input[type="file"][accept*="image"]');
+                return !!(input && input.multiple);
+            }''')
+        except Exception:
+            supported = False
+        
+        if supported:
+            print(f"   ℹ️  上传控件支持多文件，启用分组提交（每组 {self.batch_submit_size} 张）")
+        else:
+            print("   ℹ️  上传控件不支持多文件，使用单张模式")
+        self._multi_upload_page = self.page
+        self._multi_upload_supported = bool(supported)
+        return self._multi_upload_supported
+    
+    async def _process_chunk(self, chunk: list, start_index: int, total: int) -> list:
+        """
+        一次交互提交一组图片，并在结果出现时逐个保存
+        
+        上传的文件按组内序号重新命名（不同文件夹中的同名文件不会混淆），
+        结果按上传文件名精确对应源文件，页面未给出文件名时按出现顺序对应
+        
+        Args:
+            chunk: 本组图片路径
+            start_index: 本组第一张图片的序号
+            total: 总数量
+            
+        Returns:
+            list: 未能取回结果、需要降级为单张模式处理的图片路径（包括预检未通过的图片，
+                  由单张模式统一记为失败）
+        """
+        end_index = start_index + len(chunk) - 1
+        print(f"\n{'='*60}")
+        print(f"分组处理第 {start_index}-{end_index}/{total} 张图片（{len(chunk)} 张）")
+        print(f"{'='*60}")
+        
+        # 上传预检修正后的副本；预检未通过的图片不上传
+        uploads = await self._chunk_uploads(chunk)
+        rejected = [p for p in chunk if p not in uploads]
+        chunk = [p for p in chunk if p in uploads]
+        if len(chunk) < 2:
+            return rejected + chunk
+        
+        pending = list(chunk)
+        for image_path in chunk:
+            self._report_progress('分组提交', image_path=image_path)
+        loop = asyncio.get_event_loop()
+        upload_dir = Path(tempfile.mkdtemp(prefix="rhw_chunk_"))
+        try:
+            await self._maybe_recycle_page()
+            await self._ensure_tool_ready()
+            
+            print("⬆️  [1/3] 分组上传图片...")
+            file_input = await self.page.query_selector('input[type="file"][accept*="image"]')
+            if not file_input:
+                raise Exception("未找到多文件上传控件")
+            # 上传文件名带组内序号，保证组内唯一：上传文件名（去掉后缀）-> 源文件
+            by_name = {}
+            for position, image_path in enumerate(chunk):
+                upload = upload_dir / f"{position:03d}_{Path(uploads[image_path]).name}"
+                await loop.run_in_executor(None, self._link_or_copy, uploads[image_path], upload)
+                by_name[upload.stem] = image_path
+                uploads[image_path] = str(upload)
+            await file_input.set_input_files([uploads[p] for p in chunk])
+            await asyncio.sleep(2)
+            
+            print("⏳ [2/3] 等待AI处理并逐个保存结果...")
+            timeout = self.chunk_timeout_base + self.chunk_timeout_per_image * (len(chunk) - 1)
+            deadline = loop.time() + timeout
+            saved_positions = set()
+            
+            while pending and loop.time() < deadline:
+                results = await self.page.evaluate('''() => {
+                    const imgs = document.querySelectorAll('img#resultImg, img[id^="resultImg"], .aiTools-result img');
+                    return Array.from(imgs)
+                        .filter(img => img.src && img.src.startsWith("data:"))
+                        .map(img => {
+                            const holder = img.closest("[data-name], [title]");
+                            const name = img.getAttribute("data-name") || img.getAttribute("alt") ||
+                                         img.getAttribute("title") ||
+                                         (holder && (holder.getAttribute("data-name") || holder.getAttribute("title"))) || "";
+                            return {src: img.src, name: name};
+                        });
+                }''')
+                
+                for position, item in enumerate(results):
+                    if position in saved_positions:
+                        continue
+                    
+                    # 页面给出文件名时只按上传文件名精确对应（结果后缀可能不同），没有文件名时按顺序对应
+                    name = Path(item['name']).stem if item['name'] else ''
+                    if name:
+                        source = by_name.get(name)
+                    else:
+                        source = chunk[position] if position < len(chunk) else None
+                    if source is None or source not in pending:
+                        continue
+                    
+                    saved_positions.add(position)
+                    if await self._save_result_data(source, item['src']):
+                        pending.remove(source)
+                        self._use_chunk_preflight(source)
+                        self.stats['success'] += 1
+                        self.stats['batched_images'] += 1
+                        self._report_progress('完成（分组提交）', state='done', image_path=source,
+                                              output=self.last_output_path)
+                        print(f"✅ 成功处理: {Path(source).name}")
+                
+                if pending:
+                    state = await self._probe_page()
+                    if state['errorText'] and not state['resultReady']:
+                        print(f"   ❌ 分组处理失败: {state['errorText']}")
+                        break
+                    await asyncio.sleep(1)
+            
+            print("⬇️  [3/3] 分组结果已保存")
+        except Exception as e:
+            print(f"   ⚠️  分组提交失败: {e}")
+        finally:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+        
+        if pending:
+            print(f"   ℹ️  {len(pending)} 张图片未取回结果，降级为单张模式")
+            self.stats['batch_fallbacks'] += 1
+            if len(pending) == len(chunk):
+                # 一张结果都没取回，说明页面并不真正支持分组处理
+                print("   ℹ️  分组提交未取回任何结果，本页面后续改用单张模式")
+                self._multi_upload_supported = False
+        return rejected + pending
+    
+    @staticmethod
+    def _link_or_copy(source: str, target: Path):
+        """硬链接（不复制数据）；跨磁盘或文件系统不支持时复制"""
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+    
+    async def _chunk_uploads(self, chunk: list) -> dict:
+        """
+        分组提交时每张图片实际要上传的文件
+        
+        预检结果只查看不取走：降级为单张模式的图片仍由 _preflight 统一取用和计数
+        
+        Returns:
+            dict: 原图路径 -> 上传文件（原文件或修正后的副本），不含预检未通过的图片
+        """
+        if self.preflight_limits is None:
+            return {p: p for p in chunk}
+        root = self._owner or self
+        missing = [p for p in chunk if str(p) not in root._preflight_results]
+        if missing:
+            loop = asyncio.get_event_loop()
+            limits, fix_dir = self._preflight_limits_for_run(), self._preflight_fix_dir()
+            results = await asyncio.gather(*(
+                loop.run_in_executor(None, preflight.check_image, str(p), limits, fix_dir) for p in missing
+            ))
+            for path, result in zip(missing, results):
+                root._preflight_results[str(path)] = result
+        
+        uploads = {}
+        for image_path in chunk:
+            result = root._preflight_results[str(image_path)]
+            if result['status'] != 'rejected':
+                uploads[image_path] = result['path'] if result['status'] == 'fixed' else image_path
+        return uploads
+    
+    def _use_chunk_preflight(self, image_path: str):
+        """分组提交保存结果后取走该图片的预检结果（修正过的计入统计）"""
+        root = self._owner or self
+        result = root._preflight_results.pop(str(image_path), None)
+        if result is not None and result['status'] == 'fixed':
+            print(f"   🔧 预检修正: {'、'.join(result['fixes'])}")
+            self.stats['preflight_fixed'] += 1
+    
+    def configure(self, output_dir: str, batch_submit_size: int = 1, concurrency: int = 1, tiling: bool = False,
+                  output_options: Optional[OutputOptions] = None, adaptive_concurrency: bool = False,
+                  dedupe: bool = False, output_layout: str = 'flat', archive_format: Optional[str] = None):
+        """
+        修改处理配置，继续使用已启动的浏览器和登录状态（参数含义同 __init__）
+
+        已打开的工作页保留，共享配置同步到所有工作页
+        """
+        if Path(output_dir) != self.output_dir and self._manifest is not None:
+            # 清单跟随输出文件夹
+            self._manifest.close()
+            self._manifest = None
+        if Path(output_dir) != self.output_dir or archive_format != self.archive_format:
+            self.close_archive()
+        self.archive_format = archive_format
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(exist_ok=True)
+        self.batch_submit_size = max(1, batch_submit_size)
+        self.concurrency = max(1, concurrency)
+        self.tiling = tiling
+        if output_layout != self.output_layout.mode:
+            self.output_layout = OutputLayout(output_layout, self.output_layout.shard_threshold,
+                                              self.output_layout.shard_width)
+        self.output_options = output_options
+        self.dedupe = dedupe
+        if not adaptive_concurrency:
+            self.concurrency_controller = None
+        elif self.concurrency_controller is None or self.concurrency_controller.max_limit != self.concurrency:
+            self.concurrency_controller = AIMDController(initial=1, max_limit=self.concurrency)
+        if self.diagnostics is not None:
+            self.diagnostics.report_dir = self.output_dir / '.diagnostics'
+
+        for worker in [*self._workers, self._hedge_worker]:
+            if worker is None:
+                continue
+            for name in self._WORKER_SHARED_ATTRS:
+                setattr(worker, name, getattr(self, name))
+            worker.output_dir = self.output_dir
+
+    async def spawn_worker(self) -> 'BaiduPicFilter':
+        """
+        在同一浏览器上下文中打开新标签页，作为并行工作客户端
+        
+        工作客户端共享浏览器、登录状态、配置和统计信息，只拥有自己的页面
+        """
+        worker = BaiduPicFilter(
+            headless=self.headless,
+            output_dir=str(self.output_dir),
+            batch_submit_size=1,
+        )
+        for name in self._WORKER_SHARED_ATTRS:
+            setattr(worker, name, getattr(self, name))
+        worker.browser = self.browser
+        worker.context = self.context
+        worker.stats = self.stats
+        worker._logged_in = self._logged_in
+        worker._owner = self
+        worker.page = await self.context.new_page()
+        return worker
+    
+    async def _recover_worker_page(self, worker: 'BaiduPicFilter'):
+        """为工作客户端重建页面；浏览器已失效时由主客户端统一重启一次"""
+        if worker.page:
+            try:
+                await worker.page.close()
+            except Exception:
+                pass
+        
+        async with self._restart_lock:
+            if not self.browser or not self.browser.is_connected():
+                await self._restart_browser()
+        
+        worker.browser = self.browser
+        worker.context = self.context
+        worker.page = await self.context.new_page()
+    
+    async def _ensure_workers(self, count: int) -> list:
+        """确保至少打开 count 个工作页（跨批次复用）"""
+        if self._owner is not None:
+            # 工作页本身已在并行池中，嵌套任务（图块、文档页面）在自己的页面上依次执行
+            return [self]
+        while len(self._workers) < count:
+            self._workers.append(await self.spawn_worker())
+        return self._workers[:count]
+    
+    async def _worker_loop(self, worker: 'BaiduPicFilter', queue: asyncio.Queue):
+        """工作页循环：从队列取任务执行，直到遇到结束标记"""
+        while True:
+            item = await queue.get()
+            if item is None:
+                # 结束标记放回队列，让其他工作页也能退出
+                queue.put_nowait(None)
+                return
+            
+            job, future = item
+            try:
+                result = await job(worker)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
             else:
-                self.stats['failed'] += 1
-                self.stats['failed_files'].append(Path(image_path).name)
+                if not future.done():
+                    future.set_result(result)
+    
+    async def run_job_queue(self, queue: asyncio.Queue, concurrency: Optional[int] = None):
+        """
+        在多个工作页上持续消费任务队列，直到取到结束标记 None
+        
+        队列元素为 (job, future)：job 是接收工作客户端并返回协程的可调用对象，
+        执行结果（或异常）写入 future。适合边生成边处理的流式任务
+        
+        Args:
+            queue: 任务队列
+            concurrency: 并行页数（默认使用 self.concurrency）
+        """
+        workers = await self._ensure_workers(max(1, concurrency or self.concurrency))
+        tasks = [asyncio.ensure_future(self._worker_loop(w, queue)) for w in workers]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def run_jobs(self, jobs: list, concurrency: Optional[int] = None) -> list:
+        """
+        在多个工作页上并行执行任务
+        
+        Args:
+            jobs: 任务列表，每个任务是接收工作客户端并返回协程的可调用对象
+            concurrency: 并行页数（默认使用 self.concurrency）
             
-            # 每张图片之间暂停一下
-            if index < total:
-                await asyncio.sleep(2)
+        Returns:
+            list: 按提交顺序排列的结果，失败的任务对应其异常对象
+        """
+        if not jobs:
+            return []
         
-        print(f"\n{'='*60}")
-        print(f"✅ 批量处理完成")
-        print(f"{'='*60}\n")
+        loop = asyncio.get_event_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        futures = []
+        for job in jobs:
+            future = loop.create_future()
+            futures.append(future)
+            queue.put_nowait((job, future))
+        queue.put_nowait(None)
+        
+        await self.run_job_queue(queue, min(concurrency or self.concurrency, len(jobs)))
+        return await asyncio.gather(*futures, return_exceptions=True)
     
-    async def process_image(self, image_path: str, index: int, total: int) -> bool:
+    async def process_image(self, image_path: str, index: int, total: int,
+                            output_path: Optional[Path] = None) -> bool:
         """
         处理单张图片
         
@@ -466,6 +1191,7 @@ class BaiduPicFilter:
             image_path: 图片文件路径
             index: 当前索引
             total: 总数量
+            output_path: 结果保存路径（默认按原文件名生成）
             
         Returns:
             bool: 是否成功
@@ -475,66 +1201,670 @@ class BaiduPicFilter:
         print(f"处理第 {index}/{total} 张图片: {file_name}")
         print(f"{'='*60}")
         
+        source = image_path
+        self._progress_path = str(image_path)
+        self._progress_started = time.time()
+        self._progress_retries = 0
         try:
-            # 确保在正确的页面
-            if self.base_url not in self.page.url:
-                print("📄 导航到试卷去手写页面...")
-                await self.page.goto(self.base_url, wait_until='domcontentloaded', timeout=self.nav_timeout)
-                await asyncio.sleep(1)
-            
-            # 上传图片（带重试机制）
-            print("⬆️  [1/3] 上传图片...")
-            upload_success = await self._upload_image_with_retry(image_path)
-            if not upload_success:
-                raise Exception("上传失败（已重试）")
-            
-            # 等待处理完成
-            print("⏳ [2/3] 等待AI处理...")
-            if not await self._wait_for_processing():
-                raise Exception("处理超时或失败")
-            
-            # 下载结果（传递原始文件路径）
-            print("⬇️  [3/3] 下载处理后的图片...")
-            if not await self._download_result(image_path):
-                raise Exception("下载失败")
+            # 预检未通过时直接失败，不进入上传重试和浏览器重启
+            self._report_progress('预检')
+            source = await self._preflight(image_path)
+            
+            if document_input.is_document(source):
+                # PDF / 多页 TIFF 逐页并行处理后重新合成文档
+                self._report_progress('逐页处理')
+                if not await self._process_document(source, output_path):
+                    raise Exception("文档处理失败")
+            elif self.tiling and await self._needs_tiling(source):
+                # 超大图片分块并行处理后拼接
+                self._report_progress('分块处理')
+                if not await self._process_tiled(source, output_path):
+                    raise Exception("分块处理失败")
+            else:
+                await self._process_single(source, output_path)
             
+            if source != image_path:
+                # 处理的是修正后的副本，输出路径仍登记在原文件名下
+                self._set_output_path(image_path, self.last_output_path)
             print(f"✅ 成功处理: {file_name}")
             self.stats['success'] += 1
+            self._report_progress('完成', state='done', output=self.last_output_path)
             return True
             
         except Exception as e:
             print(f"❌ 处理失败: {file_name} - {e}")
             self.stats['failed'] += 1
             self.stats['failed_files'].append(file_name)
+            self._report_progress(state='failed', error=str(e))
             return False
+        finally:
+            self._progress_path = None
+            if source != image_path:
+                shutil.rmtree(Path(source).parent, ignore_errors=True)
     
-    async def _upload_image_with_retry(self, image_path: str) -> bool:
+    def _report_progress(self, stage: Optional[str] = None, state: str = 'running', error: Optional[str] = None,
+                         image_path: Optional[str] = None, output=None):
         """
-        带重试机制的上传图片
-        
-        重试策略：
-        1. 第一次失败：重新导航到页面后重试（共2次尝试）
-        2. 第二次失败：重启浏览器后重试（共2次尝试）
+        向 progress_callback 报告一个文件的处理进度（回调出错不影响处理）
         
         Args:
-            image_path: 图片文件路径
-            
+            stage: 当前阶段
+            state: running / done / failed
+            error: 失败原因
+            image_path: 文件路径（默认为正在处理的文件）
+            output: 结果文件路径（完成时）
+        """
+        path = image_path or self._progress_path
+        if path is not None and state in ('done', 'failed'):
+            seconds = time.time() - self._progress_started if image_path is None and self._progress_started else None
+            self._record_result(path, state, output, seconds, error)
+        if self.progress_callback is None or path is None:
+            return
+        try:
+            self.progress_callback({
+                'path': str(path),
+                'state': state,
+                'stage': stage,
+                'retries': self._progress_retries if image_path is None else None,
+                'error': error,
+                'output': str(output) if output else None,
+                'time': time.time(),
+            })
+        except Exception:
+            pass
+    
+    def _get_manifest(self) -> Optional[Manifest]:
+        """结果清单（放在主客户端的输出文件夹中，首次使用时打开）"""
+        root = self._owner or self
+        if not root.keep_manifest:
+            return None
+        if root._manifest is None:
+            root._manifest = Manifest(str(root.output_dir / manifest_name(root.manifest_node)),
+                                      wal=root.manifest_node is None)
+        return root._manifest
+    
+    def _record_result(self, source_path: str, status: str, output=None, seconds: Optional[float] = None,
+                       error: Optional[str] = None):
+        """把一张图片的处理结果交给结果清单（哈希和写入在清单的后台线程中完成，清单出错不影响处理）"""
+        try:
+            manifest = self._get_manifest()
+            if manifest is not None:
+                manifest.record(str(source_path), status, output, seconds, error)
+        except Exception as e:
+            print(f"   ⚠️  写入结果清单失败: {e}")
+    
+    def find_output(self, source_path: str) -> Optional[dict]:
+        """
+        在结果清单中查找源文件的处理结果（索引查询，不扫描输出文件夹）
+        
         Returns:
-            bool: 是否成功
+            dict: {'source', 'source_hash', 'output', 'status', 'seconds', 'error', 'updated'}，没有记录时为 None
         """
-        file_name = Path(image_path).name
+        manifest = self._get_manifest()
+        return manifest.lookup(source_path) if manifest is not None else None
+    
+    def _preflight_fix_dir(self) -> str:
+        root = self._owner or self
+        if root._preflight_dir is None:
+            root._preflight_dir = tempfile.mkdtemp(prefix="rhw_preflight_")
+        return root._preflight_dir
+    
+    def _preflight_limits_for_run(self) -> preflight.PreflightLimits:
+        """预检限制（启用分块时超大图片交给分块处理，不按尺寸/体积上限修正）"""
+        limits = self.preflight_limits
+        if self.tiling:
+            limits = preflight.PreflightLimits(
+                max_bytes=limits.max_bytes, max_side=limits.max_side, min_side=limits.min_side,
+                formats=limits.formats, tile_max_side=self.tile_max_side, tile_max_pixels=self.tile_max_pixels,
+            )
+        return limits
+    
+    async def _preflight_many(self, image_paths: list):
+        """在线程池中并行预检一批图片，结果留到处理各图片时取用"""
+        if self.preflight_limits is None or not image_paths:
+            return
+        root = self._owner or self
+        loop = asyncio.get_event_loop()
+        limits = self._preflight_limits_for_run()
+        fix_dir = self._preflight_fix_dir()
+        started = loop.time()
+        with ThreadPoolExecutor(max_workers=self.preflight_workers, thread_name_prefix="rhw-preflight") as executor:
+            results = await asyncio.gather(*[
+                loop.run_in_executor(executor, preflight.check_image, str(p), limits, fix_dir)
+                for p in image_paths
+            ])
+        for path, result in zip(image_paths, results):
+            root._preflight_results[str(path)] = result
+        rejected = sum(1 for r in results if r['status'] == 'rejected')
+        fixed = sum(1 for r in results if r['status'] == 'fixed')
+        print(f"🔎 预检 {len(results)} 个文件（{loop.time() - started:.2f}s）：拒绝 {rejected}，修正 {fixed}")
+    
+    async def _preflight(self, image_path: str) -> str:
+        """
+        取出（或现场计算）一张图片的预检结果
         
-        # 第一阶段：页面重试（2次尝试）
-        print(f"\n   📤 第一阶段：页面重试...")
-        for attempt in range(1, 3):
-            print(f"   [{attempt}/2] 尝试上传...")
-            
+        Returns:
+            str: 实际要处理的文件（修正后的副本或原文件）；预检未通过时抛出异常
+        """
+        if self.preflight_limits is None:
+            return image_path
+        root = self._owner or self
+        result = root._preflight_results.pop(str(image_path), None)
+        if result is None:
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(
+                None, preflight.check_image, str(image_path), self._preflight_limits_for_run(), self._preflight_fix_dir()
+            )
+        
+        if result['status'] == 'rejected':
+            self.stats['rejected'].append({'file': Path(image_path).name, 'reason': result['reason']})
+            raise Exception(f"预检未通过: {result['reason']}")
+        if result['status'] == 'fixed':
+            print(f"   🔧 预检修正: {'、'.join(result['fixes'])}")
+            self.stats['preflight_fixed'] += 1
+            return result['path']
+        return image_path
+    
+    async def _process_document(self, doc_path: str, output_path: Optional[Path] = None) -> bool:
+        """
+        流式处理多页文档
+        
+        后台线程逐页栅格化，页面一就绪就进入任务队列由多个工作页并行处理；
+        队列容量有限，栅格化不会领先处理太多页。处理完的页面按页码顺序
+        边完成边写入输出文档，失败的页面保留原样以保证文档完整
+        
+        Args:
+            doc_path: PDF 或 TIFF 文件路径
+            output_path: 输出文档路径（默认按原文件名生成）
+            
+        Returns:
+            bool: 是否所有页面都处理成功
+        """
+        loop = asyncio.get_event_loop()
+        work_dir = Path(tempfile.mkdtemp(prefix="rhw_pages_"))
+        final_path = output_path or self._build_output_path(doc_path)
+        archive_path = None
+        if output_path is None and self._get_archive() is not None:
+            # 写入归档：文档先在临时目录中合成，完成后整体复制进归档
+            archive_path, final_path = final_path, work_dir / final_path.name
+        writer = document_input.DocumentWriter(str(final_path), dpi=self.document_dpi)
+        # 栅格化和写入各用一个单线程执行器，保证顺序且不阻塞事件循环
+        raster_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rhw-raster")
+        write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rhw-write")
+        
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        consumer = asyncio.ensure_future(self.run_job_queue(queue))
+        failed_pages = []
+        writes = []
+        closed = False
+        
+        async def write_page(page_index: int, page_path: str, future: asyncio.Future):
+            await asyncio.wait([future])
+            result_path = str(work_dir / "out" / Path(page_path).name)
+            if future.exception() is not None:
+                print(f"   ⚠️  第 {page_index + 1} 页处理失败，保留原始页面: {future.exception()}")
+                failed_pages.append(page_index + 1)
+                result_path = page_path
+            await loop.run_in_executor(write_executor, writer.add, page_index, result_path)
+        
+        try:
+            print(f"📄 逐页处理文档: {Path(doc_path).name}")
+            (work_dir / "out").mkdir(parents=True)
+            pages = document_input.iter_pages(str(doc_path), str(work_dir / "in"), self.document_dpi)
+            page_count = 0
+            
+            while True:
+                item = await loop.run_in_executor(raster_executor, next, pages, None)
+                if item is None:
+                    break
+                page_index, page_path = item
+                page_count += 1
+                
+                future = loop.create_future()
+                writes.append(asyncio.ensure_future(write_page(page_index, page_path, future)))
+                job = functools.partial(
+                    BaiduPicFilter._process_single,
+                    image_path=page_path,
+                    output_path=work_dir / "out" / Path(page_path).name,
+                )
+                await queue.put((job, future))
+                print(f"   ✓ 第 {page_index + 1} 页已加入处理队列")
+            
+            await queue.put(None)
+            await consumer
+            await asyncio.gather(*writes)
+            
+            pages_written = await loop.run_in_executor(write_executor, writer.close)
+            closed = True
+            if archive_path is not None:
+                final_path = await self._save_to_archive(doc_path, archive_path, file_path=final_path)
+            else:
+                self._set_output_path(doc_path, final_path)
+            print(f"   ✓ 文档已保存到: {final_path}（{pages_written}/{page_count} 页）")
+            if failed_pages:
+                print(f"   ⚠️  以下页面未能去手写: {failed_pages}")
+            return not failed_pages and page_count > 0
+        finally:
+            for task in [consumer] + writes:
+                if not task.done():
+                    task.cancel()
+            if not closed:
+                # 写入中途出错：释放输出文档的文件句柄（排在已提交的写入之后），删除不完整的输出
+                try:
+                    await loop.run_in_executor(write_executor, writer.close)
+                except Exception:
+                    pass
+                try:
+                    Path(final_path).unlink()
+                except OSError:
+                    pass
+            raster_executor.shutdown(wait=False)
+            write_executor.shutdown(wait=True)
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    async def _process_single(self, image_path: str, output_path: Optional[Path] = None):
+        """
+        在当前页面上完成一次 上传 → 等待处理 → 下载，失败时抛出异常
+        
+        同时统计这张图片消耗的驱动往返次数；诊断模式下记录这张图片的轨迹
+        
+        Args:
+            image_path: 要上传的图片路径
+            output_path: 结果保存路径（默认按原文件名生成）
+        """
+        # 两张图片之间：资源超限时先回收页面
+        await self._maybe_recycle_page()
+        
+        trace = self._begin_trace(image_path)
+        trips_before = self.round_trips.count
+        error = None
+        try:
+            await self._submit_and_fetch(image_path, output_path)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            trips = self.round_trips.count - trips_before
+            self.stats['round_trips'] += trips
+            self.stats['probed_images'] += 1
+            print(f"   📡 驱动往返 {trips} 次")
+            if trace is not None:
+                await self._finish_trace(trace, error)
+    
+    def _begin_trace(self, image_path: str) -> Optional[ImageTrace]:
+        """诊断模式下开始记录一张图片的轨迹"""
+        if self.diagnostics is None or self.page is None:
+            return None
+        trace = self.diagnostics.begin(image_path)
+        self._trace = trace
+        self.round_trips.listener = trace.note_action
+        self.diagnostics.attach(self.page, lambda: self._trace)
+        return trace
+    
+    async def _finish_trace(self, trace: ImageTrace, error: Optional[BaseException]):
+        """结束轨迹；图片失败或耗时超过阈值时写入截图、轨迹和网络记录"""
+        self.round_trips.listener = None
+        self._trace = None
+        if isinstance(error, asyncio.CancelledError):
+            self.diagnostics.finish(trace, 'cancelled')
+            return
+        
+        slow_seconds = None
+        if self.latency_tracker is not None:
+            slow_seconds = self.latency_tracker.quantile('processing', 0.99)
+        if not self.diagnostics.finish(trace, 'failed' if error else 'ok', error, slow_seconds):
+            return
+        
+        screenshot = None
+        try:
+            screenshot = await self.page.screenshot(timeout=5000)
+        except Exception:
+            pass
+        try:
+            loop = asyncio.get_event_loop()
+            report = await loop.run_in_executor(None, self.diagnostics.persist, trace, screenshot)
+            reason = '失败' if trace.outcome == 'failed' else f'耗时 {trace.elapsed:.0f}s'
+            print(f"   🩺 已保存诊断信息（{reason}）: {report}")
+        except Exception as e:
+            print(f"   ⚠️  保存诊断信息失败: {e}")
+    
+    async def _maybe_recycle_page(self):
+        """
+        检查资源占用，超限时回收页面
+        
+        浏览器进程树内存超限时所有页面依次回收（顺序处理、没有其他页面共用上下文时回收整个上下文）；
+        单个页面的 JS 堆超限或处理张数达到阈值时只回收该页面
+        """
+        monitor = self.resource_monitor
+        if monitor is None or self.page is None:
+            return
+        monitor.sample(images=self.stats['probed_images'])
+        
+        reason = None
+        context_wide = False
+        if self._page_generation < monitor.generation:
+            reason = "浏览器内存超过上限"
+            context_wide = True
+        elif monitor.recycle_every and self._page_images >= monitor.recycle_every:
+            reason = f"本页面已处理 {self._page_images} 张"
+        elif self._page_images and self._page_images % monitor.heap_check_every == 0:
+            heap = await self._page_heap_mb()
+            if heap is not None and heap > monitor.max_heap_mb:
+                reason = f"JS 堆 {heap:.0f}MB 超过上限 {monitor.max_heap_mb:.0f}MB"
+        
+        if reason is not None:
+            try:
+                if context_wide and self._owner is None and not self._workers and self._hedge_worker is None:
+                    await self._recycle_context(reason)
+                else:
+                    await self._recycle_page(reason)
+            except Exception as e:
+                # 回收失败不影响本张图片，交给原有的重试/重启机制
+                print(f"   ⚠️  回收失败: {e}")
+                self._page_generation = monitor.generation
+        self._page_images += 1
+    
+    async def _page_heap_mb(self) -> Optional[float]:
+        """通过 CDP 读取当前页面的 JS 堆大小（MB）；不支持 CDP 时返回 None"""
+        monitor = self.resource_monitor
+        if not monitor.cdp_available:
+            return None
+        try:
+            if self._cdp_session is None:
+                self._cdp_session = await self.context.new_cdp_session(page_probe.unwrap_page(self.page))
+                await self._cdp_session.send('Performance.enable')
+            result = await self._cdp_session.send('Performance.getMetrics')
+        except Exception as e:
+            print(f"   ℹ️  无法读取页面内存（CDP 不可用）: {e}")
+            monitor.cdp_available = False
+            return None
+        
+        metrics = {item['name']: item['value'] for item in result.get('metrics', [])}
+        heap = metrics.get('JSHeapUsedSize', 0) / 1024 / 1024
+        monitor.record_heap(id(self), heap)
+        return heap
+    
+    async def _recycle_page(self, reason: str):
+        """在同一上下文中换一个新页面（下一张图片上传前会自动导航到工具页）"""
+        print(f"   ♻️  回收页面（{reason}）")
+        old_page = self.page
+        self.resource_monitor.forget_page(id(self))
+        self.page = await self.context.new_page()
+        try:
+            await old_page.close()
+        except Exception:
+            pass
+        self.resource_monitor.page_recycles += 1
+        self.stats['page_recycles'] += 1
+    
+    async def _recycle_context(self, reason: str):
+        """换一个新的浏览器上下文（沿用 Cookie 和本地存储，无需重新登录）"""
+        print(f"   ♻️  回收浏览器上下文（{reason}）")
+        old_context = self.context
+        storage_state = await old_context.storage_state()
+        self.resource_monitor.forget_page(id(self))
+        await self._open_context(storage_state)
+        self.page = await self.context.new_page()
+        try:
+            await old_context.close()
+        except Exception:
+            pass
+        self.resource_monitor.context_recycles += 1
+        self.stats['context_recycles'] += 1
+    
+    async def _submit_and_fetch(self, image_path: str, output_path: Optional[Path] = None):
+        """上传 → 等待处理 → 下载"""
+        # 确保上传控件可用（优先页面内重置，失败才重新导航）
+        await self._ensure_tool_ready()
+        
+        controller = self.concurrency_controller
+        if controller is not None:
+            await controller.acquire()
+        outcome, latency = 'upload', 0.0
+        try:
+            # 上传图片（带重试机制）
+            print("⬆️  [1/3] 上传图片...")
+            self._report_progress('上传')
+            upload_success = await self._upload_image_with_retry(image_path)
+            if not upload_success:
+                raise Exception("上传失败（已重试）")
+            
+            # 等待处理完成（耗时远超同类图片时可能在备用页面上重复提交）
+            print("⏳ [2/3] 等待AI处理...")
+            self._report_progress('等待处理')
+            started = asyncio.get_event_loop().time()
+            winner, downloaded = await self._wait_with_hedge(image_path, output_path)
+            latency = asyncio.get_event_loop().time() - started
+            outcome = 'ok' if winner is not None else self.last_wait_outcome
+            if winner is None:
+                raise Exception("处理超时或失败")
+        finally:
+            if controller is not None:
+                controller.release(latency, outcome)
+        
+        if downloaded is None:
+            # 下载结果（传递原始文件路径）；备用页面先出结果时已在 _hedge 中下载
+            print("⬇️  [3/3] 下载处理后的图片...")
+            self._report_progress('下载')
+            downloaded = await self._download_result(image_path, output_path)
+        if not downloaded:
+            raise Exception("下载失败")
+        if winner is not self:
+            self.last_output_path = winner.last_output_path
+    
+    def _nav_timeout_ms(self) -> int:
+        """页面导航超时（毫秒）：按最近的导航耗时计算，样本不足时使用 nav_timeout"""
+        if self.latency_tracker is None:
+            return self.nav_timeout
+        return int(self.latency_tracker.timeout('navigation', default=self.nav_timeout / 1000) * 1000)
+    
+    def _record_latency(self, stage: str, started: float):
+        if self.latency_tracker is not None:
+            self.latency_tracker.record(stage, asyncio.get_event_loop().time() - started)
+    
+    def _file_chooser_timeout_ms(self) -> int:
+        """等待文件选择框的超时（毫秒）"""
+        if self.latency_tracker is None:
+            return 10000
+        return int(self.latency_tracker.timeout('file_chooser') * 1000)
+    
+    async def _wait_with_hedge(self, image_path: str, output_path: Optional[Path] = None) -> tuple:
+        """
+        等待处理完成，超时按同类图片的耗时分布和文件大小计算
+        
+        耗时远超同类图片时，在备用页面上重复提交同一张图片，哪个页面先出结果就用哪个；
+        超过自适应超时仍未完成时，同一次提交继续等到阶段上限才判为失败
+        
+        Returns:
+            (出结果的客户端, 是否已下载成功)：客户端为自己或备用页面，失败或超时为 None；
+            备用页面先出结果时已经下载（下载期间备用页面不会被其他图片重置），否则为 None
+        """
+        tracker = self.latency_tracker
+        size = Path(image_path).stat().st_size
+        timeout = tracker.timeout('processing', size) if tracker else 120
+        hedge_delay = tracker.hedge_delay('processing', size) if tracker and self.hedging else None
+        
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        primary = asyncio.ensure_future(self._wait_for_processing(timeout))
+        if hedge_delay is not None and hedge_delay < timeout:
+            await asyncio.wait([primary], timeout=hedge_delay)
+        
+        if primary.done() or hedge_delay is None or hedge_delay >= timeout:
+            winner, downloaded = (self if await primary else None), None
+        else:
+            winner, downloaded = await self._hedge(image_path, primary, timeout - hedge_delay, output_path)
+        
+        if winner is None and self.last_wait_outcome == 'timeout' and tracker:
+            # 超时的耗时也进入分布（按超时值），服务整体变慢时超时随之变长
+            tracker.record_timeout('processing', timeout, size)
+            remaining = tracker.ceiling('processing') - (loop.time() - started)
+            if remaining > 1:
+                print(f"   ⏳ 已超过自适应超时（{timeout:.0f} 秒），继续等待至上限（再等 {remaining:.0f} 秒）...")
+                if await self._wait_for_processing(remaining):
+                    winner = self
+        if winner is self and tracker:
+            tracker.record('processing', loop.time() - started, size)
+        return winner, downloaded
+    
+    async def _hedge(self, image_path: str, primary: asyncio.Future, remaining: float,
+                     output_path: Optional[Path] = None) -> tuple:
+        """
+        在备用页面上重复提交，返回 (先出结果的客户端, 是否已下载成功)
+        
+        备用页面是所有工作页共用的，它先出结果时在持有锁的情况下立即下载，
+        下一张慢图片要等下载完成才能重置备用页面
+        """
+        root = self._owner or self
+        controller = self.concurrency_controller
+        # 同时只做一次重复提交，且不挤占自适应并行度的名额
+        if root._hedge_lock.locked() or (controller is not None and not controller.try_acquire()):
+            return (self if await primary else None), None
+        
+        async with root._hedge_lock:
+            try:
+                print(f"   🪁 耗时远超同类图片，在备用页面上重复提交: {Path(image_path).name}")
+                root.stats['hedged'] += 1
+                if root._hedge_worker is None:
+                    root._hedge_worker = await root.spawn_worker()
+                hedge = root._hedge_worker
+                hedge.output_dir = self.output_dir
+                
+                async def resubmit() -> bool:
+                    await hedge._ensure_tool_ready()
+                    return await hedge._upload_image(image_path) and await hedge._wait_for_processing(remaining)
+                
+                pending = {primary: self, asyncio.ensure_future(resubmit()): hedge}
+                winner = None
+                while pending and winner is None:
+                    done, _ = await asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        client = pending.pop(task)
+                        if not task.cancelled() and task.exception() is None and task.result():
+                            winner = client
+                            break
+                
+                # 落后的页面停止等待，下次使用前会重置
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                if winner is not hedge:
+                    return winner, None
+                root.stats['hedge_wins'] += 1
+                print("   ✓ 备用页面先出结果")
+                print("⬇️  [3/3] 从备用页面下载处理后的图片...")
+                self._report_progress('下载')
+                return winner, await hedge._download_result(image_path, output_path)
+            finally:
+                if controller is not None:
+                    controller.release(0.0, 'cancelled')
+    
+    async def _needs_tiling(self, image_path: str) -> bool:
+        """判断图片尺寸是否超过直接上传的限制（只读文件头）"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, tiling.needs_tiling, str(image_path), self.tile_max_side, self.tile_max_pixels
+        )
+    
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """获取用于图像切分/拼接等 CPU 工作的进程池（懒创建）"""
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.cpu_workers)
+        return self._process_pool
+    
+    async def _process_tiled(self, image_path: str, output_path: Optional[Path] = None) -> bool:
+        """
+        分块处理超大图片
+        
+        在进程池中切分为带重叠的图块，图块在多个工作页上并行去手写，
+        最后在进程池中羽化拼接为原始分辨率
+        
+        Args:
+            image_path: 原始图片路径
+            output_path: 结果保存路径（默认按原文件名生成）
+            
+        Returns:
+            bool: 是否成功
+        """
+        loop = asyncio.get_event_loop()
+        pool = self._get_process_pool()
+        work_dir = Path(tempfile.mkdtemp(prefix="rhw_tiles_"))
+        
+        try:
+            print(f"🧩 图片尺寸较大，切分为 {self.tile_size}px 图块（重叠 {self.tile_overlap}px）...")
+            plan = await loop.run_in_executor(
+                pool, tiling.split_image, str(image_path), str(work_dir / "in"),
+                self.tile_size, self.tile_overlap
+            )
+            tiles = plan['tiles']
+            print(f"   ✓ 共 {len(tiles)} 个图块（{plan['rows']} 行 × {plan['cols']} 列）")
+            
+            result_paths = [str(work_dir / "out" / Path(t['path']).name) for t in tiles]
+            (work_dir / "out").mkdir()
+            jobs = [
+                functools.partial(BaiduPicFilter._process_single, image_path=t['path'], output_path=Path(out))
+                for t, out in zip(tiles, result_paths)
+            ]
+            results = await self.run_jobs(jobs)
+            
+            failed = [Path(t['path']).name for t, r in zip(tiles, results) if isinstance(r, BaseException)]
+            if failed:
+                print(f"   ❌ {len(failed)} 个图块处理失败: {', '.join(failed)}")
+                return False
+            
+            print("🧵 拼接图块...")
+            final_path = output_path or self._build_output_path(image_path)
+            if output_path is None and self._get_archive() is not None:
+                # 写入归档：在临时目录中拼接（需要重新编码时拼接为无损中间图）
+                encoding = self.output_options and not self.output_options.is_passthrough
+                stitched = work_dir / ("stitched.png" if encoding else final_path.name)
+                await loop.run_in_executor(pool, tiling.stitch_tiles, plan, result_paths, str(stitched))
+                await self._save_to_archive(image_path, final_path, file_path=stitched,
+                                            mime='image/png' if encoding else None)
+                return True
+            if output_path is None and self.output_options and not self.output_options.is_passthrough:
+                # 拼接为无损中间图，再交给输出编码
+                stitched = work_dir / "stitched.png"
+                await loop.run_in_executor(pool, tiling.stitch_tiles, plan, result_paths, str(stitched))
+                self._submit_output(image_path, stitched.read_bytes(), final_path, 'image/png')
+                return True
+            
+            await loop.run_in_executor(pool, tiling.stitch_tiles, plan, result_paths, str(final_path))
+            self._set_output_path(image_path, final_path)
+            print(f"   ✓ 已保存到: {final_path}")
+            return True
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    async def _upload_image_with_retry(self, image_path: str) -> bool:
+        """
+        带重试机制的上传图片
+        
+        重试策略：
+        1. 第一次失败：重新导航到页面后重试（共2次尝试）
+        2. 第二次失败：重启浏览器后重试（共2次尝试）
+        
+        Args:
+            image_path: 图片文件路径
+            
+        Returns:
+            bool: 是否成功
+        """
+        file_name = Path(image_path).name
+        
+        # 第一阶段：页面重试（2次尝试）
+        print(f"\n   📤 第一阶段：页面重试...")
+        for attempt in range(1, 3):
+            print(f"   [{attempt}/2] 尝试上传...")
+            
             if attempt > 1:
-                # 第二次尝试前重新导航到页面
-                print(f"   [重试] 重新导航到页面...")
+                # 第二次尝试前重置上传控件（页面内重置失败才重新导航）
+                print(f"   [重试] 重置上传控件...")
+                self._progress_retries += 1
+                self._report_progress('重试上传')
                 try:
-                    await self.page.goto(self.base_url, wait_until='domcontentloaded', timeout=self.nav_timeout)
-                    await asyncio.sleep(2)
+                    await self._ensure_tool_ready(after_failure=True)
+                    await asyncio.sleep(1)
                 except Exception as e:
                     print(f"   ⚠️  导航失败: {e}")
             
@@ -550,43 +1880,17 @@ class BaiduPicFilter:
         print(f"\n   🔄 第二阶段：浏览器重启重试...")
         for attempt in range(1, 3):
             print(f"   [{attempt}/2] 重启浏览器后尝试...")
+            self._progress_retries += 1
+            self._report_progress('重启浏览器重试')
             
             try:
-                # 关闭当前浏览器
-                print(f"   [重启] 关闭浏览器...")
-                if self.page:
-                    try:
-                        await self.page.close()
-                    except Exception:
-                        pass
-                
-                if self.context:
-                    try:
-                        await self.context.close()
-                    except Exception:
-                        pass
-                
-                if self.browser:
-                    try:
-                        await self.browser.close()
-                    except Exception:
-                        pass
-                
-                await asyncio.sleep(2)
-                
-                # 重启浏览器
-                print(f"   [重启] 启动新浏览器...")
-                await self.start()
-                
-                # 重新登录（使用已保存的Cookie）
-                print(f"   [重启] 检查登录状态...")
-                await self.ensure_login()
+                await self._restart_browser()
                 
                 await asyncio.sleep(2)
                 
                 # 导航到上传页面
                 print(f"   [重启] 导航到试卷去手写页面...")
-                await self.page.goto(self.base_url, wait_until='domcontentloaded', timeout=self.nav_timeout)
+                await self.page.goto(self.base_url, wait_until='domcontentloaded', timeout=self._nav_timeout_ms())
                 await asyncio.sleep(2)
                 
                 # 尝试上传
@@ -597,11 +1901,12 @@ class BaiduPicFilter:
             except Exception as e:
                 print(f"   ⚠️  浏览器重启失败: {e}")
                 
-                # 尝试恢复
-                try:
-                    await self.start()
-                except Exception:
-                    pass
+                # 尝试恢复（工作页由主客户端统一恢复）
+                if self._owner is None:
+                    try:
+                        await self.start()
+                    except Exception:
+                        pass
             
             if attempt < 2:
                 await asyncio.sleep(2)
@@ -609,53 +1914,194 @@ class BaiduPicFilter:
         print(f"   ❌ 已尝试所有重试方案，图片 '{file_name}' 上传失败")
         return False
     
+    async def _restart_browser(self):
+        """关闭并重启浏览器，使用已保存的Cookie重新登录"""
+        if self._owner is not None:
+            # 工作页只重建自己的标签页，不影响同一浏览器中的其他工作页
+            print(f"   [重启] 重建工作页...")
+            await self._owner._recover_worker_page(self)
+            return
+        
+        # 关闭当前浏览器
+        print(f"   [重启] 关闭浏览器...")
+        if self.page:
+            try:
+                await self.page.close()
+            except Exception:
+                pass
+        
+        if self.context:
+            try:
+                await self.context.close()
+            except Exception:
+                pass
+        
+        if self.browser:
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+        
+        await asyncio.sleep(2)
+        
+        # 重启浏览器
+        print(f"   [重启] 启动新浏览器...")
+        await self.start()
+        
+        # 重新登录（使用已保存的Cookie）
+        print(f"   [重启] 检查登录状态...")
+        await self.ensure_login()
+    
+    async def _probe_page(self) -> dict:
+        """
+        一次 evaluate 读取页面全部状态
+        
+        Returns:
+            dict: loggedIn / onLoginPage / uploadReady / uploadVia / uploadTargets / hasResult /
+                  processing / resultReady / errorText
+        """
+        state = await self.page.evaluate(page_probe.PROBE_CALL, self.base_url)
+        if state is None:
+            # 当前文档还没有探针：页面首次使用时注册初始化脚本，并为当前文档补装
+            if not self.page.probe_installed:
+                await self.page.add_init_script(page_probe.PROBE_SCRIPT)
+                self.page.probe_installed = True
+            await self.page.evaluate(page_probe.PROBE_SCRIPT)
+            state = await self.page.evaluate(page_probe.PROBE_CALL, self.base_url)
+        if self._trace is not None:
+            self._trace.note_probe(state)
+        return state
+    
+    async def _get_tool_state(self) -> dict:
+        """读取工具页当前状态：是否停留在结果页（hasResult）、上传控件是否就绪（uploadReady）"""
+        return await self._probe_page()
+    
+    async def _navigate_to_tool(self):
+        """整页导航到试卷去手写页面"""
+        print("📄 导航到试卷去手写页面...")
+        started = asyncio.get_event_loop().time()
+        await self.page.goto(self.base_url, wait_until='domcontentloaded', timeout=self._nav_timeout_ms())
+        self._record_latency('navigation', started)
+        await asyncio.sleep(1)
+        self.stats['reset_navigate'] += 1
+    
+    async def _reset_tool_in_place(self) -> bool:
+        """
+        在页面内点击"重新上传"重置上传控件，并确认重置生效
+        
+        Returns:
+            bool: 控件是否已回到可上传状态
+        """
+        for selector in self.reset_selectors:
+            try:
+                button = await self.page.query_selector(selector)
+                if not button or not await button.is_visible():
+                    continue
+                await button.click()
+            except Exception:
+                continue
+            
+            # 确认旧结果已消失且上传控件已恢复
+            loop = asyncio.get_event_loop()
+            deadline = loop.time() + self.reset_verify_timeout
+            while loop.time() < deadline:
+                try:
+                    state = await self._get_tool_state()
+                    if not state['hasResult'] and state['uploadReady']:
+                        print("   ✓ 已在页面内重置上传控件")
+                        self.stats['reset_in_place'] += 1
+                        return True
+                except Exception:
+                    pass
+                await asyncio.sleep(0.3)
+        return False
+    
+    async def _ensure_tool_ready(self, after_failure: bool = False):
+        """
+        确保上传控件处于可上传状态
+        
+        停留在结果页时优先页面内重置，重置失败或不在工具页时才整页导航
+        
+        Args:
+            after_failure: 上一次上传失败后调用，此时不信任当前页面状态
+        """
+        if self.base_url in self.page.url:
+            try:
+                state = await self._get_tool_state()
+            except Exception:
+                state = None
+            
+            if state:
+                if state['hasResult']:
+                    if await self._reset_tool_in_place():
+                        return
+                    print("   ⚠️  页面内重置失败，改为重新导航")
+                elif state['uploadReady'] and not after_failure:
+                    return
+        
+        await self._navigate_to_tool()
+    
+    def _upload_handle_cache(self) -> dict:
+        """当前页面缓存的上传控件句柄（方式名 -> 句柄），主框架导航后清空"""
+        page = self.page
+        if page.upload_handles is None:
+            cache = {}
+            page.upload_handles = cache
+            page.on('framenavigated', lambda frame: cache.clear() if frame.parent_frame is None else None)
+        return page.upload_handles
+    
+    async def _upload_with(self, name: str, handle, image_path: str) -> bool:
+        """用指定方式和控件句柄上传，结果计入该方式的统计"""
+        _, kind, label = STRATEGIES[name]
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        try:
+            if kind == 'input':
+                await handle.set_input_files(image_path)
+            else:
+                if name == 'mask':
+                    print("   ℹ️  检测到登录检查遮罩层，点击遮罩层...")
+                timeout = self._file_chooser_timeout_ms()
+                async with self.page.expect_file_chooser(timeout=timeout) as fc_info:
+                    await handle.click(timeout=timeout)
+                file_chooser = await fc_info.value
+                self._record_latency('file_chooser', started)
+                await file_chooser.set_files(image_path)
+        except Exception as e:
+            print(f"   ⚠️  通过{label}上传失败: {e}")
+            self.upload_learner.record(name, False, loop.time() - started)
+            return False
+        
+        self.upload_learner.record(name, True, loop.time() - started)
+        self._upload_handle_cache()[name] = handle
+        await asyncio.sleep(2)
+        print("   ✓ 图片已上传")
+        return True
+    
     async def _upload_image(self, image_path: str) -> bool:
-        """上传图片"""
+        """
+        上传图片
+        
+        优先复用上次成功的方式及其控件句柄（确认仍在文档中即可直接使用）；
+        否则用一次探针找出页面上可用的方式，按以往的成功率依次尝试
+        """
         try:
-            # 方法1: 直接找到input[type="file"]，用set_input_files（最直接）
-            file_input = await self.page.query_selector('input[type="file"][accept*="image"]')
-            
-            if file_input:
-                await file_input.set_input_files(image_path)
-                await asyncio.sleep(2)
-                print("   ✓ 图片已上传")
-                return True
-            
-            # 方法2: 如果有登录检查遮罩层，点击遮罩层会弹出文件选择器
-            login_mask = await self.page.query_selector('.aiTools-upload-file__login-check')
-            
-            if login_mask:
-                print("   ℹ️  检测到登录检查遮罩层，点击遮罩层...")
+            handles = self._upload_handle_cache()
+            preferred = self.upload_learner.preferred
+            if preferred in handles:
+                handle = handles.pop(preferred)
                 try:
-                    async with self.page.expect_file_chooser(timeout=10000) as fc_info:
-                        await login_mask.click()
-                    
-                    file_chooser = await fc_info.value
-                    await file_chooser.set_files(image_path)
-                    await asyncio.sleep(2)
-                    print("   ✓ 图片已上传")
+                    connected = await handle.evaluate("el => el.isConnected")
+                except Exception:
+                    connected = False
+                if connected and await self._upload_with(preferred, handle, image_path):
                     return True
-                except Exception as e:
-                    print(f"   ⚠️  通过遮罩层上传失败: {e}")
             
-            # 方法3: 点击上传按钮
-            upload_button = await self.page.query_selector('button.aiTools-upload-local__button')
-            
-            if not upload_button:
-                upload_button = await self.page.query_selector('text=/选择本地图片|选择|上传/i')
-            
-            if upload_button:
-                try:
-                    async with self.page.expect_file_chooser(timeout=10000) as fc_info:
-                        await upload_button.click()
-                    
-                    file_chooser = await fc_info.value
-                    await file_chooser.set_files(image_path)
-                    await asyncio.sleep(2)
-                    print("   ✓ 图片已上传")
+            state = await self._probe_page()
+            for name in self.upload_learner.order(state['uploadTargets']):
+                handle = await self.page.query_selector(STRATEGIES[name][0])
+                if handle and await self._upload_with(name, handle, image_path):
                     return True
-                except Exception as e:
-                    print(f"   ⚠️  通过按钮上传失败: {e}")
             
             print("   ⚠️  未找到上传方式")
             return False
@@ -665,29 +2111,26 @@ class BaiduPicFilter:
             return False
     
     async def _wait_for_processing(self, timeout: int = 120) -> bool:
-        """等待图片处理完成"""
+        """等待图片处理完成（结果类型记录在 last_wait_outcome）"""
+        self.last_wait_outcome = 'error'
         try:
             start_time = asyncio.get_event_loop().time()
             
             while True:
                 if asyncio.get_event_loop().time() - start_time > timeout:
                     print("   ⚠️  处理超时")
+                    self.last_wait_outcome = 'timeout'
                     return False
                 
-                # 查找下载按钮
-                download_button = await self.page.query_selector('text=/下载|download/i')
-                if download_button and await download_button.is_visible():
-                    print("   ✓ 处理完成！")
-                    return True
-                
-                # 检查页面文本
-                page_text = await self.page.inner_text('body')
-                if '处理完成' in page_text or '下载' in page_text:
+                # 下载按钮或完成提示出现即处理完成，页面提示失败/错误则放弃（一次探针）
+                state = await self._probe_page()
+                if state['resultReady']:
                     print("   ✓ 处理完成！")
+                    self.last_wait_outcome = 'ok'
                     return True
                 
-                if '失败' in page_text or '错误' in page_text:
-                    print("   ❌ 处理失败")
+                if state['errorText']:
+                    print(f"   ❌ 处理失败: {state['errorText']}")
                     return False
                 
                 await asyncio.sleep(1)
@@ -701,36 +2144,9 @@ class BaiduPicFilter:
             print(f"   ❌ 等待处理时出错: {e}")
             return False
     
-    async def _download_result(self, original_image_path: str) -> bool:
+    async def _download_result(self, original_image_path: str, output_path: Optional[Path] = None) -> bool:
         """从 base64 获取处理后的图片并保存"""
         try:
-            import base64
-            from datetime import datetime
-            
-            # 获取原始文件信息
-            source_path = Path(original_image_path)
-            file_stem = source_path.stem
-            file_suffix = source_path.suffix
-            
-            # 使用用户指定的输出文件夹
-            output_dir = self.output_dir
-            output_dir.mkdir(parents=True, exist_ok=True)
-            
-            # 生成时间戳
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            
-            # 避免重复添加 "_去手写" 后缀
-            if "_去手写_" in file_stem:
-                # 如果文件名已包含 "_去手写_"，则移除旧的时间戳部分
-                # 例如：filename_去手写_20251104_205943 -> filename
-                parts = file_stem.split("_去手写_")
-                clean_stem = parts[0]
-                output_filename = f"{clean_stem}_去手写_{timestamp}{file_suffix}"
-            else:
-                output_filename = f"{file_stem}_去手写_{timestamp}{file_suffix}"
-            
-            output_path = output_dir / output_filename
-            
             print(f"   🔍 从 base64 获取处理结果...")
             
             # 从 img#resultImg 的 src 获取 base64
@@ -740,40 +2156,259 @@ class BaiduPicFilter:
                     const img = document.querySelector("img#resultImg");
                     return img ? img.src : null;
                 }''')
-                
-                if img_src and img_src.startswith('data:'):
-                    print(f"   ✓ 检测到 base64 数据")
-                    
-                    # 解析 base64
-                    # 格式: data:image/jpeg;base64,/9j/4AAQSkZJRgAB...
-                    if ',' in img_src:
-                        base64_data = img_src.split(',', 1)[1]
-                        
-                        # 解码并保存
-                        try:
-                            image_bytes = base64.b64decode(base64_data)
-                            with open(output_path, 'wb') as f:
-                                f.write(image_bytes)
-                            
-                            print(f"   ✓ 已保存到: {output_path}")
-                            return True
-                        except Exception as e:
-                            print(f"   ⚠️  base64 解码保存失败: {e}")
-                            return False
-                else:
-                    print(f"   ⚠️  未找到 base64 数据或格式错误")
-                    return False
-                    
             except Exception as e:
                 print(f"   ❌ 获取 base64 失败: {e}")
                 return False
             
+            return await self._save_result_data(original_image_path, img_src, output_path)
+            
         except Exception as e:
             print(f"   ❌ 下载出错: {e}")
             return False
     
+    def _build_output_path(self, original_image_path: str, suffix: Optional[str] = None) -> Path:
+        """
+        根据原始文件名生成带 "_去手写_时间戳" 后缀的输出路径
+        
+        Args:
+            original_image_path: 原始图片路径
+            suffix: 文件后缀（默认沿用原文件后缀）
+        """
+        from datetime import datetime
+        
+        # 获取原始文件信息
+        source_path = Path(original_image_path)
+        file_stem = source_path.stem
+        file_suffix = suffix or source_path.suffix
+        
+        # 输出文件夹中的位置由输出布局决定（预检修正后的副本按原文件的位置存放）；
+        # 写入归档时只用作归档内的路径，不创建目录
+        placement = self._progress_path or original_image_path
+        if self._get_archive() is not None:
+            output_dir = self.output_dir / self.output_layout.relative_dir(placement)
+        else:
+            output_dir = self.output_layout.directory_for(placement, self.output_dir)
+        
+        # 生成时间戳
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        # 避免重复添加 "_去手写" 后缀
+        if "_去手写_" in file_stem:
+            # 如果文件名已包含 "_去手写_"，则移除旧的时间戳部分
+            # 例如：filename_去手写_20251104_205943 -> filename
+            parts = file_stem.split("_去手写_")
+            clean_stem = parts[0]
+            output_filename = f"{clean_stem}_去手写_{timestamp}{file_suffix}"
+        else:
+            output_filename = f"{file_stem}_去手写_{timestamp}{file_suffix}"
+        
+        return output_dir / output_filename
+    
+    async def _save_result_data(self, original_image_path: str, img_src: Optional[str],
+                                output_path: Optional[Path] = None) -> bool:
+        """
+        将结果图片的 data URL 解码后保存到输出文件夹
+        
+        配置了输出编码选项时，最终结果交给后台进程池重新编码并写入，
+        不占用驱动浏览器的事件循环；指定 output_path 的中间结果（图块、文档页面）
+        始终原样写入
+        
+        Args:
+            original_image_path: 对应的原始图片路径（用于生成输出文件名）
+            img_src: 结果图片的 src（data:image/...;base64,...）
+            output_path: 指定保存路径（默认按原文件名生成）
+            
+        Returns:
+            bool: 是否保存成功（后台编码时表示已提交）
+        """
+        import base64
+        
+        # 格式: data:image/jpeg;base64,/9j/4AAQSkZJRgAB...
+        if not img_src or not img_src.startswith('data:') or ',' not in img_src:
+            print(f"   ⚠️  未找到 base64 数据或格式错误")
+            return False
+        
+        print(f"   ✓ 检测到 base64 数据")
+        header, base64_data = img_src.split(',', 1)
+        mime = header[len('data:'):].split(';', 1)[0]
+        
+        # 解码并保存
+        try:
+            image_bytes = base64.b64decode(base64_data)
+            
+            if output_path is None:
+                # 后缀以实际数据格式为准，避免 .png 文件里存放 JPEG 数据
+                source_suffix = Path(original_image_path).suffix
+                output_path = self._build_output_path(
+                    original_image_path, output_encoder.suffix_for_mime(mime, source_suffix)
+                )
+                if self._get_archive() is not None:
+                    await self._save_to_archive(original_image_path, output_path, image_bytes, mime=mime)
+                    return True
+                if self.output_options and not self.output_options.is_passthrough:
+                    self._submit_output(original_image_path, image_bytes, output_path, mime)
+                    return True
+            
+            with open(output_path, 'wb') as f:
+                f.write(image_bytes)
+            
+            self._set_output_path(original_image_path, output_path)
+            print(f"   ✓ 已保存到: {output_path}")
+            return True
+        except Exception as e:
+            print(f"   ⚠️  base64 解码保存失败: {e}")
+            return False
+    
+    def _set_output_path(self, source_path, output_path: Path):
+        """记录图片的输出路径（近似重复图片的代表图片另外登记，批量结束后用于分发结果）"""
+        self.last_output_path = output_path
+        root = self._owner or self
+        if str(source_path) in root._representative_outputs:
+            root._representative_outputs[str(source_path)] = output_path
+    
+    def _get_output_pool(self) -> ProcessPoolExecutor:
+        root = self._owner or self
+        if root._output_pool is None:
+            root._output_pool = ProcessPoolExecutor(max_workers=root.output_workers)
+        return root._output_pool
+    
+    def _get_archive(self) -> Optional[ArchiveSink]:
+        """当前的归档输出（启用归档时首次使用才创建，并恢复输出文件夹中中断的归档）"""
+        root = self._owner or self
+        if not root.archive_format:
+            return None
+        if root._archive is None:
+            for target, count in recover_archives(str(root.output_dir), root.archive_recover_after):
+                print(f"🗜️  已恢复中断的归档: {target.name}（{count} 个文件）")
+            root._archive = ArchiveSink(str(root.output_dir), root.archive_format,
+                                        max_bytes=root.archive_max_bytes, max_entries=root.archive_max_entries)
+        return root._archive
+    
+    def _archive_name(self, output_path: Path) -> str:
+        """输出路径在归档中的条目名（相对主客户端的输出文件夹）"""
+        root = self._owner or self
+        try:
+            return Path(output_path).relative_to(root.output_dir).as_posix()
+        except ValueError:
+            return Path(output_path).name
+    
+    async def _save_to_archive(self, original_image_path: str, output_path: Path, data: Optional[bytes] = None,
+                               file_path: Optional[Path] = None, mime: Optional[str] = None) -> Path:
+        """
+        把一张结果写入归档（写入在线程池中进行，不阻塞事件循环）
+        
+        Args:
+            original_image_path: 原始图片路径
+            output_path: 按输出布局生成的路径（决定条目名）
+            data: 结果内容
+            file_path: 结果文件（与 data 二选一，大文件按块复制）
+            mime: 图片类型；给出时按输出编码选项在后台进程池中重新编码
+            
+        Returns:
+            Path: "<归档>/<条目名>"
+        """
+        loop = asyncio.get_event_loop()
+        archive = self._get_archive()
+        if mime is not None and self.output_options and not self.output_options.is_passthrough:
+            if data is None:
+                data = await loop.run_in_executor(None, Path(file_path).read_bytes)
+            source_format = {'image/png': 'png', 'image/webp': 'webp'}.get(mime.lower(), 'jpeg')
+            data, suffix = await loop.run_in_executor(
+                self._get_output_pool(), output_encoder.encode_image, data, self.output_options, source_format
+            )
+            output_path = output_path.with_suffix(suffix)
+        
+        name = self._archive_name(output_path)
+        if data is not None:
+            location = await loop.run_in_executor(None, archive.add, name, data, str(original_image_path))
+        else:
+            location = await loop.run_in_executor(None, archive.add_file, name, str(file_path),
+                                                  str(original_image_path))
+        self._set_output_path(original_image_path, location)
+        print(f"   ✓ 已写入归档: {location}")
+        return location
+    
+    def close_archive(self) -> list:
+        """写入索引并关闭当前归档，返回本次写入的归档文件"""
+        root = self._owner or self
+        if root._archive is None:
+            return []
+        archive, root._archive = root._archive, None
+        return archive.close()
+    
+    def _submit_output(self, original_image_path: str, image_bytes: bytes, output_path: Path, mime: str):
+        """提交后台编码任务（进程池），完成后再写入文件"""
+        root = self._owner or self
+        source_format = {'image/png': 'png', 'image/webp': 'webp'}.get(mime.lower(), 'jpeg')
+        self._set_output_path(original_image_path, output_path.with_suffix(
+            output_encoder.FORMAT_SUFFIXES[output_encoder.target_format(self.output_options, source_format)]
+        ))
+        future = asyncio.get_event_loop().run_in_executor(
+            self._get_output_pool(), output_encoder.encode_and_save,
+            image_bytes, self.output_options, str(output_path.with_suffix('')), source_format
+        )
+        root._pending_outputs.add(future)
+        future.add_done_callback(functools.partial(root._on_output_done, original_image_path))
+        print(f"   ✓ 已提交后台编码")
+    
+    def _on_output_done(self, original_image_path: str, future: asyncio.Future):
+        """后台编码完成回调；编码失败时把该图片改记为失败"""
+        self._pending_outputs.discard(future)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            file_name = Path(original_image_path).name
+            print(f"   ❌ 输出编码失败: {file_name} - {error}")
+            self._record_result(original_image_path, 'failed', error=f"输出编码失败: {error}")
+            self.stats['success'] -= 1
+            self.stats['failed'] += 1
+            self.stats['failed_files'].append(file_name)
+        else:
+            print(f"   ✓ 已编码保存: {future.result()}")
+    
+    async def flush_outputs(self):
+        """等待所有后台编码任务写入完成"""
+        root = self._owner or self
+        if root._pending_outputs:
+            print(f"⏳ 等待 {len(root._pending_outputs)} 个输出编码完成...")
+            await asyncio.gather(*list(root._pending_outputs), return_exceptions=True)
+    
     async def close(self):
         """关闭浏览器并清理资源"""
+        if self._owner is not None:
+            # 工作客户端只关闭自己的页面，浏览器由主客户端关闭
+            try:
+                await self.page.close()
+            except Exception:
+                pass
+            return
+        
+        for worker in self._workers:
+            await worker.close()
+        self._workers = []
+        if self._hedge_worker is not None:
+            await self._hedge_worker.close()
+            self._hedge_worker = None
+        
+        await self.flush_outputs()
+        self.close_archive()
+        if self._output_pool is not None:
+            self._output_pool.shutdown(wait=True)
+            self._output_pool = None
+        
+        if self._manifest is not None:
+            self._manifest.close()
+            self._manifest = None
+        
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
+        
+        if self._preflight_dir is not None:
+            shutil.rmtree(self._preflight_dir, ignore_errors=True)
+            self._preflight_dir = None
+        
         try:
             if self.page:
                 try:
@@ -799,170 +2434,82 @@ class BaiduPicFilter:
     
     def get_stats(self) -> dict:
         """获取统计信息"""
-        return self.stats.copy()
+        stats = self.stats.copy()
+        stats['upload_strategies'] = self.upload_learner.snapshot()
+        if self.resource_monitor is not None:
+            stats['resources'] = self.resource_monitor.snapshot()
+        if self.diagnostics is not None:
+            stats['diagnostics'] = self.diagnostics.snapshot()
+        return stats
 
-    async def _capture_and_display_qrcode(self):
-        """获取二维码并在控制台/GUI 显示"""
+    async def _show_login_ui(self, qrcode_bytes: Optional[bytes] = None, done: bool = False):
+        """
+        调用登录界面回调（显示/更新二维码，或 done=True 时关闭）
+        
+        回调可以是同步或异步函数；异步回调在后台执行，不阻塞登录检测
+        """
+        if not self.display_login_ui:
+            return
+        if done and not self._login_ui_shown:
+            return
+        self._login_ui_shown = not done
         try:
-            import base64
-            from io import BytesIO
-            
-            print("\n   🔍 正在获取二维码...")
-            qrcode_data = None
-            
-            # 方法1: 从 URL 获取二维码（百度登录页面的情况）
-            try:
-                img_url = await self.page.evaluate('''() => {
-                    const img = document.querySelector('img.tang-pass-qrcode-img') || 
-                                document.querySelector('img[src*="qrcode"]');
-                    return img ? img.src : null;
-                }''')
-                
-                if img_url and img_url.startswith('http'):
-                    print(f"   ✓ 检测到 URL 二维码")
-                    
-                    # 下载二维码图片
-                    try:
-                        import urllib.request
-                        qrcode_path = "qrcode_screenshot.png"
-                        urllib.request.urlretrieve(img_url, qrcode_path)
-                        print(f"   ✓ 二维码已下载到: {qrcode_path}")
-                        
-                        # 读取文件作为 base64
-                        with open(qrcode_path, 'rb') as f:
-                            qrcode_data = base64.b64encode(f.read()).decode('utf-8')
-                        
-                        # 显示 GUI 登录窗口或 ASCII 版本
-                        if self.display_login_ui:
-                            # 支持同步和异步回调
-                            import inspect
-                            if inspect.iscoroutinefunction(self.display_login_ui):
-                                await self.display_login_ui(qrcode_base64=qrcode_data)
-                            else:
-                                self.display_login_ui(qrcode_base64=qrcode_data)
-                        else:
-                            from PIL import Image
-                            img = Image.open(qrcode_path)
-                            await self._print_ascii_qrcode_from_image(img)
-                        return
-                    except Exception as e:
-                        print(f"   ⚠️  处理二维码失败: {e}")
-            except Exception as e:
-                print(f"   ⚠️  无法从 URL 获取: {e}")
-            
-            # 方法2: 从 base64 获取二维码
-            try:
-                img_src = await self.page.evaluate('''() => {
-                    const img = document.querySelector('img#resultImg') || 
-                                document.querySelector('img[src*="base64"]');
-                    return img ? img.src : null;
-                }''')
-                
-                if img_src and img_src.startswith('data:'):
-                    print("   ✓ 检测到 base64 二维码数据")
-                    
-                    if ',' in img_src:
-                        base64_data = img_src.split(',', 1)[1]
-                        image_bytes = base64.b64decode(base64_data)
-                        
-                        qrcode_path = "qrcode_screenshot.png"
-                        with open(qrcode_path, 'wb') as f:
-                            f.write(image_bytes)
-                        print(f"   ✓ 二维码已保存到: {qrcode_path}")
-                        
-                        # 显示 GUI 登录窗口或 ASCII 版本
-                        if self.display_login_ui:
-                            # 支持同步和异步回调
-                            import inspect
-                            if inspect.iscoroutinefunction(self.display_login_ui):
-                                await self.display_login_ui(qrcode_base64=base64_data)
-                            else:
-                                self.display_login_ui(qrcode_base64=base64_data)
-                        else:
-                            await self._print_ascii_qrcode_from_base64(base64_data)
-                        return
-            except Exception as e:
-                print(f"   ⚠️  无法从 base64 获取: {e}")
-            
-            # 方法3: 从页面截图获取二维码区域
-            try:
-                qrcode_elem = await self.page.query_selector(
-                    '.Qrcode-status-con, #TANGRAM__PSP_3__QrcodeMain, '
-                    '#TANGRAM__PSP_11__footerQrcodeBtn, .qrcode-container, [id*="qrcode"]'
-                )
-                
-                if qrcode_elem:
-                    is_visible = await qrcode_elem.is_visible()
-                    if is_visible:
-                        box = await qrcode_elem.bounding_box()
-                        if box:
-                            print("   📸 正在截图二维码区域...")
-                            qrcode_path = "qrcode_screenshot.png"
-                            await self.page.screenshot(path=qrcode_path, clip={
-                                'x': max(0, box['x'] - 10),
-                                'y': max(0, box['y'] - 10),
-                                'width': box['width'] + 20,
-                                'height': box['height'] + 20
-                            })
-                            print(f"   ✓ 二维码已截图到: {qrcode_path}")
-                            
-                            try:
-                                with open(qrcode_path, 'rb') as f:
-                                    qrcode_data = base64.b64encode(f.read()).decode('utf-8')
-                                
-                                if self.display_login_ui:
-                                    # 支持同步和异步回调
-                                    import inspect
-                                    if inspect.iscoroutinefunction(self.display_login_ui):
-                                        await self.display_login_ui(qrcode_base64=qrcode_data)
-                                    else:
-                                        self.display_login_ui(qrcode_base64=qrcode_data)
-                                else:
-                                    from PIL import Image
-                                    img = Image.open(qrcode_path)
-                                    await self._print_ascii_qrcode_from_image(img)
-                            except Exception:
-                                pass
-                            return
-            except Exception as e:
-                print(f"   ⚠️  截图失败: {e}")
-            
-            # 方法4: 截图整个登录区域
-            print("   📸 正在截图登录框...")
-            qrcode_path = "login_screenshot.png"
-            await self.page.screenshot(path=qrcode_path)
-            print(f"   ✓ 登录框已截图到: {qrcode_path}")
-            
-            if self.display_login_ui:
-                try:
-                    with open(qrcode_path, 'rb') as f:
-                        qrcode_data = base64.b64encode(f.read()).decode('utf-8')
-                    # 支持同步和异步回调
-                    import inspect
-                    if inspect.iscoroutinefunction(self.display_login_ui):
-                        await self.display_login_ui(qrcode_base64=qrcode_data)
-                    else:
-                        self.display_login_ui(qrcode_base64=qrcode_data)
-                except Exception:
-                    pass
-            
+            result = self.display_login_ui(qrcode_bytes=qrcode_bytes, done=done)
+            if inspect.isawaitable(result):
+                self._login_ui_task = asyncio.ensure_future(result)
         except Exception as e:
-            print(f"   ⚠️  获取二维码出错: {e}")
+            print(f"   ⚠️  显示登录界面出错: {e}")
     
-    async def _print_ascii_qrcode_from_base64(self, base64_data: str):
-        """从 base64 数据生成并打印 ASCII 二维码"""
+    async def _show_qrcode(self, image_bytes: bytes):
+        """在 GUI 或控制台显示二维码（图片字节直接传递，不写临时文件）"""
+        if self.display_login_ui:
+            await self._show_login_ui(qrcode_bytes=image_bytes)
+            return
         try:
-            import base64
             from PIL import Image
             from io import BytesIO
+            await self._print_ascii_qrcode_from_image(Image.open(BytesIO(image_bytes)))
+        except Exception as e:
+            print(f"   ⚠️  无法显示 ASCII 二维码: {e}")
+        print("\n✅ 请使用手机扫描上方二维码进行登录...")
+        print("   (或在浏览器中输入账号密码登录)\n")
+    
+    async def _capture_qrcode(self) -> Optional[bytes]:
+        """从页面取出二维码图片字节（图片地址 / data: 数据 / 元素截图 / 整页截图）"""
+        try:
+            import base64
             
-            # 解码 base64 为图片
-            image_bytes = base64.b64decode(base64_data)
-            image = Image.open(BytesIO(image_bytes))
+            # 方法1: 二维码图片地址或 data: 数据
+            img_src = await self.page.evaluate('''() => {
+                const img = document.querySelector('img.tang-pass-qrcode-img') || 
+                            document.querySelector('img[src*="qrcode"]');
+                return img ? img.src : null;
+            }''')
+            if img_src and img_src.startswith('http'):
+                response = await self.context.request.get(img_src)
+                if response.ok:
+                    print("   ✓ 检测到 URL 二维码")
+                    return await response.body()
+            elif img_src and img_src.startswith('data:') and ',' in img_src:
+                print("   ✓ 检测到 base64 二维码数据")
+                return base64.b64decode(img_src.split(',', 1)[1])
+            
+            # 方法2: 截取二维码区域
+            qrcode_elem = await self.page.query_selector(
+                '.Qrcode-status-con, #TANGRAM__PSP_3__QrcodeMain, '
+                '#TANGRAM__PSP_11__footerQrcodeBtn, .qrcode-container, [id*="qrcode"]'
+            )
+            if qrcode_elem and await qrcode_elem.is_visible():
+                print("   📸 正在截图二维码区域...")
+                return await qrcode_elem.screenshot()
+            
+            # 方法3: 截图整个登录区域
+            print("   📸 正在截图登录框...")
+            return await self.page.screenshot()
             
-            await self._print_ascii_qrcode_from_image(image)
         except Exception as e:
-            print(f"   ⚠️  无法显示 ASCII 二维码: {e}")
+            print(f"   ⚠️  获取二维码出错: {e}")
+            return None
     
     async def _print_ascii_qrcode_from_image(self, image):
         """从 PIL Image 生成并打印 ASCII 二维码"""
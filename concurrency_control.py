@@ -0,0 +1,181 @@
+"""
+自适应并行度控制
+按 AIMD（加性增、乘性减）调整同时在服务端处理的图片数：
+处理耗时保持平稳、几乎没有失败时每轮加 1；出现失败或超时时立即减半，
+耗时明显升高时减 1。每次调整都记录原因，便于观察服务端的实际承载能力
+"""
+import asyncio
+import statistics
+import time
+from collections import deque
+from typing import Optional
+
+
+class AIMDController:
+    """
+    AIMD 并行度控制器
+
+    用法：
+        await controller.acquire()
+        try:
+            ...  # 上传并等待处理
+        finally:
+            controller.release(耗时, 结果)
+
+    结果为 'ok' / 'error'（页面提示失败或错误）/ 'timeout' / 'upload'（上传失败）
+    """
+
+    def __init__(self, initial: int = 1, min_limit: int = 1, max_limit: int = 8,
+                 decrease_factor: float = 0.5, latency_tolerance: float = 1.5,
+                 error_threshold: float = 0.1, baseline_windows: int = 10):
+        """
+        Args:
+            initial: 初始并行度
+            min_limit: 并行度下限
+            max_limit: 并行度上限（不超过打开的工作页数）
+            decrease_factor: 失败/超时时的乘性减系数
+            latency_tolerance: 一轮的中位耗时超过基线的多少倍视为延迟升高
+            error_threshold: 一轮中失败比例超过该值时不再上调
+            baseline_windows: 基线取最近多少轮中位耗时的最小值（随服务端一天中的快慢变化）
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.error_threshold = error_threshold
+
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.in_flight = 0
+        self.peak_in_flight = 0  # 本轮中同时在处理的最大数量（用于判断上限是否真正用满）
+        self._window_latencies: list = []
+        self._window_errors = 0
+        self._since_decrease = 0  # 上次减小后完成的数量
+        self._cooldown = 0  # 减小前的并行度：按旧并行度发出的请求完成之前不再减小
+        self._baselines = deque(maxlen=baseline_windows)
+        self._changed: Optional[asyncio.Condition] = None
+
+        self.decisions = deque(maxlen=50)
+        self.completed = 0
+        self.errors = 0
+
+    @property
+    def limit(self) -> int:
+        """当前允许同时处理的图片数"""
+        return int(self._limit)
+
+    @property
+    def baseline(self) -> Optional[float]:
+        return min(self._baselines) if self._baselines else None
+
+    async def acquire(self):
+        """等待一个处理名额"""
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        async with self._changed:
+            while self.in_flight >= self.limit:
+                await self._changed.wait()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def try_acquire(self) -> bool:
+        """有空闲名额时立即占用（用于重复提交等可放弃的额外请求）"""
+        if self.in_flight >= self.limit:
+            return False
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return True
+
+    def release(self, latency: float, outcome: str = 'ok'):
+        """
+        归还名额并记录本次结果
+
+        Args:
+            latency: 等待服务端处理的耗时（秒）
+            outcome: 'ok' / 'error' / 'timeout' / 'upload'，'cancelled' 表示中途放弃（不计入统计）
+        """
+        self.in_flight -= 1
+        if outcome == 'cancelled':
+            self._wake()
+            return
+        self.completed += 1
+        self._since_decrease += 1
+
+        if outcome == 'ok':
+            self._window_latencies.append(latency)
+        else:
+            self.errors += 1
+            self._window_errors += 1
+            # 按旧并行度发出的请求失败不再重复惩罚
+            if self._since_decrease >= self._cooldown:
+                reason = {'timeout': '处理超时', 'upload': '上传失败'}.get(outcome, '服务端返回失败/错误')
+                self._set_limit(self._limit * self.decrease_factor, reason)
+                self._reset_window()
+
+        # 每完成一轮（约等于当前并行度的数量）评估一次
+        if len(self._window_latencies) + self._window_errors >= self.limit:
+            self._evaluate_window()
+
+        self._wake()
+
+    def _evaluate_window(self):
+        samples = self._window_latencies
+        total = len(samples) + self._window_errors
+        error_rate = self._window_errors / total if total else 0.0
+        median = statistics.median(samples) if samples else None
+        baseline = self.baseline
+        saturated = self.peak_in_flight >= self.limit
+
+        if median is not None:
+            self._baselines.append(median)
+
+        cooling = self._since_decrease < self._cooldown
+        if median is not None and baseline is not None and median > baseline * self.latency_tolerance:
+            if cooling:
+                # 仍有按旧并行度发出的请求，耗时偏高在预期之内
+                self._reset_window()
+                return
+            self._set_limit(self._limit - 1,
+                            f"延迟升高（中位 {median:.1f}s，基线 {baseline:.1f}s）")
+        elif error_rate <= self.error_threshold and saturated and self.limit < self.max_limit:
+            detail = f"中位 {median:.1f}s" if median is not None else "无样本"
+            self._set_limit(self._limit + 1, f"延迟平稳（{detail}），失败率 {error_rate:.0%}")
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_latencies = []
+        self._window_errors = 0
+        self.peak_in_flight = self.in_flight
+
+    def _set_limit(self, value: float, reason: str):
+        old = self.limit
+        self._limit = min(float(self.max_limit), max(float(self.min_limit), value))
+        if self.limit < old:
+            self._since_decrease = 0
+            self._cooldown = old
+        if self.limit == old:
+            return
+        self.decisions.append({'time': time.time(), 'from': old, 'to': self.limit, 'reason': reason})
+        print(f"   {'📈' if self.limit > old else '📉'} 并行度 {old} → {self.limit}：{reason}")
+
+    def _wake(self):
+        if self._changed is None:
+            return
+
+        async def notify():
+            async with self._changed:
+                self._changed.notify_all()
+
+        asyncio.ensure_future(notify())
+
+    def snapshot(self) -> dict:
+        """当前状态和最近的调整记录"""
+        return {
+            'limit': self.limit,
+            'in_flight': self.in_flight,
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'baseline': self.baseline,
+            'completed': self.completed,
+            'errors': self.errors,
+            'decisions': list(self.decisions)[-10:],
+        }
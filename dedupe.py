@@ -0,0 +1,166 @@
+"""
+近似重复图片检测
+同一页试卷被扫描两次或重新拍照时，只需处理一次：在进程池中计算所有输入图片的感知哈希
+（dHash，安装 NumPy 时另算 pHash），用 NumPy 位运算成块计算汉明距离，
+把近似重复的图片归为一组，每组只处理一张代表图片，结果复制给组内其他图片
+
+聚类以代表图片为中心（组内每张图片都与代表图片足够接近），不会因为链式相似把不同的页面连成一组；
+代表图片取分辨率最高的一张
+"""
+import math
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+HASH_SIZE = 8  # 8×8 = 64 位哈希
+PHASH_SIZE = 32  # pHash 先缩放到 32×32 再做 DCT
+BLOCK_ROWS = 512  # 每次计算 512 行的距离（10000 张时每块约 40MB）
+
+
+def _dhash(gray: Image.Image) -> int:
+    """差异哈希：相邻像素比较亮度"""
+    small = gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def _dct_matrix(n: int):
+    k = np.arange(n).reshape(-1, 1)
+    i = np.arange(n).reshape(1, -1)
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * math.sqrt(2 / n)
+    matrix[0] /= math.sqrt(2)
+    return matrix
+
+
+def _phash(gray: Image.Image) -> int:
+    """感知哈希：低频 DCT 系数与中位数比较（对缩放、轻微平移和压缩更稳定）"""
+    small = np.asarray(gray.resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.LANCZOS), dtype=np.float64)
+    dct = _dct_matrix(PHASH_SIZE)
+    low = (dct @ small @ dct.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    bits = low > np.median(low[1:])
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def image_hashes(path: str) -> Optional[Tuple[int, Optional[int], int, int]]:
+    """
+    计算一张图片的哈希（在进程池中执行）
+
+    Returns:
+        (dHash, pHash 或 None, 宽, 高)；无法读取时返回 None
+    """
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            # JPEG 在解码阶段直接缩小，不必解码整张大图
+            img.draft('L', (PHASH_SIZE * 2, PHASH_SIZE * 2))
+            gray = img.convert('L')
+        return _dhash(gray), (_phash(gray) if np is not None else None), width, height
+    except Exception:
+        return None
+
+
+def _popcount(values):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    table = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    values = np.ascontiguousarray(values)
+    return table[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+
+def _near_matrix(rows, dhashes, phashes, log_aspects, max_distance: int, max_aspect_diff: float):
+    """rows 中每张图片与全部图片是否近似重复（布尔矩阵）"""
+    near = _popcount(dhashes[rows, None] ^ dhashes[None, :]) <= max_distance
+    if phashes is not None:
+        near &= _popcount(phashes[rows, None] ^ phashes[None, :]) <= max_distance
+    near &= np.abs(log_aspects[rows, None] - log_aspects[None, :]) <= max_aspect_diff
+    return near
+
+
+def _near_row_python(row: int, hashes: list, max_distance: int, max_aspect_diff: float) -> List[bool]:
+    """没有 NumPy 时逐对比较"""
+    d, _, width, height = hashes[row]
+    aspect = math.log(width / height)
+    result = []
+    for other_d, _, other_w, other_h in hashes:
+        result.append(
+            bin(d ^ other_d).count('1') <= max_distance
+            and abs(aspect - math.log(other_w / other_h)) <= max_aspect_diff
+        )
+    return result
+
+
+def find_duplicates(paths: List[str], max_distance: int = 4, max_aspect_diff: float = 0.05,
+                    executor: Optional[Executor] = None) -> Dict[str, List[str]]:
+    """
+    找出近似重复的图片
+
+    Args:
+        paths: 图片路径
+        max_distance: 汉明距离不超过该值视为近似重复（dHash 和 pHash 都需满足）
+        max_aspect_diff: 宽高比（对数）差异上限，避免不同版式的页面被归为一组
+        executor: 计算哈希用的进程池（默认在当前进程中计算）
+
+    Returns:
+        dict: 代表图片 -> 与之重复的其他图片（没有重复的图片不出现）
+    """
+    paths = [str(p) for p in paths]
+    if len(paths) < 2:
+        return {}
+    if executor is not None:
+        results = list(executor.map(image_hashes, paths, chunksize=max(1, len(paths) // 64)))
+    else:
+        results = [image_hashes(p) for p in paths]
+
+    # 无法读取的图片不参与去重，照常处理；分辨率高的排在前面优先作为代表
+    valid = [(p, h) for p, h in zip(paths, results) if h is not None and h[2] and h[3]]
+    valid.sort(key=lambda item: -(item[1][2] * item[1][3]))
+    count = len(valid)
+    groups: Dict[str, List[str]] = {}
+    if count < 2:
+        return groups
+
+    hashes = [h for _, h in valid]
+    if np is not None:
+        dhashes = np.array([h[0] for h in hashes], dtype=np.uint64)
+        phashes = np.array([h[1] for h in hashes], dtype=np.uint64) if hashes[0][1] is not None else None
+        log_aspects = np.log(np.array([h[2] / h[3] for h in hashes], dtype=np.float64))
+        assigned = np.zeros(count, dtype=bool)
+        for start in range(0, count, BLOCK_ROWS):
+            rows = np.arange(start, min(start + BLOCK_ROWS, count))
+            near = _near_matrix(rows, dhashes, phashes, log_aspects, max_distance, max_aspect_diff)
+            for offset, row in enumerate(rows):
+                if assigned[row]:
+                    continue
+                assigned[row] = True
+                members = np.nonzero(near[offset] & ~assigned)[0]
+                if members.size:
+                    assigned[members] = True
+                    groups[valid[row][0]] = [valid[m][0] for m in members]
+    else:
+        assigned = [False] * count
+        for row in range(count):
+            if assigned[row]:
+                continue
+            assigned[row] = True
+            near = _near_row_python(row, hashes, max_distance, max_aspect_diff)
+            members = [m for m in range(count) if near[m] and not assigned[m]]
+            for m in members:
+                assigned[m] = True
+            if members:
+                groups[valid[row][0]] = [valid[m][0] for m in members]
+    return groups
@@ -0,0 +1,241 @@
+"""
+低开销故障诊断
+诊断模式下为每张图片记录一份轻量轨迹：驱动调用（方法名、耗时、异常）、网络请求摘要和页面探针结果的变化，
+最近几张图片的轨迹保存在内存中滚动覆盖；只有图片处理失败或耗时超过阈值时，
+才把轨迹、当时的页面截图和这张图片期间的网络请求（HAR 格式）写入磁盘
+
+记录本身的耗时会被累计，统计中给出占图片处理总耗时的比例
+"""
+import json
+import time
+import weakref
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+
+class ImageTrace:
+    """一张图片的轻量轨迹"""
+
+    def __init__(self, image_path: str, max_events: int):
+        self.image = str(image_path)
+        self.started = time.time()
+        self._perf_started = time.perf_counter()
+        self.actions = deque(maxlen=max_events)
+        self.network = deque(maxlen=max_events)
+        self.probes = deque(maxlen=max_events)
+        self.outcome: Optional[str] = None
+        self.error: Optional[str] = None
+        self.elapsed: Optional[float] = None
+        self.overhead = 0.0  # 记录轨迹本身花费的时间（秒）
+
+    def _offset(self) -> float:
+        return round(time.perf_counter() - self._perf_started, 3)
+
+    def note_action(self, name: str, seconds: float, error: Optional[BaseException]):
+        """驱动调用（由 RoundTripCounter.listener 回调）"""
+        started = time.perf_counter()
+        self.actions.append({
+            't': self._offset(),
+            'call': name,
+            'ms': round(seconds * 1000, 1),
+            'error': f"{type(error).__name__}: {error}"[:300] if error is not None else None,
+        })
+        self.overhead += time.perf_counter() - started
+
+    def note_response(self, response):
+        """网络响应摘要（页面 response 事件）"""
+        started = time.perf_counter()
+        try:
+            request = response.request
+            self.network.append({
+                't': self._offset(),
+                'wall': time.time(),
+                'method': request.method,
+                'url': response.url[:500],
+                'type': request.resource_type,
+                'status': response.status,
+                'ttfb_ms': request.timing.get('responseStart', -1),
+            })
+        except Exception:
+            pass
+        self.overhead += time.perf_counter() - started
+
+    def note_request_failed(self, request):
+        """失败的网络请求（页面 requestfailed 事件）"""
+        started = time.perf_counter()
+        try:
+            self.network.append({
+                't': self._offset(),
+                'wall': time.time(),
+                'method': request.method,
+                'url': request.url[:500],
+                'type': request.resource_type,
+                'status': 0,
+                'failure': request.failure,
+            })
+        except Exception:
+            pass
+        self.overhead += time.perf_counter() - started
+
+    def note_probe(self, state: Optional[dict]):
+        """页面探针结果（只记录变化）"""
+        started = time.perf_counter()
+        if state is not None and (not self.probes or self.probes[-1]['state'] != state):
+            self.probes.append({'t': self._offset(), 'state': dict(state)})
+        self.overhead += time.perf_counter() - started
+
+    def to_dict(self) -> dict:
+        return {
+            'image': self.image,
+            'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'outcome': self.outcome,
+            'error': self.error,
+            'elapsed': self.elapsed,
+            'overhead_ms': round(self.overhead * 1000, 2),
+            'actions': list(self.actions),
+            'network': list(self.network),
+            'probes': list(self.probes),
+        }
+
+    def to_har(self) -> dict:
+        """把网络摘要转换为 HAR 1.2（只含摘要中有的字段，其余按规范填默认值）"""
+        entries = []
+        for item in self.network:
+            ttfb = item.get('ttfb_ms', -1)
+            entries.append({
+                'startedDateTime': datetime.fromtimestamp(item['wall'], tz=timezone.utc).isoformat(),
+                'time': max(0, ttfb),
+                'request': {
+                    'method': item['method'], 'url': item['url'], 'httpVersion': 'HTTP/1.1',
+                    'cookies': [], 'headers': [], 'queryString': [], 'headersSize': -1, 'bodySize': -1,
+                },
+                'response': {
+                    'status': item['status'], 'statusText': item.get('failure') or '', 'httpVersion': 'HTTP/1.1',
+                    'cookies': [], 'headers': [], 'content': {'size': -1, 'mimeType': ''},
+                    'redirectURL': '', 'headersSize': -1, 'bodySize': -1,
+                },
+                'cache': {},
+                'timings': {'send': 0, 'wait': max(0, ttfb), 'receive': 0},
+                '_resourceType': item['type'],
+            })
+        return {'log': {'version': '1.2', 'creator': {'name': 'remove_handwriting', 'version': '1'},
+                        'pages': [], 'entries': entries}}
+
+
+class TraceBuffer:
+    """最近几张图片的轨迹（同一浏览器的所有页面共享），失败或过慢时写入诊断报告"""
+
+    def __init__(self, report_dir, keep_images: int = 5, max_events: int = 300,
+                 slow_seconds: Optional[float] = None, max_reports: int = 50):
+        """
+        Args:
+            report_dir: 诊断报告目录
+            keep_images: 内存中保留最近多少张图片的轨迹（写入报告作为上下文）
+            max_events: 每张图片每类事件最多保留的条数
+            slow_seconds: 超过该耗时的图片也写报告（None 表示使用处理耗时的 p99）
+            max_reports: 最多写入多少份报告（防止大面积失败时占满磁盘）
+        """
+        self.report_dir = Path(report_dir)
+        self.keep_images = keep_images
+        self.max_events = max_events
+        self.slow_seconds = slow_seconds
+        self.max_reports = max_reports
+        self.recent = deque(maxlen=keep_images)
+        self.images = 0
+        self.reports = 0
+        self.overhead_seconds = 0.0
+        self.traced_seconds = 0.0
+        self.persist_seconds = 0.0
+        self._attached = weakref.WeakSet()
+
+    def begin(self, image_path: str) -> ImageTrace:
+        return ImageTrace(image_path, self.max_events)
+
+    def attach(self, page, current: Callable[[], Optional[ImageTrace]]):
+        """为页面注册网络事件监听（每个页面一次），事件记入 current() 返回的当前轨迹"""
+        if page in self._attached:
+            return
+
+        def on_response(response):
+            trace = current()
+            if trace is not None:
+                trace.note_response(response)
+
+        def on_request_failed(request):
+            trace = current()
+            if trace is not None:
+                trace.note_request_failed(request)
+
+        page.on('response', on_response)
+        page.on('requestfailed', on_request_failed)
+        self._attached.add(page)
+
+    def finish(self, trace: ImageTrace, outcome: str, error: Optional[BaseException] = None,
+               slow_seconds: Optional[float] = None) -> bool:
+        """
+        结束一张图片的轨迹
+
+        Args:
+            trace: 轨迹
+            outcome: 'ok' / 'failed' / 'cancelled'
+            error: 失败时的异常
+            slow_seconds: 慢图片阈值（slow_seconds 参数未设置时使用）
+
+        Returns:
+            bool: 是否需要写入诊断报告
+        """
+        trace.elapsed = round(time.perf_counter() - trace._perf_started, 3)
+        trace.outcome = outcome
+        if error is not None:
+            trace.error = f"{type(error).__name__}: {error}"[:500]
+        self.recent.append(trace)
+        if outcome == 'cancelled':
+            return False
+
+        self.images += 1
+        self.overhead_seconds += trace.overhead
+        self.traced_seconds += trace.elapsed
+
+        threshold = self.slow_seconds if self.slow_seconds is not None else slow_seconds
+        if outcome == 'ok':
+            if threshold is None or trace.elapsed <= threshold:
+                return False
+            trace.outcome = 'slow'
+        return self.reports < self.max_reports
+
+    def persist(self, trace: ImageTrace, screenshot: Optional[bytes] = None) -> Path:
+        """写入诊断报告：trace.json（本图片和最近几张图片的轨迹）、screenshot.png、network.har"""
+        started = time.perf_counter()
+        stamp = datetime.fromtimestamp(trace.started).strftime('%Y%m%d_%H%M%S')
+        report = self.report_dir / f"{stamp}_{trace.outcome}_{Path(trace.image).stem}"
+        suffix = 1
+        while report.exists():
+            suffix += 1
+            report = self.report_dir / f"{stamp}_{trace.outcome}_{Path(trace.image).stem}_{suffix}"
+        report.mkdir(parents=True)
+
+        data = {
+            'trace': trace.to_dict(),
+            'recent': [t.to_dict() for t in self.recent if t is not trace],
+        }
+        (report / 'trace.json').write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+        (report / 'network.har').write_text(json.dumps(trace.to_har(), ensure_ascii=False), encoding='utf-8')
+        if screenshot:
+            (report / 'screenshot.png').write_bytes(screenshot)
+
+        self.reports += 1
+        self.persist_seconds += time.perf_counter() - started
+        return report
+
+    def snapshot(self) -> dict:
+        """记录的图片数、报告数和记录开销"""
+        return {
+            'images': self.images,
+            'reports': self.reports,
+            'report_dir': str(self.report_dir),
+            'overhead_ms_per_image': round(self.overhead_seconds / self.images * 1000, 2) if self.images else 0.0,
+            'overhead_percent': round(self.overhead_seconds / self.traced_seconds * 100, 3) if self.traced_seconds else 0.0,
+            'persist_seconds': round(self.persist_seconds, 2),
+        }
@@ -0,0 +1,150 @@
+"""
+多页文档输入适配
+将 PDF / 多页 TIFF 逐页栅格化为图片送入处理队列，并把处理后的页面按顺序流式写回单个文档
+
+PDF 栅格化依赖 PyMuPDF（可选依赖），TIFF 读写与 PDF 输出只依赖 Pillow
+"""
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from PIL import Image, ImageSequence, TiffImagePlugin
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+DOCUMENT_EXTENSIONS = ('.pdf', '.tif', '.tiff')
+SUPPORTED_EXTENSIONS = IMAGE_EXTENSIONS + DOCUMENT_EXTENSIONS
+
+
+def is_document(path) -> bool:
+    """是否为需要逐页处理的多页文档"""
+    return Path(path).suffix.lower() in DOCUMENT_EXTENSIONS
+
+
+def collect_input_files(paths: Iterable[str]) -> List[str]:
+    """
+    展开输入路径：文件直接保留，文件夹递归扫描所有支持的图片和文档
+
+    Args:
+        paths: 文件或文件夹路径
+
+    Returns:
+        list: 支持格式的文件路径（文件夹内按路径排序）
+    """
+    files = []
+    for raw in paths:
+        path = Path(raw)
+        if path.is_file():
+            if path.suffix.lower() in SUPPORTED_EXTENSIONS:
+                files.append(str(path))
+        elif path.is_dir():
+            found = [p for p in path.rglob("*") if p.is_file() and p.suffix.lower() in SUPPORTED_EXTENSIONS]
+            files.extend(str(p) for p in sorted(found))
+    return files
+
+
+def _open_pdf(path: str):
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        raise ImportError("处理 PDF 需要安装 PyMuPDF：pip install pymupdf")
+    return fitz.open(path)
+
+
+def count_pages(path: str) -> int:
+    """读取文档页数（不栅格化）"""
+    if Path(path).suffix.lower() == '.pdf':
+        with _open_pdf(path) as doc:
+            return doc.page_count
+    with Image.open(path) as img:
+        return getattr(img, 'n_frames', 1)
+
+
+def iter_pages(path: str, work_dir: str, dpi: int = 200) -> Iterator[Tuple[int, str]]:
+    """
+    逐页栅格化文档，每次只在内存中保留一页
+
+    Args:
+        path: PDF 或 TIFF 文件路径
+        work_dir: 页面图片输出目录
+        dpi: PDF 栅格化分辨率
+
+    Yields:
+        (页码(从0开始), 页面图片路径)
+    """
+    work = Path(work_dir)
+    work.mkdir(parents=True, exist_ok=True)
+
+    if Path(path).suffix.lower() == '.pdf':
+        doc = _open_pdf(path)
+        try:
+            for page_index in range(doc.page_count):
+                page_path = work / f"page_{page_index + 1:04d}.png"
+                pixmap = doc.load_page(page_index).get_pixmap(dpi=dpi)
+                pixmap.save(str(page_path))
+                del pixmap
+                yield page_index, str(page_path)
+        finally:
+            doc.close()
+    else:
+        with Image.open(path) as img:
+            for page_index, frame in enumerate(ImageSequence.Iterator(img)):
+                page_path = work / f"page_{page_index + 1:04d}.png"
+                frame.convert('RGB').save(page_path, 'PNG')
+                yield page_index, str(page_path)
+
+
+class DocumentWriter:
+    """按页码顺序流式写出多页文档（PDF 或 TIFF），乱序完成的页面暂存路径等待补齐"""
+
+    def __init__(self, output_path: str, dpi: int = 200):
+        """
+        Args:
+            output_path: 输出文档路径（根据后缀决定 PDF 或 TIFF）
+            dpi: 写入 PDF 时的页面分辨率
+        """
+        self.output_path = Path(output_path)
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.dpi = dpi
+        self.is_pdf = self.output_path.suffix.lower() == '.pdf'
+        self.pages_written = 0
+        self._pending: Dict[int, str] = {}
+        self._tiff: Optional[TiffImagePlugin.AppendingTiffWriter] = None
+
+    def add(self, page_index: int, image_path: str):
+        """登记一页的结果，并写出所有已连续就绪的页面"""
+        self._pending[page_index] = image_path
+        while self.pages_written in self._pending:
+            self._write_page(self._pending.pop(self.pages_written))
+            self.pages_written += 1
+
+    def _write_page(self, image_path: str):
+        with Image.open(image_path) as img:
+            page = img.convert('RGB')
+
+        if self.is_pdf:
+            # Pillow 支持向自己生成的 PDF 追加页面（增量写入，不重写已有页面）
+            page.save(self.output_path, 'PDF', resolution=self.dpi, append=self.pages_written > 0)
+        else:
+            if self._tiff is None:
+                self._tiff = TiffImagePlugin.AppendingTiffWriter(str(self.output_path), new=True)
+            page.save(self._tiff, 'TIFF', compression='tiff_deflate')
+            self._tiff.newFrame()
+        page.close()
+
+    def close(self) -> int:
+        """
+        结束写入
+
+        Returns:
+            int: 已写出的页数
+        """
+        try:
+            if self._pending:
+                missing = sorted(set(range(self.pages_written, max(self._pending) + 1)) - set(self._pending))
+                raise RuntimeError(f"文档缺少页面: {[i + 1 for i in missing]}")
+        finally:
+            # 缺页时也释放文件句柄
+            if self._tiff is not None:
+                self._tiff.close()
+                self._tiff = None
+        return self.pages_written
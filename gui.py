@@ -12,12 +12,20 @@ import threading
 import logging
 from pathlib import Path
 import asyncio
+import concurrent.futures
 from PIL import Image, ImageTk
 from io import BytesIO
-import base64
 
 # 导入核心模块
+from background_loop import BackgroundLoop
 from baidu_automation import BaiduPicFilter
+from cookie_manager import CookieManager
+from document_input import SUPPORTED_EXTENSIONS
+from hot_folder import watch_folder
+from job_table import STATES, JobModel, VirtualJobTable
+from output_encoder import OutputOptions
+from preview import ImageCache, PreviewWindow
+from upload_strategy import STRATEGIES
 
 
 logger = logging.getLogger(__name__)
@@ -26,7 +34,7 @@ logger = logging.getLogger(__name__)
 class LoginWindow(tk.Toplevel):
     """登录窗口，显示二维码并等待用户确认"""
     
-    def __init__(self, parent, qrcode_path=None, qrcode_base64=None):
+    def __init__(self, parent, qrcode_path=None, qrcode_bytes=None):
         super().__init__(parent)
         self.title("百度网盘 - 扫码登录")
         self.geometry("500x600")
@@ -48,30 +56,18 @@ class LoginWindow(tk.Toplevel):
         # 二维码区域
         qrcode_frame = ttk.Frame(main_frame)
         qrcode_frame.pack(pady=20)
+        self.qrcode_label = ttk.Label(qrcode_frame, font=('Microsoft YaHei UI', 10))
+        self.qrcode_label.pack()
         
-        try:
-            if qrcode_base64:
-                # 从 base64 创建图片
-                image_bytes = base64.b64decode(qrcode_base64)
-                image = Image.open(BytesIO(image_bytes))
-            elif qrcode_path and Path(qrcode_path).exists():
-                # 从文件加载图片
-                image = Image.open(qrcode_path)
-            else:
-                # 显示默认占位符
-                image = Image.new('RGB', (300, 300), color='lightgray')
-            
-            # 调整大小
-            image = image.resize((300, 300), Image.Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(image)
-            
-            qrcode_label = ttk.Label(qrcode_frame, image=photo)
-            qrcode_label.image = photo  # 保持引用
-            qrcode_label.pack()
-        except Exception as e:
-            error_label = ttk.Label(qrcode_frame, text=f"⚠️  无法加载二维码\n{e}", 
-                                   font=('Microsoft YaHei UI', 10))
-            error_label.pack()
+        if qrcode_bytes:
+            self.update_qrcode(qrcode_bytes)
+        elif qrcode_path and Path(qrcode_path).exists():
+            # 从文件加载图片
+            with open(qrcode_path, 'rb') as f:
+                self.update_qrcode(f.read())
+        else:
+            # 显示默认占位符
+            self._show_image(Image.new('RGB', (300, 300), color='lightgray'))
         
         # 提示文本
         tip_label = ttk.Label(main_frame, text="使用手机百度 App 或微信扫一扫\n扫描上方二维码进行登录", 
@@ -103,6 +99,20 @@ class LoginWindow(tk.Toplevel):
         # 启动倒计时
         self.start_countdown()
     
+    def update_qrcode(self, qrcode_bytes):
+        """显示新的二维码（二维码刷新后原地替换）"""
+        try:
+            self._show_image(Image.open(BytesIO(qrcode_bytes)))
+        except Exception as e:
+            self.qrcode_label.config(image='', text=f"⚠️  无法加载二维码\n{e}")
+    
+    def _show_image(self, image):
+        # 调整大小
+        image = image.resize((300, 300), Image.Resampling.LANCZOS)
+        photo = ImageTk.PhotoImage(image)
+        self.qrcode_label.config(image=photo, text='')
+        self.qrcode_label.image = photo  # 保持引用
+    
     def start_countdown(self):
         """启动倒计时"""
         self.countdown = 300  # 5分钟
@@ -115,7 +125,7 @@ class LoginWindow(tk.Toplevel):
         
         if self.countdown > 0:
             mins, secs = divmod(self.countdown, 60)
-            self.countdown_label.config(text=f"请在 {mins}:{secs:02d} 内完成登录，登录后关闭本窗口")
+            self.countdown_label.config(text=f"请在 {mins}:{secs:02d} 内完成登录，登录后本窗口自动关闭")
             self.countdown -= 1
             self.after(1000, self.update_countdown)
         else:
@@ -149,6 +159,16 @@ class QueueHandler(logging.Handler):
 class App(ttk.Window):
     """试卷去手写自动化工具 GUI"""
     
+    # 输出编码选项（界面文字 -> OutputOptions 参数）
+    OUTPUT_FORMATS = {"保持原格式": None, "JPEG": "jpeg", "WebP": "webp", "PNG": "png"}
+    OUTPUT_COLORS = {"彩色": "color", "灰度": "gray", "黑白": "bilevel"}
+    OUTPUT_ARCHIVES = {"不打包": None, "ZIP": "zip", "tar": "tar"}
+    
+    FRAME_MS = 40  # 任务表刷新间隔（毫秒）
+    MAX_LOG_LINES = 5000  # 日志区域保留的行数
+    MAX_SCAN_FILES = 10000  # 扫描文件夹时最多收集的文件数
+    DRAIN_DEADLINE_MS = 120000  # 停止时最多等待进行中的图片多久（毫秒），超时后强制取消
+    
     def __init__(self, themename='darkly'):
         super().__init__(themename=themename)
         self.title("百度网盘试卷去手写 - 自动化工具")
@@ -167,9 +187,31 @@ class App(ttk.Window):
         
         self.create_widgets()
         self.setup_logging()
-        self.process_thread = None
-        self.process_loop = None
+        
+        # 常驻后台事件循环：浏览器客户端在多次处理之间复用，直到退出登录或关闭程序
+        self.runner = BackgroundLoop()
+        self.runner.start()
+        self.current_job = None
         self.client = None
+        self.login_window = None
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # 暂停 / 停止：停止时先收尾（进行中的图片处理完），超过期限才强制取消
+        self.paused = False
+        self.watch_stop = None  # 监视模式的停止事件（在事件循环线程中创建）
+        self._drain_timer = None
+        
+        # 处理进度从事件循环线程推送，按文件合并后每帧更新一次任务表
+        self.selection_text = None  # 通过"选择文件"选中时输入框显示的文字
+        self._progress_lock = threading.Lock()
+        self._progress_pending = {}
+        self._table_dirty = True
+        self.after(self.FRAME_MS, self.flush_progress)
+        
+        # 对比预览：缩略图和屏幕尺寸图片的缓存在第一次打开预览时创建
+        self.thumbnail_cache = None
+        self.screen_cache = None
+        self.preview_window = None
         
     def create_widgets(self):
         """创建GUI组件"""
@@ -224,16 +266,29 @@ class App(ttk.Window):
                                       command=self.start_process, bootstyle="success")
         self.start_button.grid(row=0, column=3, padx=5, pady=8)
         
+        # 暂停后不再开始新的图片，进行中的图片照常完成；继续时沿用同一浏览器
+        self.pause_button = ttk.Button(controls_frame, text="⏸️ 暂停", command=self.toggle_pause,
+                                      bootstyle="warning-outline", state="disabled")
+        self.pause_button.grid(row=0, column=4, padx=5, pady=8)
+        
         self.open_folder_button = ttk.Button(controls_frame, text="📁 打开输出文件夹", 
                                             command=self.open_output_folder, bootstyle="info")
-        self.open_folder_button.grid(row=0, column=4, padx=5, pady=8)
+        self.open_folder_button.grid(row=0, column=5, padx=5, pady=8)
+        
+        self.preview_button = ttk.Button(controls_frame, text="🖼️ 对比预览",
+                                        command=self.open_preview, bootstyle="info-outline")
+        self.preview_button.grid(row=0, column=6, padx=5, pady=8)
+        
+        self.logout_button = ttk.Button(controls_frame, text="🔓 退出登录",
+                                       command=self.logout, bootstyle="secondary-outline")
+        self.logout_button.grid(row=0, column=7, padx=5, pady=8)
         
         # 选项行
         ttk.Label(controls_frame, text="选项:", style='White.TLabel').grid(
             row=1, column=0, sticky="w", padx=5, pady=8)
         
         options_frame = ttk.Frame(controls_frame, style='Transparent.TFrame')
-        options_frame.grid(row=1, column=1, columnspan=4, sticky="ew", padx=0, pady=8)
+        options_frame.grid(row=1, column=1, columnspan=7, sticky="ew", padx=0, pady=8)
         options_frame.grid_columnconfigure(2, weight=1)
         
         self.headless_var = tk.BooleanVar(value=False)
@@ -252,10 +307,127 @@ class App(ttk.Window):
                                        command=self.browse_output, width=3, bootstyle="secondary")
         self.output_button.grid(row=0, column=3, padx=(0, 15))
         
-        # ============ 日志区域 ============
-        log_frame = ttk.Labelframe(main_frame, text="📋 处理日志", padding="10", 
+        ttk.Label(options_frame, text="每组张数:", style='White.TLabel').grid(
+            row=0, column=4, sticky='w', padx=(0, 5))
+        
+        # 上传控件支持多文件时，一次提交的图片数（1 为单张模式）
+        self.batch_size_var = tk.IntVar(value=1)
+        self.batch_size_spin = ttk.Spinbox(options_frame, from_=1, to=20, width=4,
+                                          textvariable=self.batch_size_var)
+        self.batch_size_spin.grid(row=0, column=5, padx=(0, 15))
+        
+        ttk.Label(options_frame, text="并行页数:", style='White.TLabel').grid(
+            row=0, column=6, sticky='w', padx=(0, 5))
+        
+        self.concurrency_var = tk.IntVar(value=2)
+        self.concurrency_spin = ttk.Spinbox(options_frame, from_=1, to=8, width=4,
+                                           textvariable=self.concurrency_var)
+        self.concurrency_spin.grid(row=0, column=7, padx=(0, 5))
+        
+        # 根据处理耗时和失败情况自动调整同时处理的图片数（并行页数作为上限）
+        self.adaptive_var = tk.BooleanVar(value=False)
+        self.adaptive_check = ttk.Checkbutton(options_frame, text="自动",
+                                             variable=self.adaptive_var, bootstyle="round-toggle")
+        self.adaptive_check.grid(row=0, column=8, padx=(0, 15))
+        
+        # 超大扫描件切分为图块并行处理后拼接
+        self.tiling_var = tk.BooleanVar(value=False)
+        self.tiling_check = ttk.Checkbutton(options_frame, text="大图分块处理",
+                                           variable=self.tiling_var, bootstyle="round-toggle")
+        self.tiling_check.grid(row=0, column=9, padx=(0, 15))
+        
+        # 处理完文件夹中已有图片后继续监视，新扫描的图片自动处理
+        self.watch_var = tk.BooleanVar(value=False)
+        self.watch_check = ttk.Checkbutton(options_frame, text="持续监视文件夹",
+                                          variable=self.watch_var, bootstyle="round-toggle")
+        self.watch_check.grid(row=0, column=10, padx=(0, 15))
+        
+        # 同一页扫描了多次时只处理一张，结果复制给其他副本
+        self.dedupe_var = tk.BooleanVar(value=False)
+        self.dedupe_check = ttk.Checkbutton(options_frame, text="跳过重复页",
+                                           variable=self.dedupe_var, bootstyle="round-toggle")
+        self.dedupe_check.grid(row=0, column=11)
+        
+        # 输出编码行
+        ttk.Label(controls_frame, text="输出:", style='White.TLabel').grid(
+            row=2, column=0, sticky="w", padx=5, pady=8)
+        
+        encode_frame = ttk.Frame(controls_frame, style='Transparent.TFrame')
+        encode_frame.grid(row=2, column=1, columnspan=7, sticky="ew", padx=0, pady=8)
+        
+        ttk.Label(encode_frame, text="格式:", style='White.TLabel').pack(side=tk.LEFT, padx=(0, 5))
+        self.format_var = tk.StringVar(value="保持原格式")
+        ttk.Combobox(encode_frame, textvariable=self.format_var, state="readonly", width=10,
+                     values=list(self.OUTPUT_FORMATS)).pack(side=tk.LEFT, padx=(0, 15))
+        
+        ttk.Label(encode_frame, text="质量:", style='White.TLabel').pack(side=tk.LEFT, padx=(0, 5))
+        self.quality_var = tk.IntVar(value=85)
+        ttk.Spinbox(encode_frame, from_=10, to=100, increment=5, width=4,
+                    textvariable=self.quality_var).pack(side=tk.LEFT, padx=(0, 15))
+        
+        ttk.Label(encode_frame, text="颜色:", style='White.TLabel').pack(side=tk.LEFT, padx=(0, 5))
+        self.color_var = tk.StringVar(value="彩色")
+        ttk.Combobox(encode_frame, textvariable=self.color_var, state="readonly", width=6,
+                     values=list(self.OUTPUT_COLORS)).pack(side=tk.LEFT, padx=(0, 15))
+        
+        ttk.Label(encode_frame, text="最长边(0不限):", style='White.TLabel').pack(side=tk.LEFT, padx=(0, 5))
+        self.max_side_var = tk.IntVar(value=0)
+        ttk.Spinbox(encode_frame, from_=0, to=10000, increment=100, width=6,
+                    textvariable=self.max_side_var).pack(side=tk.LEFT, padx=(0, 15))
+        
+        # 结果按输入文件夹的层级存放（图片很多的文件夹再按哈希前缀分子文件夹）
+        self.mirror_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(encode_frame, text="保持目录结构", variable=self.mirror_var,
+                        bootstyle="round-toggle").pack(side=tk.LEFT, padx=(0, 15))
+        
+        # 结果直接写入 ZIP / tar 归档（每批一个，过大时自动分卷）
+        ttk.Label(encode_frame, text="打包:", style='White.TLabel').pack(side=tk.LEFT, padx=(0, 5))
+        self.archive_var = tk.StringVar(value="不打包")
+        ttk.Combobox(encode_frame, textvariable=self.archive_var, state="readonly", width=6,
+                     values=list(self.OUTPUT_ARCHIVES)).pack(side=tk.LEFT)
+        
+        # ============ 任务表 + 日志区域 ============
+        panes = ttk.Panedwindow(main_frame, orient=VERTICAL)
+        panes.grid(row=2, column=0, sticky="nsew", pady=(10, 0))
+        
+        table_frame = ttk.Labelframe(panes, text="📑 任务列表", padding="10", style='White.TLabelframe')
+        table_frame.grid_rowconfigure(1, weight=1)
+        table_frame.grid_columnconfigure(0, weight=1)
+        panes.add(table_frame, weight=3)
+        
+        table_bar = ttk.Frame(table_frame, style='Transparent.TFrame')
+        table_bar.grid(row=0, column=0, sticky="ew", pady=(0, 5))
+        
+        ttk.Label(table_bar, text="状态:", style='White.TLabel').pack(side=tk.LEFT, padx=(0, 5))
+        self.state_filter_var = tk.StringVar(value="全部")
+        state_filter = ttk.Combobox(table_bar, textvariable=self.state_filter_var, state="readonly", width=8,
+                                    values=["全部", *STATES.values()])
+        state_filter.pack(side=tk.LEFT, padx=(0, 10))
+        state_filter.bind('<<ComboboxSelected>>', self.on_filter_changed)
+        
+        ttk.Label(table_bar, text="文件名:", style='White.TLabel').pack(side=tk.LEFT, padx=(0, 5))
+        self.text_filter_var = tk.StringVar()
+        self.text_filter_var.trace_add('write', self.on_filter_changed)
+        ttk.Entry(table_bar, textvariable=self.text_filter_var, width=20).pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.requeue_button = ttk.Button(table_bar, text="🔁 重试失败项", command=self.requeue_failed,
+                                        bootstyle="warning-outline")
+        self.requeue_button.pack(side=tk.LEFT, padx=(0, 5))
+        self.remove_button = ttk.Button(table_bar, text="🗑️ 移除选中", command=self.remove_selected,
+                                       bootstyle="secondary-outline")
+        self.remove_button.pack(side=tk.LEFT)
+        
+        self.table_summary_var = tk.StringVar(value="")
+        ttk.Label(table_bar, textvariable=self.table_summary_var, style='White.TLabel').pack(side=tk.RIGHT)
+        
+        self.job_model = JobModel()
+        self.job_table = VirtualJobTable(table_frame, self.job_model)
+        self.job_table.grid(row=1, column=0, sticky="nsew")
+        self.job_table.tree.bind('<Double-1>', self.on_table_double_click)
+        
+        log_frame = ttk.Labelframe(panes, text="📋 处理日志", padding="10", 
                                   style='White.TLabelframe')
-        log_frame.grid(row=2, column=0, sticky="nsew", pady=(10, 0))
+        panes.add(log_frame, weight=2)
         log_frame.grid_rowconfigure(0, weight=1)
         log_frame.grid_columnconfigure(0, weight=1)
         
@@ -299,20 +471,17 @@ class App(ttk.Window):
         files = filedialog.askopenfilenames(
             title="选择图片文件（支持多选）",
             filetypes=(("Image files", "*.jpg *.jpeg *.png *.webp *.bmp"), 
+                      ("PDF / TIFF documents", "*.pdf *.tif *.tiff"),
                       ("All files", "*.*")),
             parent=self
         )
         if files:
             self.on_input_focus_in(None)
-            if len(files) > 50:
-                result = messagebox.askyesno(
-                    "文件数量较多", 
-                    f"您选择了 {len(files)} 个文件。\n\n建议单次处理不超过50个文件以获得最佳体验。\n\n是否继续选择这些文件？",
-                    parent=self
-                )
-                if not result:
-                    return
-            self.image_var.set(";".join(files))
+            # 选中的文件直接进入任务表（可在表中移除），输入框只显示数量
+            self.job_model.set_paths(files)
+            self._table_dirty = True
+            self.selection_text = f"已选择 {len(files)} 个文件（{Path(files[0]).name} 等）" if len(files) > 1 else files[0]
+            self.image_var.set(self.selection_text)
     
     def browse_folder(self):
         """浏览文件夹"""
@@ -337,6 +506,34 @@ class App(ttk.Window):
         if folder:
             self.output_var.set(folder)
     
+    def open_preview(self, path=None):
+        """打开处理前后对比预览（任务列表中已完成的文件，按当前过滤条件）"""
+        pairs = [(item.path, item.output) for item in self.job_model.view() if item.state == 'done' and item.output]
+        if not pairs:
+            messagebox.showinfo("对比预览", "任务列表中还没有处理完成的文件。", parent=self)
+            return
+        start = next((i for i, (source, _) in enumerate(pairs) if source == path), 0)
+        
+        if self.thumbnail_cache is None:
+            # 缩略图同时缓存在输出文件夹的 .thumbnails 下，下次打开直接读取
+            self.thumbnail_cache = ImageCache(max_side=256, max_bytes=64 * 1024 * 1024,
+                                              disk_dir=str(Path(self.output_var.get()) / '.thumbnails'))
+            screen_side = max(self.winfo_screenwidth() // 2, self.winfo_screenheight())
+            self.screen_cache = ImageCache(max_side=screen_side, max_bytes=128 * 1024 * 1024)
+        
+        if self.preview_window is not None and self.preview_window.winfo_exists():
+            self.preview_window.pairs = pairs
+            self.preview_window.show(start)
+            self.preview_window.lift()
+            return
+        self.preview_window = PreviewWindow(self, pairs, self.thumbnail_cache, self.screen_cache, start)
+    
+    def on_table_double_click(self, event):
+        """双击任务列表中已完成的文件，打开对比预览"""
+        item = self.job_table.item_at(event.y)
+        if item is not None and item.state == 'done' and item.output:
+            self.open_preview(item.path)
+    
     def open_output_folder(self):
         """打开输出文件夹"""
         import os, sys, subprocess
@@ -391,6 +588,10 @@ class App(ttk.Window):
             level_tag = 'PROGRESS'
         
         self.log_text.insert(tk.END, record + '\n', level_tag)
+        # 只保留最近的日志，长时间运行时文本控件不会越来越慢
+        excess = int(self.log_text.index('end-1c').split('.')[0]) - self.MAX_LOG_LINES
+        if excess > 0:
+            self.log_text.delete('1.0', f'{excess + 1}.0')
         self.log_text.configure(state='disabled')
         self.log_text.yview(tk.END)
     
@@ -401,7 +602,11 @@ class App(ttk.Window):
         if not input_str or input_str == self.placeholder_text:
             return None
         
-        # 支持多文件选择
+        # 通过"选择文件"选中的文件：处理任务表中等待处理的文件
+        if input_str == self.selection_text:
+            return self.job_model.paths() or None
+        
+        # 支持手动输入多个路径（用 ; 分隔）
         if ";" in input_str:
             files = [f.strip() for f in input_str.split(";") if f.strip()]
         else:
@@ -419,7 +624,7 @@ class App(ttk.Window):
         for file_path in files:
             path = Path(file_path)
             if path.exists() and path.is_file():
-                if path.suffix.lower() in ['.jpg', '.jpeg', '.png', '.webp', '.bmp']:
+                if path.suffix.lower() in SUPPORTED_EXTENSIONS:
                     valid_files.append(str(path))
         
         return valid_files if valid_files else None
@@ -446,14 +651,14 @@ class App(ttk.Window):
                 continue
                 
             if path.is_file():
-                if path.suffix.lower() in ['.jpg', '.jpeg', '.png', '.webp', '.bmp']:
+                if path.suffix.lower() in SUPPORTED_EXTENSIONS:
                     valid_files.append(str(path))
             elif path.is_dir():
                 logger.info(f"🔍 正在扫描文件夹: {path.name}")
                 
                 # 异步扫描文件夹
                 for img_file in path.rglob("*"):  # 使用 rglob 递归扫描
-                    if img_file.is_file() and img_file.suffix.lower() in ['.jpg', '.jpeg', '.png', '.webp', '.bmp']:
+                    if img_file.is_file() and img_file.suffix.lower() in SUPPORTED_EXTENSIONS:
                         valid_files.append(str(img_file))
                         total_scanned += 1
                         
@@ -463,7 +668,7 @@ class App(ttk.Window):
                             await asyncio.sleep(0.01)  # 让出控制权，避免阻塞
                         
                         # 限制单次处理的文件数量
-                        if len(valid_files) >= 500:  # 限制最多500个文件
+                        if len(valid_files) >= self.MAX_SCAN_FILES:
                             logger.warning(f"⚠️  文件数量过多，已达到限制 ({len(valid_files)} 个)，停止扫描")
                             logger.warning("💡 建议分批处理或选择更小的文件夹")
                             break
@@ -474,6 +679,10 @@ class App(ttk.Window):
     
     def start_process(self):
         """开始处理"""
+        if self.watch_var.get():
+            self.start_watch()
+            return
+        
         image_files = self.get_image_files()
         if not image_files:
             messagebox.showwarning("输入错误", "请输入有效的图片文件路径或文件夹。", parent=self)
@@ -494,84 +703,122 @@ class App(ttk.Window):
             
             logger.info("🔍 开始扫描文件夹，请稍候...")
             
-            # 启动异步扫描
-            self.process_thread = threading.Thread(
-                target=self.run_async_scan_and_process,
-                daemon=True
-            )
-            self.process_thread.start()
+            # 在后台事件循环中扫描并处理
+            self.run_job(self.async_scan_and_process_logic(), "扫描")
         else:
             # 直接处理已选择的文件
             if len(image_files) > 100:
-                result = messagebox.askywarning(
+                result = messagebox.askyesno(
                     "文件数量较多", 
-                    f"您选择了 {len(image_files)} 个文件，处理可能需要较长时间。\n\n建议单次处理不超过50个文件以获得最佳体验。\n\n是否继续？",
+                    f"您选择了 {len(image_files)} 个文件，处理可能需要较长时间。\n\n是否继续？",
                     parent=self
                 )
                 if not result:
                     return
             
-            self.start_button.config(text="⏹️ 取消处理", command=self.cancel_process, bootstyle="danger")
-            self.browse_files_button.config(state="disabled")
-            self.browse_folder_button.config(state="disabled")
-            self.image_entry.config(state="disabled")
-            
-            self.log_text.config(state="normal")
-            self.log_text.delete(1.0, tk.END)
-            self.log_text.config(state="disabled")
-            
-            self.status_var.set("⏳ 处理中...")
-            
-            self.process_thread = threading.Thread(
-                target=self.run_async_process,
-                args=(image_files,),
-                daemon=True
-            )
-            self.process_thread.start()
+            if self.image_var.get().strip() != self.selection_text:
+                # 手动输入的路径：任务表换成这些文件
+                self.job_model.set_paths(image_files)
+                self._table_dirty = True
+            self.begin_run(image_files)
     
-    def cancel_process(self):
-        """取消处理"""
-        self.start_button.config(text="正在取消...", state="disabled")
-        if self.process_loop and self.process_loop.is_running():
-            self.process_loop.call_soon_threadsafe(self.shutdown_async_tasks)
+    def begin_run(self, image_files):
+        """处理一组文件（任务表中已有这些文件）"""
+        self.start_button.config(text="⏹️ 停止", command=self.stop_process, bootstyle="danger")
+        self.pause_button.config(state="normal")
+        self.browse_files_button.config(state="disabled")
+        self.browse_folder_button.config(state="disabled")
+        self.image_entry.config(state="disabled")
+        
+        self.log_text.config(state="normal")
+        self.log_text.delete(1.0, tk.END)
+        self.log_text.config(state="disabled")
+        
+        self.status_var.set("⏳ 处理中...")
+        
+        self.run_job(self.async_process_logic(image_files))
     
-    def shutdown_async_tasks(self):
-        """关闭异步任务"""
-        if not self.process_loop or not self.process_loop.is_running():
+    def start_watch(self):
+        """开始监视文件夹（已处理过的图片记录在输出文件夹的台账中，不会重复处理）"""
+        folder = self.image_var.get().strip()
+        if not folder or folder == self.placeholder_text or ";" in folder or not Path(folder).is_dir():
+            messagebox.showwarning("输入错误", "监视模式请选择一个文件夹。", parent=self)
             return
-        for task in asyncio.all_tasks(loop=self.process_loop):
-            task.cancel()
-    
-    def run_async_scan_and_process(self):
-        """运行异步扫描和处理"""
-        import warnings
         
-        # 抑制 Windows asyncio 的资源警告
-        warnings.filterwarnings('ignore', category=ResourceWarning)
+        self.start_button.config(text="⏹️ 停止监视", command=self.stop_process, bootstyle="danger")
+        self.pause_button.config(state="normal")
+        self.browse_files_button.config(state="disabled")
+        self.browse_folder_button.config(state="disabled")
+        self.image_entry.config(state="disabled")
         
-        self.process_loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self.process_loop)
+        self.log_text.config(state="normal")
+        self.log_text.delete(1.0, tk.END)
+        self.log_text.config(state="disabled")
         
-        try:
-            self.process_loop.run_until_complete(self.async_scan_and_process_logic())
-        except asyncio.CancelledError:
-            logger.info('⚠️  扫描已被取消')
-        except Exception as e:
-            logger.error(f'❌ 扫描出错: {e}')
-        finally:
+        self.status_var.set(f"👀 正在监视: {Path(folder).name}")
+        
+        self.run_job(self.async_process_logic(None, folder))
+    
+    def cancel_process(self):
+        """立即取消处理（进行中的图片放弃；浏览器保持运行，下次处理直接复用）"""
+        self._drain_timer = None
+        if self.current_job is None or self.current_job.done():
+            return
+        self.start_button.config(text="正在取消...", state="disabled")
+        self.pause_button.config(state="disabled")
+        self.current_job.cancel()
+    
+    def stop_process(self):
+        """
+        停止处理：不再开始新的图片，进行中的图片处理完后结束，服务端已开始的处理不浪费
+
+        超过 DRAIN_DEADLINE_MS 仍未结束时强制取消；收尾期间再次点击立即取消
+        """
+        client = self.client
+        if client is None:
+            # 还在启动浏览器或登录，没有进行中的图片
+            self.cancel_process()
+            return
+        self.runner.call_soon(client.drain)
+        if self.watch_stop is not None:
+            self.runner.call_soon(self.watch_stop.set)
+        self.start_button.config(text="⏹️ 立即停止", command=self.cancel_process, bootstyle="danger")
+        self.pause_button.config(state="disabled")
+        self.status_var.set("⏳ 正在收尾：等待进行中的图片完成...")
+        logger.info(f'⏹️  正在收尾：不再开始新的图片，最多等待 {self.DRAIN_DEADLINE_MS // 1000} 秒')
+        self._drain_timer = self.after(self.DRAIN_DEADLINE_MS, self.cancel_process)
+    
+    def toggle_pause(self):
+        """暂停 / 继续（暂停期间浏览器和工作页保持打开，继续时立即开始下一张）"""
+        client = self.client
+        if client is None:
+            return
+        self.paused = not self.paused
+        if self.paused:
+            self.runner.call_soon(client.pause)
+            self.pause_button.config(text="▶️ 继续", bootstyle="success-outline")
+            self.status_var.set("⏸️ 已暂停：进行中的图片完成后不再开始新的图片")
+        else:
+            self.runner.call_soon(client.resume)
+            self.pause_button.config(text="⏸️ 暂停", bootstyle="warning-outline")
+            self.status_var.set("⏳ 处理中...")
+    
+    def run_job(self, coro, action="处理"):
+        """在后台事件循环中运行任务，任务结束后在主线程恢复界面"""
+        def finished(job):
             try:
-                # 取消所有待处理任务
-                pending = asyncio.all_tasks(self.process_loop)
-                for task in pending:
-                    task.cancel()
-                # 运行一次循环以处理取消
-                self.process_loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-            except Exception:
-                pass
-            finally:
-                self.process_loop.close()
-                self.process_loop = None
-                self.on_process_complete()
+                job.result()
+            except concurrent.futures.CancelledError:
+                logger.info(f'⚠️  {action}已被取消')
+            except Exception as e:
+                logger.error(f'❌ {action}出错: {e}')
+            self.after(0, self.on_process_complete)
+        
+        self.logout_button.config(state="disabled")
+        self.requeue_button.config(state="disabled")
+        self.remove_button.config(state="disabled")
+        self.current_job = self.runner.submit(coro)
+        self.current_job.add_done_callback(finished)
     
     async def async_scan_and_process_logic(self):
         """异步扫描和处理逻辑"""
@@ -586,6 +833,17 @@ class App(ttk.Window):
             
             logger.info(f"📊 扫描完成，共找到 {len(image_files)} 个图片文件")
             
+            # 扫描结果放入任务表（在主线程中执行，完成后再开始处理）
+            table_ready = asyncio.Event()
+            
+            def fill_table():
+                self.job_model.set_paths(image_files)
+                self._table_dirty = True
+                self.runner.call_soon(table_ready.set)
+            
+            self.after(0, fill_table)
+            await table_ready.wait()
+            
             # 如果文件数量过多，询问用户是否继续
             if len(image_files) > 100:
                 # 在主线程中显示确认对话框
@@ -599,7 +857,7 @@ class App(ttk.Window):
                         parent=self
                     )
                     result_holder['value'] = result
-                    self.process_loop.call_soon_threadsafe(result_event.set)
+                    self.runner.call_soon(result_event.set)
                 
                 self.after(0, show_confirmation)
                 await result_event.wait()
@@ -610,7 +868,9 @@ class App(ttk.Window):
             
             # 更新状态为处理中
             self.after(0, lambda: self.status_var.set("⏳ 处理中..."))
-            self.after(0, lambda: self.start_button.config(text="⏹️ 取消处理", bootstyle="danger"))
+            self.after(0, lambda: self.start_button.config(text="⏹️ 停止", command=self.stop_process,
+                                                           bootstyle="danger"))
+            self.after(0, lambda: self.pause_button.config(state="normal"))
             
             # 开始处理文件
             await self.async_process_logic(image_files)
@@ -619,106 +879,287 @@ class App(ttk.Window):
             logger.error(f"❌ 扫描和处理过程出错: {e}")
             raise
     
-    def run_async_process(self, image_files):
-        """运行异步处理"""
-        import warnings
-        
-        # 抑制 Windows asyncio 的资源警告
-        warnings.filterwarnings('ignore', category=ResourceWarning)
-        
-        self.process_loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self.process_loop)
+    def on_progress(self, event):
+        """处理进度回调（在事件循环线程中执行）：同一文件的多条事件只保留最新一条，等下一帧统一更新"""
+        with self._progress_lock:
+            previous = self._progress_pending.get(event['path'])
+            if previous is not None:
+                # 合并时保留最早的开始时间
+                event = {**event, 'started': previous.get('started', previous['time'])}
+            self._progress_pending[event['path']] = event
+    
+    def flush_progress(self, schedule=True):
+        """每帧把合并后的进度事件应用到任务表，只重绘可见行"""
+        with self._progress_lock:
+            events, self._progress_pending = self._progress_pending, {}
+        for event in events.values():
+            self.job_model.apply(event)
         
-        try:
-            self.process_loop.run_until_complete(self.async_process_logic(image_files))
-        except asyncio.CancelledError:
-            logger.info('⚠️  处理已被取消')
-        except Exception as e:
-            logger.error(f'❌ 处理出错: {e}')
-        finally:
-            try:
-                # 取消所有待处理任务
-                pending = asyncio.all_tasks(self.process_loop)
-                for task in pending:
-                    task.cancel()
-                # 运行一次循环以处理取消
-                self.process_loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-            except Exception:
-                pass
-            finally:
-                self.process_loop.close()
-                self.process_loop = None
-                self.on_process_complete()
-    
-    async def async_process_logic(self, image_files):
-        """异步处理逻辑"""
-        async def show_login_window(qrcode_base64=None, qrcode_path=None):
-            """显示登录窗口的回调函数（异步版本）"""
-            result_event = asyncio.Event()
-            result_holder = {'value': None}
-            
-            def show_in_main_thread():
-                """在主线程中显示登录窗口"""
-                login_win = LoginWindow(self, qrcode_path=qrcode_path, qrcode_base64=qrcode_base64)
-                self.wait_window(login_win)
-                result_holder['value'] = login_win.result
-                # 通知异步函数可以继续
-                self.process_loop.call_soon_threadsafe(result_event.set)
-            
-            # 在主线程（GUI线程）中执行
-            self.after(0, show_in_main_thread)
-            
-            # 等待结果
-            await result_event.wait()
-            return result_holder['value']
+        # 处理中的文件耗时在变化，可见时也需要重绘
+        if events or self._table_dirty or self.job_table.has_running_visible():
+            self.job_table.render()
+            self.table_summary_var.set(self.job_model.summary())
+            self._table_dirty = False
+        if schedule:
+            self.after(self.FRAME_MS, self.flush_progress)
+    
+    def on_filter_changed(self, *args):
+        """按状态和文件名过滤任务表"""
+        labels = {label: state for state, label in STATES.items()}
+        self.job_model.set_filter(labels.get(self.state_filter_var.get()), self.text_filter_var.get())
+        self.job_table.offset = 0
+        self._table_dirty = True
+    
+    def requeue_failed(self):
+        """重新处理失败和已取消的文件"""
+        paths = self.job_model.requeue()
+        self._table_dirty = True
+        if not paths:
+            messagebox.showinfo("重试失败项", "没有失败或已取消的文件。", parent=self)
+            return
+        self.begin_run(paths)
+    
+    def remove_selected(self):
+        """从任务表中移除选中的文件（之后不再处理）"""
+        if not self.job_table.selected:
+            return
+        self.job_model.remove(self.job_table.selected)
+        self.job_table.selected = set()
+        self._table_dirty = True
+        if self.image_var.get().strip() == self.selection_text:
+            self.selection_text = f"已选择 {len(self.job_model)} 个文件"
+            self.image_var.set(self.selection_text)
+    
+    def show_login_window(self, qrcode_bytes=None, done=False):
+        """登录界面回调：显示/更新二维码，登录结束时关闭窗口（在主线程中执行，不阻塞登录检测）"""
+        def update_in_main_thread():
+            window = self.login_window
+            if window is not None and not window.winfo_exists():
+                window = self.login_window = None
+            if done:
+                if window is not None:
+                    window.destroy()
+                    self.login_window = None
+            elif window is None:
+                self.login_window = LoginWindow(self, qrcode_bytes=qrcode_bytes)
+            elif qrcode_bytes:
+                window.update_qrcode(qrcode_bytes)
         
-        self.client = BaiduPicFilter(
-            headless=self.headless_var.get(),
+        self.after(0, update_in_main_thread)
+    
+    def client_options(self):
+        """当前界面上的处理配置（BaiduPicFilter.configure 的参数）"""
+        return dict(
             output_dir=self.output_var.get(),
-            display_login_ui=show_login_window  # 传入 GUI 回调
+            batch_submit_size=self.batch_size_var.get(),
+            concurrency=self.concurrency_var.get(),
+            tiling=self.tiling_var.get(),
+            adaptive_concurrency=self.adaptive_var.get(),
+            dedupe=self.dedupe_var.get(),
+            output_layout='mirror' if self.mirror_var.get() else 'flat',
+            archive_format=self.OUTPUT_ARCHIVES[self.archive_var.get()],
+            output_options=OutputOptions(
+                format=self.OUTPUT_FORMATS[self.format_var.get()],
+                quality=self.quality_var.get(),
+                color=self.OUTPUT_COLORS[self.color_var.get()],
+                max_side=self.max_side_var.get() or None
+            )
         )
+    
+    async def ensure_client(self):
+        """
+        取得浏览器客户端
+        
+        浏览器仍在运行且后台模式未改变时复用上一次的客户端，只更新处理配置并用一次页面探针确认登录；
+        否则启动新的浏览器并登录
+        """
+        headless = self.headless_var.get()
+        options = self.client_options()
+        client = self.client
+        if client is not None and (client.headless != headless or not client.browser
+                                   or not client.browser.is_connected()):
+            logger.info('🔄 后台模式已更改或浏览器已退出，重新启动浏览器...')
+            await self.close_client()
+            client = None
         
+        if client is not None:
+            client.progress_callback = self.on_progress
+            client.configure(**options)
+            if client._logged_in and await client._check_login_status():
+                logger.info('♻️  复用已启动的浏览器和登录状态')
+                return client
+            logger.info('🔐 检查登录状态...')
+            await client.ensure_login()
+            return client
+        
+        self.client = client = BaiduPicFilter(
+            headless=headless,
+            display_login_ui=self.show_login_window,  # 传入 GUI 回调
+            **options
+        )
+        client.progress_callback = self.on_progress
         try:
             logger.info('🚀 启动浏览器...')
-            await self.client.start()
+            await client.start()
             
             logger.info('🔐 检查登录状态...')
-            await self.client.ensure_login()
-            
-            logger.info(f'📊 开始处理 {len(image_files)} 张图片...')
-            await self.client.process_batch(image_files)
-            
-            # 显示统计信息
-            stats = self.client.get_stats()
-            logger.info(f'{"="*50}')
-            logger.info('📊 处理完成统计')
-            logger.info(f'{"="*50}')
-            logger.info(f'总数: {stats["total"]}')
-            logger.info(f'✅ 成功: {stats["success"]}')
-            logger.error(f'❌ 失败: {stats["failed"]}')
+            await client.ensure_login()
+        except BaseException:
+            await self.close_client()
+            raise
+        return client
+    
+    async def close_client(self):
+        """关闭浏览器客户端"""
+        client, self.client = self.client, None
+        if client is not None:
+            logger.debug('关闭浏览器...')
+            await client.close()
+    
+    async def async_process_logic(self, image_files, watch_dir=None):
+        """异步处理逻辑（指定 watch_dir 时持续监视该文件夹，直到用户停止）"""
+        await self.ensure_client()
+        
+        if watch_dir:
+            def log_result(result):
+                name = Path(result['path']).name
+                if result['success']:
+                    logger.info(f"✅ {name} 处理完成（{result['elapsed']:.1f}s）")
+                else:
+                    logger.error(f"❌ {name} 处理失败")
             
-            if stats['failed_files']:
-                logger.warning('\n失败的文件:')
-                for fname in stats['failed_files']:
-                    logger.warning(f'  - {fname}')
+            logger.info(f'👀 开始监视文件夹: {watch_dir}（新图片写入完成后自动处理）')
+            self.watch_stop = asyncio.Event()
+            try:
+                await watch_folder(self.client, watch_dir, stop_event=self.watch_stop, on_result=log_result)
+            finally:
+                self.watch_stop = None
+            return
+        
+        logger.info(f'📊 开始处理 {len(image_files)} 张图片...')
+        await self.client.process_batch(image_files)
+        
+        # 显示统计信息
+        stats = self.client.get_stats()
+        logger.info(f'{"="*50}')
+        logger.info('📊 处理完成统计')
+        logger.info(f'{"="*50}')
+        logger.info(f'总数: {stats["total"]}')
+        logger.info(f'✅ 成功: {stats["success"]}')
+        logger.error(f'❌ 失败: {stats["failed"]}')
+        logger.info(f'🔁 页面内重置: {stats["reset_in_place"]} 次 / 整页导航: {stats["reset_navigate"]} 次')
+        if stats['deduplicated']:
+            logger.info(f'♊ 重复页面: {stats["deduplicated"]} 张直接复用了相同页面的结果')
+        if stats['batched_images']:
+            logger.info(f'📦 分组提交完成: {stats["batched_images"]} 张（降级 {stats["batch_fallbacks"]} 次）')
+        if stats['probed_images']:
+            logger.info(f'📡 驱动往返: 平均每张 {stats["round_trips"] / stats["probed_images"]:.1f} 次')
+        for name, counter in stats['upload_strategies'].items():
+            logger.info(f'📤 上传方式 {STRATEGIES[name][2]}: 成功 {counter["success"]} / 失败 {counter["failed"]}，'
+                        f'平均 {counter["avg_seconds"]:.1f}s{"（当前优先）" if counter["preferred"] else ""}')
+        resources = stats.get('resources')
+        if resources and (resources['peak_rss_mb'] or resources['peak_heap_mb']):
+            logger.info(f'📈 资源占用: 浏览器内存峰值 {resources["peak_rss_mb"]:.0f}MB，'
+                        f'JS 堆峰值 {resources["peak_heap_mb"]:.0f}MB，'
+                        f'回收页面 {stats["page_recycles"]} 次 / 上下文 {stats["context_recycles"]} 次')
+        diagnostics = stats.get('diagnostics')
+        if diagnostics:
+            logger.info(f'🩺 诊断: 保存报告 {diagnostics["reports"]} 份（{diagnostics["report_dir"]}），'
+                        f'记录开销 {diagnostics["overhead_percent"]:.2f}%')
+        if stats['hedged']:
+            logger.info(f'🪁 重复提交: {stats["hedged"]} 次（备用页面先出结果 {stats["hedge_wins"]} 次）')
+        if self.client.concurrency_controller is not None:
+            control = self.client.concurrency_controller.snapshot()
+            logger.info(f'⚙️  自动并行: 最终 {control["limit"]} / 上限 {control["max_limit"]}，'
+                        f'调整 {len(self.client.concurrency_controller.decisions)} 次')
+            for decision in control['decisions'][-3:]:
+                logger.info(f'   {decision["from"]} → {decision["to"]}: {decision["reason"]}')
+        
+        if stats['preflight_fixed']:
+            logger.info(f'🔧 预检修正: {stats["preflight_fixed"]} 张（格式/方向/色彩/尺寸）')
+        
+        if stats['unprocessed']:
+            count = len(stats['unprocessed'])
+            logger.info(f'⏹️  已停止: {count} 张图片未开始处理，再次点击"开始处理"继续')
             
-            logger.info(f'{"="*50}')
-            logger.info(f'📁 输出文件夹: {self.client.output_dir.absolute()}')
+            def keep_unprocessed():
+                # 下次开始时只处理任务表中仍在等待的文件，不重新扫描文件夹
+                self.selection_text = f"未完成的 {count} 个文件"
+                self.image_var.set(self.selection_text)
             
-        finally:
-            logger.debug('关闭浏览器...')
-            await self.client.close()
+            self.after(0, keep_unprocessed)
+        
+        if stats['failed_files']:
+            logger.warning('\n失败的文件:')
+            reasons = {item['file']: item['reason'] for item in stats['rejected']}
+            for fname in stats['failed_files']:
+                logger.warning(f'  - {fname}' + (f'（预检未通过: {reasons[fname]}）' if fname in reasons else ''))
+        
+        logger.info(f'{"="*50}')
+        logger.info(f'📁 输出文件夹: {self.client.output_dir.absolute()}')
     
     def on_process_complete(self):
         """处理完成"""
+        if self._drain_timer is not None:
+            self.after_cancel(self._drain_timer)
+            self._drain_timer = None
+        if self.paused and self.client is not None:
+            self.runner.call_soon(self.client.resume)
+        self.paused = False
+        self.pause_button.config(text="⏸️ 暂停", bootstyle="warning-outline", state="disabled")
         self.start_button.config(text="🚀 开始处理", command=self.start_process, bootstyle="success")
         self.start_button.config(state="normal")
         self.browse_files_button.config(state="normal")
         self.browse_folder_button.config(state="normal")
         self.image_entry.config(state="normal")
+        self.logout_button.config(state="normal")
+        self.requeue_button.config(state="normal")
+        self.remove_button.config(state="normal")
+        
+        # 被取消时仍在处理中的文件标记为已取消，可用"重试失败项"重新处理
+        self.flush_progress(schedule=False)
+        self.job_model.finish_run()
+        self._table_dirty = True
         
         self.status_var.set("✅ 就绪")
         logger.info('\n✅ 所有任务完成！')
+    
+    def logout(self):
+        """退出登录：关闭浏览器并清除保存的 Cookie，下次处理时重新扫码登录"""
+        if not messagebox.askyesno("退出登录", "将关闭浏览器并清除保存的登录信息，下次处理时需要重新扫码登录。\n\n是否继续？",
+                                   parent=self):
+            return
+        
+        async def logout_async():
+            cookie_manager = self.client.cookie_manager if self.client is not None else CookieManager("baidu_cookies.json")
+            await self.close_client()
+            cookie_manager.clear_cookies("baidu")
+            logger.info('🔓 已退出登录')
+        
+        self.logout_button.config(state="disabled")
+        self.runner.submit(logout_async()).add_done_callback(
+            lambda job: self.after(0, lambda: self.logout_button.config(state="normal"))
+        )
+    
+    def on_close(self):
+        """关闭程序：取消进行中的任务，关闭浏览器后停止后台事件循环"""
+        self.status_var.set("⏳ 正在关闭浏览器...")
+        self.update_idletasks()
+        if self.current_job is not None and not self.current_job.done():
+            self.current_job.cancel()
+            try:
+                self.current_job.result(timeout=10)
+            except Exception:
+                pass
+        try:
+            self.runner.run(self.close_client(), timeout=15)
+        except Exception as e:
+            logger.warning(f'⚠️  关闭浏览器时出错: {e}')
+        self.runner.stop()
+        for cache in (self.thumbnail_cache, self.screen_cache):
+            if cache is not None:
+                cache.close()
+        self.destroy()
 
 
 def main():
@@ -0,0 +1,420 @@
+"""
+热文件夹监视
+持续监视扫描仪的投递文件夹，新图片一写完就送入正在运行的 BaiduPicFilter 工作页池，
+已处理的文件记录在台账中，重启后也不会重复处理
+
+优先使用 watchdog（可选依赖）订阅文件系统事件（inotify / FSEvents / ReadDirectoryChangesW），
+未安装时退化为轮询：按目录修改时间增量列出新文件，并逐个 stat 已知文件发现原地覆盖写入
+
+用法：
+    python hot_folder.py ./inbox -o ./output --concurrency 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from document_input import SUPPORTED_EXTENSIONS
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    HAS_WATCHDOG = True
+except ImportError:
+    FileSystemEventHandler = object
+    HAS_WATCHDOG = False
+
+
+LEDGER_NAME = ".hot_folder_ledger.jsonl"
+
+
+def _signature(stat: os.stat_result) -> Tuple[int, int]:
+    return stat.st_size, stat.st_mtime_ns
+
+
+class ProcessedLedger:
+    """
+    已处理文件台账（JSONL，逐行追加）
+
+    以 路径 + 大小 + 修改时间 标识一个文件版本：同一文件被覆盖写入新内容后会重新处理，
+    内容未变则永远不会重复处理
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._done: Dict[str, Tuple[int, int]] = {}
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 上次异常退出时写了一半的行
+                    if entry.get('success'):
+                        self._done[entry['path']] = (entry['size'], entry['mtime_ns'])
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def contains(self, path: str, stat: os.stat_result) -> bool:
+        """该文件的当前版本是否已成功处理"""
+        return self._done.get(str(Path(path).resolve())) == _signature(stat)
+
+    def record(self, path: str, stat: os.stat_result, success: bool, output: Optional[str] = None):
+        """追加一条处理记录（失败的记录只用于追溯，重启后会重试）"""
+        key = str(Path(path).resolve())
+        size, mtime_ns = _signature(stat)
+        if success:
+            self._done[key] = (size, mtime_ns)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'path': key, 'size': size, 'mtime_ns': mtime_ns, 'success': success,
+                'output': output, 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }, ensure_ascii=False) + '\n')
+
+
+class _EventForwarder(FileSystemEventHandler):
+    """把 watchdog 线程中的文件事件转发到事件循环"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, callback: Callable[[str], None]):
+        super().__init__()
+        self.loop = loop
+        self.callback = callback
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        # 移动/重命名事件以目标路径为准（扫描仪常先写临时文件再改名）
+        path = getattr(event, 'dest_path', None) or event.src_path
+        self.loop.call_soon_threadsafe(self.callback, path)
+
+
+class FolderWatcher:
+    """
+    监视文件夹中新出现或被修改的图片，文件写完后才交出
+
+    事件（或轮询发现的变化）只把文件登记为候选；候选文件的大小和修改时间连续 settle_seconds
+    不变、且能以只读方式打开时才视为写入完成。同一文件的连续事件会不断推迟就绪时间，
+    相当于对突发写入做了防抖
+    """
+
+    def __init__(self, folder: str, settle_seconds: float = 2.0, poll_interval: float = 1.0,
+                 use_events: bool = True, exclude: Iterable[str] = ()):
+        """
+        Args:
+            folder: 监视的文件夹（递归）
+            settle_seconds: 文件保持不变多久后视为写入完成（秒）
+            poll_interval: 检查候选文件 / 轮询目录的间隔（秒）
+            use_events: 是否优先使用文件系统事件（需要 watchdog）
+            exclude: 不监视的子文件夹（例如位于监视目录内的输出文件夹）
+        """
+        self.folder = Path(folder).resolve()
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.use_events = use_events and HAS_WATCHDOG
+        self.exclude = [Path(p).resolve() for p in exclude]
+
+        self._candidates: Dict[str, dict] = {}  # 路径 -> {'sig': (大小, 修改时间), 'since': 最后变化时刻}
+        self._lock = threading.Lock()  # 轮询在线程中进行，事件在事件循环中登记候选
+        self._dir_mtimes: Dict[str, int] = {}  # 轮询模式：目录 -> 修改时间
+        self._subdirs: Dict[str, list] = {}  # 轮询模式：目录 -> 子目录
+        self._known: Dict[str, Optional[Tuple[int, int]]] = {}  # 轮询模式：已交出的文件 -> 交出时的大小和修改时间
+        self._ready: Optional[asyncio.Queue] = None
+        self._observer = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def mode(self) -> str:
+        return 'events' if self.use_events else 'polling'
+
+    def _accepts(self, path: Path) -> bool:
+        if path.suffix.lower() not in SUPPORTED_EXTENSIONS or path.name.startswith('.'):
+            return False
+        # 本工具生成的结果文件不再作为输入
+        if "_去手写_" in path.stem:
+            return False
+        return not any(path == ex or ex in path.parents for ex in self.exclude)
+
+    def _touch(self, raw_path: str):
+        """登记（或刷新）一个候选文件"""
+        path = Path(raw_path)
+        if not self._accepts(path):
+            return
+        with self._lock:
+            self._candidates[str(path)] = {'sig': None, 'since': time.monotonic()}
+
+    def _scan_dir(self, directory: Path, initial: bool):
+        """
+        轮询模式：每个目录每轮只 stat 一次，只有修改时间变化过的目录才重新列出
+        （新建、删除、改名文件都会更新所在目录的修改时间；原地覆盖写入不会，由 _poll_known 发现）
+        """
+        key = str(directory)
+        try:
+            mtime = directory.stat().st_mtime_ns
+        except OSError:
+            self._dir_mtimes.pop(key, None)
+            self._subdirs.pop(key, None)
+            return
+
+        if initial or self._dir_mtimes.get(key) != mtime:
+            self._dir_mtimes[key] = mtime
+            subdirs = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            sub = Path(entry.path)
+                            if not any(sub == ex or ex in sub.parents for ex in self.exclude):
+                                subdirs.append(sub)
+                        elif entry.path not in self._known and self._accepts(Path(entry.path)):
+                            self._known[entry.path] = None
+                            self._touch(entry.path)
+            except OSError:
+                return
+            self._subdirs[key] = subdirs
+
+        for sub in self._subdirs.get(key, []):
+            self._scan_dir(sub, initial)
+
+    def _poll_known(self):
+        """轮询模式：stat 已交出的文件，大小或修改时间变化（原地覆盖写入）时重新登记为候选"""
+        for path, sig in list(self._known.items()):
+            if sig is None or path in self._candidates:
+                continue
+            try:
+                current = _signature(os.stat(path))
+            except OSError:
+                del self._known[path]  # 已被删除或移走
+                continue
+            if current != sig:
+                self._known[path] = None
+                self._touch(path)
+
+    def _check_candidates(self) -> list:
+        """检查候选文件，返回已写入完成的文件"""
+        now = time.monotonic()
+        ready = []
+        for path, info in list(self._candidates.items()):
+            try:
+                sig = _signature(os.stat(path))
+            except OSError:
+                self._discard_candidate(path, info)  # 已被删除或移走
+                self._known.pop(path, None)
+                continue
+            if sig != info['sig']:
+                info['sig'] = sig
+                info['since'] = now
+                continue
+            if now - info['since'] < self.settle_seconds or sig[0] == 0:
+                continue
+            try:
+                # Windows 上正在被写入的文件无法打开；其他平台至少保证可读
+                with open(path, 'rb') as f:
+                    f.read(1)
+            except OSError:
+                info['since'] = now
+                continue
+            if self._discard_candidate(path, info):
+                if path in self._known:
+                    self._known[path] = sig
+                ready.append(path)
+        return ready
+
+    def _discard_candidate(self, path: str, info: dict) -> bool:
+        """移除候选文件；检查期间又收到了该文件的事件时保留（返回 False）"""
+        with self._lock:
+            if self._candidates.get(path) is not info:
+                return False
+            del self._candidates[path]
+            return True
+
+    def _poll(self, poll_dirs: bool) -> list:
+        if poll_dirs:
+            self._scan_dir(self.folder, initial=False)
+            self._poll_known()
+        return self._check_candidates()
+
+    async def _run(self, poll_dirs: bool):
+        loop = asyncio.get_event_loop()
+        while True:
+            # 目录较大或位于网络共享盘时 stat 很慢，放到线程中执行，不阻塞工作页
+            for path in await loop.run_in_executor(None, self._poll, poll_dirs):
+                self._ready.put_nowait(path)
+            await asyncio.sleep(self.poll_interval)
+
+    async def start(self):
+        """开始监视；文件夹中已有的文件作为第一批候选"""
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self._ready = asyncio.Queue()
+        loop = asyncio.get_event_loop()
+
+        if self.use_events:
+            self._observer = Observer()
+            self._observer.schedule(_EventForwarder(loop, self._touch), str(self.folder), recursive=True)
+            self._observer.start()
+        # 先订阅事件再做初始扫描，两者之间新建的文件不会漏掉
+        await loop.run_in_executor(None, self._scan_dir, self.folder, True)
+        if self.use_events:
+            self._dir_mtimes.clear()
+            self._subdirs.clear()
+            self._known.clear()
+        self._task = asyncio.ensure_future(self._run(poll_dirs=not self.use_events))
+
+    async def get(self) -> str:
+        """等待下一个写入完成的文件"""
+        return await self._ready.get()
+
+    async def stop(self):
+        """停止监视"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._observer:
+            self._observer.stop()
+            await asyncio.get_event_loop().run_in_executor(None, self._observer.join)
+            self._observer = None
+
+
+async def watch_folder(client, folder: str, ledger_path: Optional[str] = None,
+                       settle_seconds: float = 2.0, poll_interval: float = 1.0, use_events: bool = True,
+                       stop_event: Optional[asyncio.Event] = None,
+                       on_result: Optional[Callable[[dict], None]] = None):
+    """
+    监视文件夹并把新图片送入客户端的工作页池，直到 stop_event 被设置（或任务被取消）
+
+    Args:
+        client: 已启动并登录的 BaiduPicFilter
+        folder: 监视的文件夹
+        ledger_path: 台账文件（默认放在输出文件夹中）
+        settle_seconds: 文件保持不变多久后视为写入完成（秒）
+        poll_interval: 检查间隔（秒）
+        use_events: 是否优先使用文件系统事件
+        stop_event: 设置后停止接收新文件，处理完已接收的文件后返回（同时调用 client.drain() 时只等待已开始的文件）
+        on_result: 每张图片完成时的回调，参数包含 path / success / output / elapsed
+    """
+    ledger = ProcessedLedger(ledger_path or str(client.output_dir / LEDGER_NAME))
+    watcher = FolderWatcher(folder, settle_seconds=settle_seconds, poll_interval=poll_interval,
+                            use_events=use_events, exclude=[client.output_dir])
+    client.output_layout.plan([], roots=[folder])  # 镜像输出时以监视的文件夹为根目录
+    client.start_intake()
+    loop = asyncio.get_event_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    pool = asyncio.ensure_future(client.run_job_queue(queue))
+    in_progress = set()
+    changed = set()  # 处理期间又被修改的文件，处理完后重新排队
+    received = 0
+    stopping = False
+
+    def submit(image_path: str, stat: os.stat_result):
+        nonlocal received
+        received += 1
+        in_progress.add(image_path)
+        print(f"📥 新文件: {Path(image_path).name}")
+        future = loop.create_future()
+        future.add_done_callback(
+            lambda f, p=image_path, s=stat, t=time.monotonic(): finished(p, s, t, f))
+        queue.put_nowait((lambda worker, p=image_path, i=received: run(worker, p, i), future))
+
+    def finished(image_path: str, stat: os.stat_result, started: float, future: asyncio.Future):
+        in_progress.discard(image_path)
+        if future.cancelled():
+            return
+        result = future.result() if not future.exception() else (False, None)
+        if result is None:
+            return  # 收尾时尚未开始，不记入台账，下次监视时重新处理
+        success, output = result
+        ledger.record(image_path, stat, success, output)
+        if on_result:
+            on_result({'path': image_path, 'success': success, 'output': output,
+                       'elapsed': time.monotonic() - started})
+        if image_path in changed:
+            changed.discard(image_path)
+            try:
+                current = os.stat(image_path)
+            except OSError:
+                return
+            # 处理的是旧内容：新内容重新排队（已停止接收时留给下次监视）
+            if not stopping and _signature(current) != _signature(stat):
+                submit(image_path, current)
+
+    async def run(worker, image_path: str, index: int):
+        if not await worker.admit():
+            return None
+        worker.last_output_path = None
+        success = await worker.process_image(image_path, index, index)
+        output = str(worker.last_output_path) if success and worker.last_output_path else None
+        return success, output
+
+    await watcher.start()
+    print(f"👀 正在监视: {watcher.folder}（{'文件系统事件' if watcher.mode == 'events' else '轮询'}模式，"
+          f"台账中已有 {len(ledger)} 个文件）")
+
+    stop_wait = asyncio.ensure_future(stop_event.wait()) if stop_event else loop.create_future()
+    try:
+        while True:
+            next_file = asyncio.ensure_future(watcher.get())
+            await asyncio.wait([next_file, stop_wait], return_when=asyncio.FIRST_COMPLETED)
+            if not next_file.done():
+                next_file.cancel()
+                break
+
+            image_path = next_file.result()
+            try:
+                stat = os.stat(image_path)
+            except OSError:
+                continue
+            if image_path in in_progress:
+                changed.add(image_path)
+                continue
+            if ledger.contains(image_path, stat):
+                continue
+            submit(image_path, stat)
+    finally:
+        stopping = True
+        stop_wait.cancel()
+        await watcher.stop()
+        # 已接收的文件处理完再退出（被取消时由工作页池负责中断）
+        queue.put_nowait(None)
+        await pool
+        await client.flush_outputs()
+        client.close_archive()
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="监视文件夹，自动处理新扫描的图片")
+    parser.add_argument('folder', help="监视的文件夹")
+    parser.add_argument('-o', '--output', default="./output", help="输出文件夹")
+    parser.add_argument('--concurrency', type=int, default=2, help="并行页数")
+    parser.add_argument('--settle', type=float, default=2.0, help="文件保持不变多少秒后视为写入完成")
+    parser.add_argument('--poll', action='store_true', help="强制使用轮询（网络共享盘上事件可能不可靠）")
+    parser.add_argument('--show-browser', action='store_true', help="显示浏览器窗口")
+    parser.add_argument('--archive', choices=['zip', 'tar'], help="结果写入归档（停止监视时写入索引并关闭）")
+    args = parser.parse_args()
+
+    from baidu_automation import BaiduPicFilter
+
+    async def run():
+        client = BaiduPicFilter(headless=not args.show_browser, output_dir=args.output,
+                                concurrency=args.concurrency, archive_format=args.archive)
+        try:
+            await client.start()
+            await client.ensure_login()
+            await watch_folder(client, args.folder, settle_seconds=args.settle, use_events=not args.poll)
+        finally:
+            await client.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n⏹️  已停止监视")
+
+
+if __name__ == "__main__":
+    main()
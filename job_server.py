@@ -0,0 +1,649 @@
+"""
+常驻任务服务
+在本机常驻运行一组已登录的 BaiduPicFilter 浏览器，通过 HTTP（TCP 或 Unix socket）接收任务，
+多个客户端（例如多位老师的工具）共享同一个热浏览器池，无需各自启动浏览器和登录
+
+接口（JSON）：
+    POST   /jobs                  提交任务 {"paths": [...], "priority": 0, "name": "...", "options": {...}}
+    GET    /jobs                  任务列表
+    GET    /jobs/<id>             任务状态
+    GET    /jobs/<id>/results     流式返回结果（NDJSON，分块传输，任务结束后关闭）
+    DELETE /jobs/<id>             取消任务（未开始的图片不再处理，处理中的图片完成后停止）；
+                                  已结束的任务则从列表中删除
+    GET    /stats                 服务统计
+
+options 为 BaiduPicFilter.configure 的参数（并行相关的参数由服务统一决定），只对该任务生效：
+    output_dir      输出文件夹（相对路径位于服务输出根目录下，默认为以任务ID命名的子文件夹）
+    output_layout   flat / mirror
+    output_options  输出编码选项，如 {"format": "jpeg", "quality": 80, "color": "gray"}
+    tiling          超大图片分块处理
+    dedupe          近似重复的图片只处理一张，其余复制结果
+    archive_format  结果写入 zip / tar 归档
+
+已结束的任务保留 finished_ttl 秒、最多 max_finished 个，之后自动移除
+
+用法：
+    python job_server.py serve --port 8765 --browsers 2 --concurrency 2
+    python job_server.py serve --unix /tmp/rhw.sock
+    python job_server.py submit ./scans --priority 5 --options '{"output_options": {"format": "jpeg"}}'
+    python job_server.py results <任务ID>
+"""
+import argparse
+import asyncio
+import functools
+import inspect
+import itertools
+import json
+import shutil
+import sys
+import time
+import urllib.request
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from archive_output import ARCHIVE_FORMATS, ArchiveSink
+from dedupe import find_duplicates
+from document_input import collect_input_files, is_document
+from output_encoder import OutputOptions
+from output_layout import LAYOUT_MODES, OutputLayout
+
+
+# 由服务统一决定、不能按任务指定的 configure 参数（浏览器池的并行方式）
+POOL_OPTIONS = ('concurrency', 'batch_submit_size', 'adaptive_concurrency')
+
+
+def parse_job_options(options) -> dict:
+    """
+    校验任务选项（BaiduPicFilter.configure 的参数名）
+
+    Returns:
+        dict: 原样的选项（output_options 已校验可构造 OutputOptions）；不合法时抛出 ValueError
+    """
+    from baidu_automation import BaiduPicFilter
+
+    if options is None:
+        return {}
+    if not isinstance(options, dict):
+        raise ValueError("options 必须是对象")
+    allowed = set(inspect.signature(BaiduPicFilter.configure).parameters) - {'self'} - set(POOL_OPTIONS)
+    unknown = sorted(set(options) - allowed)
+    if unknown:
+        raise ValueError(f"不支持的任务选项: {', '.join(unknown)}（可用: {', '.join(sorted(allowed))}）")
+
+    if 'output_dir' in options and not isinstance(options['output_dir'], str):
+        raise ValueError("output_dir 必须是字符串")
+    if options.get('output_layout', 'flat') not in LAYOUT_MODES:
+        raise ValueError(f"未知的输出布局: {options['output_layout']}")
+    if options.get('archive_format') not in (None, *ARCHIVE_FORMATS):
+        raise ValueError(f"不支持的归档格式: {options['archive_format']}")
+    for key in ('tiling', 'dedupe'):
+        if not isinstance(options.get(key, False), bool):
+            raise ValueError(f"{key} 必须是 true / false")
+    encoding = options.get('output_options')
+    if encoding is not None:
+        if not isinstance(encoding, dict):
+            raise ValueError("output_options 必须是对象")
+        try:
+            OutputOptions(**encoding)
+        except TypeError as e:
+            raise ValueError(f"output_options 无效: {e}")
+    return dict(options)
+
+
+class Job:
+    """一个提交的任务：一组图片及其处理进度"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, paths: List[str], priority: int = 0, name: str = "", options: Optional[dict] = None):
+        self.id = f"{int(time.time())}-{next(self._ids)}"
+        self.name = name or self.id
+        self.priority = priority
+        self.options = options or {}
+        self.total = len(paths)
+        self.pending = deque(paths)
+        self.in_flight = 0
+        self.success = 0
+        self.failed = 0
+        self.results: List[dict] = []
+        self.status = 'queued'  # queued / running / done / cancelled
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.last_served = 0.0
+        self.changed = asyncio.Condition()
+
+        # 按任务选项准备的输出设置（由 JobServer.submit 填写）
+        self.output_dir: Optional[Path] = None
+        self.layout: Optional[OutputLayout] = None
+        self.output_options: Optional[OutputOptions] = None
+        self.tiling: Optional[bool] = None
+        self.archive: Optional[ArchiveSink] = None
+        self.duplicates: Dict[str, List[str]] = {}  # 代表图片 -> 重复图片（代表图片完成后复制结果）
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ('done', 'cancelled') and self.in_flight == 0
+
+    def summary(self) -> dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'priority': self.priority,
+            'status': self.status,
+            'total': self.total,
+            'pending': len(self.pending),
+            'in_flight': self.in_flight,
+            'success': self.success,
+            'failed': self.failed,
+            'created': self.created,
+            'finished': self.finished,
+            'options': self.options,
+            'output_dir': str(self.output_dir) if self.output_dir else None,
+        }
+
+    async def notify(self):
+        async with self.changed:
+            self.changed.notify_all()
+
+
+class JobServer:
+    """常驻任务服务：热浏览器池 + 按优先级公平调度"""
+
+    def __init__(self, browsers: int = 1, concurrency: int = 1, output_dir: str = "./output",
+                 headless: bool = True, aging_seconds: float = 60.0, keepalive_seconds: float = 600.0,
+                 finished_ttl: float = 3600.0, max_finished: int = 200, **client_options):
+        """
+        Args:
+            browsers: 浏览器实例数
+            concurrency: 每个浏览器的并行页数
+            output_dir: 输出根目录（每个任务写入以任务ID命名的子文件夹）
+            headless: 是否无头运行
+            aging_seconds: 等待多久相当于提升一级优先级（防止低优先级任务饿死）
+            keepalive_seconds: 空闲时检查登录状态、刷新Cookie的间隔
+            finished_ttl: 已结束的任务保留多久（秒），之后从任务列表中移除
+            max_finished: 最多保留多少个已结束的任务
+            client_options: 传给 BaiduPicFilter 的其他参数（任务未指定选项时的默认值）
+        """
+        self.browsers = max(1, browsers)
+        self.concurrency = max(1, concurrency)
+        self.output_dir = Path(output_dir)
+        self.headless = headless
+        self.aging_seconds = aging_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self.finished_ttl = finished_ttl
+        self.max_finished = max_finished
+        # 归档由服务按任务管理（每个任务一个归档），浏览器客户端本身不归档
+        self.archive_format = client_options.pop('archive_format', None)
+        self.client_options = client_options
+
+        self.clients: list = []
+        self.jobs: Dict[str, Job] = {}
+        self._work_ready: Optional[asyncio.Condition] = None
+        self._slots: List[asyncio.Task] = []
+        self._started = time.time()
+        self._last_activity = time.time()
+
+    # ------------------------------------------------------------------ 浏览器池
+
+    async def start(self):
+        """启动浏览器池并登录（只在服务启动时付出一次启动和登录成本）"""
+        from baidu_automation import BaiduPicFilter
+
+        self._work_ready = asyncio.Condition()
+        for index in range(self.browsers):
+            client = BaiduPicFilter(headless=self.headless, output_dir=str(self.output_dir),
+                                    concurrency=self.concurrency, **self.client_options)
+            print(f"🚀 启动浏览器 {index + 1}/{self.browsers}...")
+            await client.start()
+            await client.ensure_login()
+            self.clients.append(client)
+
+            for worker in await client._ensure_workers(self.concurrency):
+                self._slots.append(asyncio.ensure_future(self._slot_loop(worker)))
+
+        self._slots.append(asyncio.ensure_future(self._keepalive_loop()))
+        print(f"✅ 浏览器池就绪：{self.browsers} 个浏览器 × {self.concurrency} 个页面")
+
+    async def close(self):
+        for task in self._slots:
+            task.cancel()
+        await asyncio.gather(*self._slots, return_exceptions=True)
+        for client in self.clients:
+            await client.close()
+        self.clients = []
+
+    async def _keepalive_loop(self):
+        """空闲时定期确认登录状态并刷新保存的Cookie，保持会话常热"""
+        while True:
+            await asyncio.sleep(self.keepalive_seconds)
+            if time.time() - self._last_activity < self.keepalive_seconds:
+                continue
+            for client in self.clients:
+                try:
+                    await client._ensure_tool_ready()
+                    if await client._check_login_status():
+                        await client._save_cookies()
+                    else:
+                        print("⚠️  会话已失效，重新登录...")
+                        await client.ensure_login()
+                except Exception as e:
+                    print(f"⚠️  保活检查失败: {e}")
+
+    # ------------------------------------------------------------------ 调度
+
+    def _pick_job(self) -> Optional[Job]:
+        """
+        选出下一张图片所属的任务
+
+        有效优先级 = 优先级 + 等待时间 / aging_seconds；相同时选最久未被服务的任务，
+        同优先级任务之间因此按轮转方式公平推进
+        """
+        now = time.time()
+        candidates = [j for j in self.jobs.values() if j.pending and j.status in ('queued', 'running')]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda j: (
+            j.priority + (now - max(j.last_served, j.created)) / self.aging_seconds,
+            -j.last_served,
+        ))
+
+    async def _next_work(self):
+        async with self._work_ready:
+            while True:
+                job = self._pick_job()
+                if job is not None:
+                    job.last_served = time.time()
+                    job.status = 'running'
+                    job.in_flight += 1
+                    return job, job.pending.popleft()
+                await self._work_ready.wait()
+
+    async def _slot_loop(self, worker):
+        """一个页面的工作循环：领取图片 → 处理 → 记录结果"""
+        while True:
+            job, image_path = await self._next_work()
+            self._last_activity = time.time()
+            index = job.total - len(job.pending)
+            self._apply_job(worker, job)
+            worker.last_output_path = None
+
+            started = time.monotonic()
+            output = None
+            try:
+                success = await worker.process_image(image_path, index, job.total)
+                if success and worker.last_output_path:
+                    output = await self._collect_output(worker, job, image_path, worker.last_output_path)
+            except Exception as e:
+                print(f"❌ 处理出错: {e}")
+                success = False
+
+            job.in_flight -= 1
+            self._record(job, image_path, success, output, time.monotonic() - started)
+            if job.duplicates.get(str(image_path)):
+                await self._fan_out(worker, job, str(image_path), success, output)
+            if not job.pending and job.in_flight == 0 and job.status == 'running':
+                job.status = 'done'
+            if job.is_finished:
+                await self._finish(job)
+            await job.notify()
+
+    def _apply_job(self, worker, job: Job):
+        """处理一张图片前，把所属任务的输出设置应用到工作页"""
+        worker.output_dir = job.output_dir
+        worker.output_dir.mkdir(parents=True, exist_ok=True)
+        worker.output_layout = job.layout
+        worker.output_options = job.output_options
+        worker.tiling = job.tiling
+
+    @staticmethod
+    def _record(job: Job, image_path: str, success: bool, output: Optional[str], elapsed: float, **extra):
+        if success:
+            job.success += 1
+        else:
+            job.failed += 1
+        job.results.append(dict({
+            'path': image_path,
+            'success': success,
+            'output': output,
+            'elapsed': round(elapsed, 2),
+        }, **extra))
+
+    async def _collect_output(self, worker, job: Job, image_path: str, output_path: Path) -> str:
+        """任务要求归档时，把结果文件移入该任务的归档，返回结果位置"""
+        if job.archive is None:
+            return str(output_path)
+        await worker.flush_outputs()  # 后台编码写完文件后才能移入归档
+        return await asyncio.get_event_loop().run_in_executor(
+            None, self._move_to_archive, job, Path(output_path), image_path)
+
+    @staticmethod
+    def _archive_entry(job: Job, path: Path) -> str:
+        try:
+            return path.relative_to(job.output_dir).as_posix()
+        except ValueError:
+            return path.name
+
+    def _move_to_archive(self, job: Job, path: Path, source: str) -> str:
+        location = job.archive.add_file(self._archive_entry(job, path), str(path), source)
+        path.unlink()
+        return str(location)
+
+    async def _fan_out(self, worker, job: Job, representative: str, success: bool, output: Optional[str]):
+        """代表图片完成后，把结果复制给任务中与之重复的图片（代表图片失败时它们同样记为失败）"""
+        loop = asyncio.get_event_loop()
+        for copy in job.duplicates.pop(representative):
+            copied = None
+            if success and output:
+                target = worker._build_output_path(copy, suffix=Path(output).suffix)
+                try:
+                    copied = await loop.run_in_executor(None, self._copy_output, job, output, target, copy)
+                except Exception as e:
+                    print(f"❌ 复制重复图片结果失败: {Path(copy).name} - {e}")
+            self._record(job, copy, copied is not None, copied, 0.0, duplicate_of=representative)
+
+    def _copy_output(self, job: Job, output: str, target: Path, source: str) -> str:
+        if job.archive is not None:
+            return str(job.archive.add(self._archive_entry(job, target), job.archive.read(output), source))
+        shutil.copyfile(output, target)
+        return str(target)
+
+    async def _finish(self, job: Job):
+        """任务结束：关闭归档（写入索引），记录结束时间"""
+        if job.finished is not None:
+            return
+        job.finished = time.time()
+        if job.archive is not None:
+            await asyncio.get_event_loop().run_in_executor(None, job.archive.close)
+
+    # ------------------------------------------------------------------ 任务操作
+
+    async def submit(self, paths: List[str], priority: int = 0, name: str = "",
+                     options: Optional[dict] = None) -> Job:
+        """
+        提交任务
+
+        Args:
+            paths: 图片或文件夹
+            priority: 优先级（越大越先处理）
+            name: 任务名称
+            options: 任务选项（见模块说明），不合法时抛出 ValueError
+        """
+        options = parse_job_options(options)
+        files = collect_input_files(paths)
+        if not files:
+            raise ValueError("未找到有效的图片文件")
+        self._evict_finished()
+        job = Job(files, priority=priority, name=name, options=options)
+        self._prepare_job(job, paths)
+        dedupe = options.get('dedupe', self.clients[0].dedupe if self.clients else False)
+        if dedupe and len(files) > 1:
+            await self._dedupe_job(job)
+        self.jobs[job.id] = job
+        print(f"📥 新任务 {job.id}（{job.name}）：{job.total} 张，优先级 {priority}"
+              + (f"，选项 {json.dumps(options, ensure_ascii=False)}" if options else ""))
+        async with self._work_ready:
+            self._work_ready.notify_all()
+        return job
+
+    def _prepare_job(self, job: Job, paths: List[str]):
+        """按任务选项准备输出设置，未指定的选项沿用服务启动时的设置"""
+        defaults = self.clients[0] if self.clients else None
+        options = job.options
+        output_dir = Path(options.get('output_dir') or job.id)
+        job.output_dir = output_dir if output_dir.is_absolute() else self.output_dir / output_dir
+        job.layout = OutputLayout(options.get('output_layout', defaults.output_layout.mode if defaults else 'flat'))
+        # 镜像输出时以提交的文件夹为根目录
+        job.layout.plan(list(job.pending), roots=[p for p in paths if Path(p).is_dir()] or None)
+        if 'output_options' in options:
+            job.output_options = OutputOptions(**options['output_options']) if options['output_options'] else None
+        else:
+            job.output_options = defaults.output_options if defaults else None
+        job.tiling = options.get('tiling', defaults.tiling if defaults else False)
+        archive_format = options.get('archive_format', self.archive_format)
+        if archive_format:
+            job.archive = ArchiveSink(str(job.output_dir), archive_format)
+
+    async def _dedupe_job(self, job: Job):
+        """近似重复的图片只留代表图片排队，其余在代表图片完成后复制结果"""
+        candidates = [p for p in job.pending if not is_document(p)]
+        executor = self.clients[0]._get_process_pool() if self.clients else None
+        try:
+            groups = await asyncio.get_event_loop().run_in_executor(
+                None, functools.partial(find_duplicates, candidates, executor=executor))
+        except Exception as e:
+            print(f"⚠️  重复检测失败，全部图片照常处理: {e}")
+            return
+        copies = {p for group in groups.values() for p in group} - set(groups)
+        job.duplicates = {rep: [p for p in group if p in copies] for rep, group in groups.items()}
+        job.pending = deque(p for p in job.pending if p not in copies)
+        if copies:
+            print(f"♊ 任务 {job.id}：{len(copies)} 张近似重复的图片将复用代表图片的结果")
+
+    async def cancel(self, job: Job):
+        if job.is_finished:
+            return
+        dropped = len(job.pending)
+        job.pending.clear()
+        job.status = 'cancelled'
+        if job.in_flight == 0:
+            await self._finish(job)
+        print(f"⏹️  任务 {job.id} 已取消，{dropped} 张未处理")
+        await job.notify()
+
+    def remove(self, job: Job) -> bool:
+        """从任务列表中删除已结束的任务（未结束时返回 False）"""
+        if not job.is_finished:
+            return False
+        self.jobs.pop(job.id, None)
+        return True
+
+    def _evict_finished(self):
+        """移除过期的已结束任务，并只保留最近 max_finished 个（结果列表随任务一起释放）"""
+        now = time.time()
+        finished = sorted((j for j in self.jobs.values() if j.is_finished and j.finished),
+                          key=lambda j: j.finished)
+        excess = len(finished) - self.max_finished
+        for position, job in enumerate(finished):
+            if position < excess or now - job.finished > self.finished_ttl:
+                del self.jobs[job.id]
+
+    def stats(self) -> dict:
+        self._evict_finished()
+        jobs = list(self.jobs.values())
+        return {
+            'uptime': round(time.time() - self._started, 1),
+            'browsers': len(self.clients),
+            'slots': len(self.clients) * self.concurrency,
+            'jobs': len(jobs),
+            'active_jobs': sum(1 for j in jobs if not j.is_finished),
+            'pending_images': sum(len(j.pending) for j in jobs),
+            'in_flight': sum(j.in_flight for j in jobs),
+            'processed': sum(j.success + j.failed for j in jobs),
+        }
+
+    # ------------------------------------------------------------------ HTTP
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None):
+        """启动 HTTP 服务（阻塞运行）"""
+        if unix_path:
+            server = await asyncio.start_unix_server(self._handle_connection, path=unix_path)
+            print(f"🛰️  服务已启动: unix:{unix_path}")
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+            print(f"🛰️  服务已启动: http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').strip()
+            if not request_line:
+                return
+            method, target, _ = request_line.split(' ', 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                key, _, value = line.partition(':')
+                headers[key.strip().lower()] = value.strip()
+            body = b''
+            if int(headers.get('content-length', 0)):
+                body = await reader.readexactly(int(headers['content-length']))
+
+            await self._route(method.upper(), target.split('?', 1)[0].rstrip('/'), body, writer)
+        except Exception as e:
+            await self._send_json(writer, 500, {'error': str(e)})
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter):
+        parts = [p for p in path.split('/') if p]
+
+        if parts == ['stats'] and method == 'GET':
+            return await self._send_json(writer, 200, self.stats())
+
+        if parts == ['jobs'] and method == 'GET':
+            self._evict_finished()
+            return await self._send_json(writer, 200, [j.summary() for j in self.jobs.values()])
+
+        if parts == ['jobs'] and method == 'POST':
+            payload = json.loads(body or b'{}')
+            try:
+                job = await self.submit(payload.get('paths', []), int(payload.get('priority', 0)),
+                                        payload.get('name', ''), payload.get('options'))
+            except ValueError as e:
+                return await self._send_json(writer, 400, {'error': str(e)})
+            return await self._send_json(writer, 201, job.summary())
+
+        if len(parts) >= 2 and parts[0] == 'jobs':
+            job = self.jobs.get(parts[1])
+            if job is None:
+                return await self._send_json(writer, 404, {'error': '任务不存在'})
+            if len(parts) == 2 and method == 'GET':
+                return await self._send_json(writer, 200, job.summary())
+            if len(parts) == 2 and method == 'DELETE':
+                if self.remove(job):
+                    return await self._send_json(writer, 200, {'deleted': job.id})
+                await self.cancel(job)
+                return await self._send_json(writer, 200, job.summary())
+            if parts[2:] == ['results'] and method == 'GET':
+                return await self._stream_results(job, writer)
+
+        await self._send_json(writer, 404, {'error': '未知接口'})
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + data
+        )
+        await writer.drain()
+
+    async def _stream_results(self, job: Job, writer: asyncio.StreamWriter):
+        """以分块传输逐条推送结果（NDJSON），任务结束后以汇总行收尾"""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/x-ndjson; charset=utf-8\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+
+        def chunk(payload) -> bytes:
+            line = json.dumps(payload, ensure_ascii=False).encode('utf-8') + b"\n"
+            return f"{len(line):X}\r\n".encode('latin-1') + line + b"\r\n"
+
+        sent = 0
+        while True:
+            async with job.changed:
+                while sent == len(job.results) and not job.is_finished:
+                    await job.changed.wait()
+            for result in job.results[sent:]:
+                writer.write(chunk(result))
+            sent = len(job.results)
+            await writer.drain()
+            if job.is_finished and sent == len(job.results):
+                break
+
+        writer.write(chunk({'summary': job.summary()}) + b"0\r\n\r\n")
+        await writer.drain()
+
+
+def _request(url: str, method: str = 'GET', payload=None):
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = urllib.request.Request(url, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+    return urllib.request.urlopen(request)
+
+
+def main():
+    """命令行入口：启动服务或作为客户端提交/查询任务"""
+    parser = argparse.ArgumentParser(description="去手写常驻任务服务")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve = sub.add_parser('serve', help="启动服务")
+    serve.add_argument('--unix', help="监听 Unix socket 路径（代替 TCP 端口）")
+    serve.add_argument('--browsers', type=int, default=1)
+    serve.add_argument('--concurrency', type=int, default=1)
+    serve.add_argument('-o', '--output', default="./output")
+    serve.add_argument('--show-browser', action='store_true')
+
+    submit = sub.add_parser('submit', help="提交任务")
+    submit.add_argument('paths', nargs='+')
+    submit.add_argument('--priority', type=int, default=0)
+    submit.add_argument('--name', default="")
+    submit.add_argument('--options', type=json.loads, default=None,
+                        help='任务选项（JSON），例如 \'{"tiling": true, "archive_format": "zip"}\'')
+
+    for name in ('status', 'results', 'cancel'):
+        cmd = sub.add_parser(name)
+        cmd.add_argument('job_id', nargs='?' if name == 'status' else None)
+
+    args = parser.parse_args()
+    base = f"http://{args.host}:{args.port}"
+
+    if args.command == 'serve':
+        server = JobServer(browsers=args.browsers, concurrency=args.concurrency,
+                           output_dir=args.output, headless=not args.show_browser)
+
+        async def run():
+            await server.start()
+            try:
+                await server.serve(args.host, args.port, args.unix)
+            finally:
+                await server.close()
+
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
+    elif args.command == 'submit':
+        paths = [str(Path(p).resolve()) for p in args.paths]
+        payload = {'paths': paths, 'priority': args.priority, 'name': args.name, 'options': args.options}
+        with _request(f"{base}/jobs", 'POST', payload) as r:
+            print(r.read().decode('utf-8'))
+    elif args.command == 'status':
+        url = f"{base}/jobs/{args.job_id}" if args.job_id else f"{base}/jobs"
+        with _request(url) as r:
+            print(r.read().decode('utf-8'))
+    elif args.command == 'results':
+        with _request(f"{base}/jobs/{args.job_id}/results") as r:
+            for line in r:
+                sys.stdout.write(line.decode('utf-8'))
+                sys.stdout.flush()
+    elif args.command == 'cancel':
+        with _request(f"{base}/jobs/{args.job_id}", 'DELETE') as r:
+            print(r.read().decode('utf-8'))
+
+
+if __name__ == "__main__":
+    main()
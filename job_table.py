@@ -0,0 +1,295 @@
+"""
+GUI 任务表
+每个输入文件一行，显示状态、阶段、耗时和重试次数。
+表格只创建可见行数的行对象，滚动时循环复用，数据来自 JobModel；
+处理进度由 BaiduPicFilter.progress_callback 推送，GUI 按帧合并后一次性更新，上万个文件也不会卡顿
+"""
+import time
+import tkinter.font as tkfont
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+
+
+# 状态 -> 界面文字
+STATES = {
+    'queued': '等待',
+    'running': '处理中',
+    'done': '完成',
+    'failed': '失败',
+    'cancelled': '已取消',
+}
+
+
+class JobItem:
+    """任务表中的一个文件"""
+
+    __slots__ = ('path', 'name', 'state', 'stage', 'started', 'finished', 'retries', 'error', 'output')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = Path(path).name
+        self.state = 'queued'
+        self.stage = ''
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.retries = 0
+        self.error: Optional[str] = None
+        self.output: Optional[str] = None  # 结果文件
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    def row(self) -> tuple:
+        elapsed = self.elapsed
+        return (
+            self.name,
+            STATES[self.state],
+            self.stage,
+            f"{elapsed:.1f}s" if elapsed is not None else '',
+            self.retries or '',
+            self.error or '',
+        )
+
+
+class JobModel:
+    """任务表数据：文件列表、过滤和按状态计数（只在主线程中访问）"""
+
+    def __init__(self):
+        self.items: List[JobItem] = []
+        self._index: Dict[str, JobItem] = {}
+        self.counts: Dict[str, int] = dict.fromkeys(STATES, 0)
+        self.state_filter: Optional[str] = None
+        self.text_filter = ''
+        self._view: Optional[List[JobItem]] = None
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _rebuild(self):
+        self._index = {item.path: item for item in self.items}
+        self.counts = dict.fromkeys(STATES, 0)
+        for item in self.items:
+            self.counts[item.state] += 1
+        self._view = None
+
+    def set_paths(self, paths: Iterable[str]):
+        """替换为一组新文件（全部为等待状态）"""
+        self.items = [JobItem(str(p)) for p in dict.fromkeys(str(p) for p in paths)]
+        self._rebuild()
+
+    def remove(self, paths: Iterable[str]):
+        removed = set(paths)
+        self.items = [item for item in self.items if item.path not in removed]
+        self._rebuild()
+
+    def paths(self, states: Iterable[str] = ('queued',)) -> List[str]:
+        states = set(states)
+        return [item.path for item in self.items if item.state in states]
+
+    def _set_state(self, item: JobItem, state: str):
+        if item.state == state:
+            return
+        self.counts[item.state] -= 1
+        self.counts[state] += 1
+        item.state = state
+        if self.state_filter is not None:
+            self._view = None
+
+    def requeue(self, states: Iterable[str] = ('failed', 'cancelled')) -> List[str]:
+        """把失败/已取消的文件重新设为等待，返回这些文件"""
+        paths = []
+        for item in self.items:
+            if item.state in states:
+                self._set_state(item, 'queued')
+                item.stage = ''
+                item.started = item.finished = None
+                item.retries = 0
+                item.error = None
+                item.output = None
+                paths.append(item.path)
+        return paths
+
+    def finish_run(self):
+        """一次处理结束：仍在处理中的文件（被取消）标记为已取消"""
+        for item in self.items:
+            if item.state == 'running':
+                self._set_state(item, 'cancelled')
+                item.finished = time.time()
+
+    def apply(self, event: dict):
+        """应用一条进度事件（BaiduPicFilter.progress_callback 的参数）"""
+        item = self._index.get(event['path'])
+        if item is None:
+            # 监视文件夹时新出现的文件
+            item = JobItem(event['path'])
+            self.items.append(item)
+            self._index[item.path] = item
+            self.counts[item.state] += 1
+            self._view = None
+
+        state = event['state']
+        if state == 'running' and item.state != 'running':
+            item.started = event.get('started', event['time'])
+            item.finished = None
+            item.error = None
+        elif state in ('done', 'failed'):
+            if item.started is None:
+                item.started = event.get('started', event['time'])
+            item.finished = event['time']
+        self._set_state(item, state)
+        if event.get('stage') is not None:
+            item.stage = event['stage']
+        if event.get('retries') is not None:
+            item.retries = event['retries']
+        if event.get('error'):
+            item.error = event['error']
+        if event.get('output'):
+            item.output = event['output']
+
+    def set_filter(self, state: Optional[str] = None, text: str = ''):
+        self.state_filter = state
+        self.text_filter = text.strip().lower()
+        self._view = None
+
+    def view(self) -> List[JobItem]:
+        """过滤后的文件（结果缓存到下次数据或过滤条件变化）"""
+        if self._view is None:
+            if self.state_filter is None and not self.text_filter:
+                self._view = self.items
+            else:
+                self._view = [
+                    item for item in self.items
+                    if (self.state_filter is None or item.state == self.state_filter)
+                    and (not self.text_filter or self.text_filter in item.name.lower())
+                ]
+        return self._view
+
+    def summary(self) -> str:
+        parts = [f"共 {len(self.items)}"]
+        parts += [f"{label} {self.counts[state]}" for state, label in STATES.items() if self.counts[state]]
+        return " | ".join(parts)
+
+
+class VirtualJobTable(ttk.Frame):
+    """虚拟化任务表：只创建可见行，滚动时用同一批行对象显示不同的文件"""
+
+    COLUMNS = (
+        ('name', '文件', 300),
+        ('state', '状态', 70),
+        ('stage', '阶段', 110),
+        ('elapsed', '耗时', 70),
+        ('retries', '重试', 50),
+        ('info', '信息', 320),
+    )
+    STATE_COLORS = {'running': '#3498DB', 'done': '#27AE60', 'failed': '#E74C3C', 'cancelled': '#F39C12'}
+
+    def __init__(self, parent, model: JobModel, **kwargs):
+        """
+        Args:
+            parent: 父组件
+            model: 任务表数据
+        """
+        super().__init__(parent, **kwargs)
+        self.model = model
+        self.offset = 0
+        self.selected = set()  # 选中的文件路径（行对象循环复用，选择按路径记录）
+        self._rows = 1
+        self._visible: List[JobItem] = []
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.tree = ttk.Treeview(self, columns=[c[0] for c in self.COLUMNS], show='headings',
+                                 selectmode='extended', height=1)
+        for key, title, width in self.COLUMNS:
+            self.tree.heading(key, text=title, anchor='w')
+            self.tree.column(key, width=width, minwidth=40, stretch=key in ('name', 'info'))
+        for state, color in self.STATE_COLORS.items():
+            self.tree.tag_configure(state, foreground=color)
+        self.tree.grid(row=0, column=0, sticky='nsew')
+
+        self.scrollbar = ttk.Scrollbar(self, orient=VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+
+        font = tkfont.nametofont('TkDefaultFont')
+        self._row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or font.metrics('linespace') + 6)
+
+        self.tree.bind('<Configure>', self._on_resize)
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(3))
+        self.tree.bind('<Prior>', lambda e: self.scroll(-self._rows))
+        self.tree.bind('<Next>', lambda e: self.scroll(self._rows))
+
+    def _on_resize(self, event):
+        # 表头约占一行
+        rows = max(1, event.height // self._row_height - 1)
+        if rows != self._rows:
+            self._rows = rows
+            self.render()
+
+    def _on_scrollbar(self, action, value, unit=None):
+        total = len(self.model.view())
+        if action == 'moveto':
+            self.offset = int(float(value) * total)
+        elif action == 'scroll':
+            self.scroll(int(value) * (self._rows if unit == 'pages' else 1))
+            return
+        self.render()
+
+    def scroll(self, rows: int):
+        self.offset += rows
+        self.render()
+        return 'break'
+
+    def _on_select(self, event=None):
+        # 可见行的选择以表格为准，不可见的选中文件保持不变
+        visible = {item.path for item in self._visible}
+        rows = self.tree.get_children()
+        chosen = {self._visible[rows.index(iid)].path for iid in self.tree.selection()
+                  if iid in rows and rows.index(iid) < len(self._visible)}
+        self.selected = (self.selected - visible) | chosen
+
+    def render(self):
+        """按当前偏移量刷新可见行"""
+        view = self.model.view()
+        total = len(view)
+        self.offset = max(0, min(self.offset, total - self._rows))
+        self._visible = view[self.offset:self.offset + self._rows]
+
+        rows = list(self.tree.get_children())
+        while len(rows) < len(self._visible):
+            rows.append(self.tree.insert('', END))
+        if len(rows) > len(self._visible):
+            self.tree.delete(*rows[len(self._visible):])
+            rows = rows[:len(self._visible)]
+
+        selection = []
+        for iid, item in zip(rows, self._visible):
+            self.tree.item(iid, values=item.row(), tags=(item.state,))
+            if item.path in self.selected:
+                selection.append(iid)
+        if tuple(selection) != self.tree.selection():
+            self.tree.selection_set(selection)
+
+        if total:
+            self.scrollbar.set(self.offset / total, (self.offset + len(self._visible)) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def item_at(self, y: int) -> Optional[JobItem]:
+        """鼠标所在行对应的文件"""
+        iid = self.tree.identify_row(y)
+        rows = self.tree.get_children()
+        if not iid or iid not in rows or rows.index(iid) >= len(self._visible):
+            return None
+        return self._visible[rows.index(iid)]
+
+    def has_running_visible(self) -> bool:
+        return any(item.state == 'running' for item in self._visible)
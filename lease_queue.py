@@ -0,0 +1,449 @@
+"""
+共享目录租约队列
+多台电脑各自运行 BaiduPicFilter，从共享输入目录中领取图片，结果写入共享输出目录，
+不需要中心服务器：协调状态全部是共享目录中的小文件
+
+    <输出目录>/.lease_queue/leases/<键>.lease   正在处理（节点ID + 心跳时间）
+    <输出目录>/.lease_queue/done/<键>.json      已完成（成功或多次失败后放弃）
+    <输出目录>/.lease_queue/failed/<键>.json    失败次数
+
+领取用独占创建（O_CREAT | O_EXCL）保证只有一个节点成功；处理期间定期刷新心跳，
+心跳超时的租约视为节点已失效，其他节点先把旧租约改名（只有一个节点能改名成功）再重新领取
+
+用法（每台电脑上各运行一个，单机多进程也可用于测试）：
+    python lease_queue.py //server/scans -o //server/output --node-id pc1
+    python lease_queue.py //server/scans -o //server/output --status
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import socket
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from document_input import collect_input_files
+
+
+STATE_DIR_NAME = ".lease_queue"
+
+
+class LeaseQueue:
+    """基于共享目录的租约队列（所有节点使用相同的输入目录和输出目录）"""
+
+    def __init__(self, input_dir: str, output_dir: str, node_id: Optional[str] = None,
+                 lease_seconds: float = 90.0, heartbeat_seconds: float = 15.0, max_attempts: int = 3):
+        """
+        Args:
+            input_dir: 共享输入目录
+            output_dir: 共享输出目录（协调状态保存在其中的 .lease_queue 文件夹）
+            node_id: 节点标识（默认 主机名-进程号）
+            lease_seconds: 心跳超过该时长未刷新的租约视为失效（需明显大于心跳间隔和节点间时钟偏差）
+            heartbeat_seconds: 心跳间隔
+            max_attempts: 同一图片最多尝试次数，超过后记为失败完成
+        """
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir)
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_attempts = max_attempts
+
+        state = self.output_dir / STATE_DIR_NAME
+        self.lease_dir = state / "leases"
+        self.done_dir = state / "done"
+        self.failed_dir = state / "failed"
+        for directory in (self.lease_dir, self.done_dir, self.failed_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        self.held: Dict[str, str] = {}  # 本节点持有的租约：键 -> 相对路径
+        self.stats = {'claimed': 0, 'stolen': 0, 'lost': 0, 'completed': 0, 'released': 0}
+
+    # ------------------------------------------------------------------ 任务
+
+    def _relative(self, path: str) -> str:
+        return Path(path).relative_to(self.input_dir).as_posix()
+
+    def key_for(self, rel_path: str) -> str:
+        """
+        图片的队列键：相对路径 + 大小 + 修改时间（秒）
+
+        使用相对路径，不同电脑挂载共享目录的位置不同也能得到相同的键；
+        文件内容被替换后键随之变化，会被重新处理
+        """
+        stat = (self.input_dir / rel_path).stat()
+        raw = f"{rel_path}|{stat.st_size}|{int(stat.st_mtime)}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+    def scan(self) -> List[tuple]:
+        """列出输入目录中的所有图片，返回 [(键, 相对路径)]"""
+        items = []
+        for path in collect_input_files([str(self.input_dir)]):
+            rel = self._relative(path)
+            try:
+                items.append((self.key_for(rel), rel))
+            except OSError:
+                continue  # 扫描后被删除
+        return items
+
+    def is_done(self, key: str) -> bool:
+        return (self.done_dir / f"{key}.json").exists()
+
+    # ------------------------------------------------------------------ 租约
+
+    def _lease_path(self, key: str) -> Path:
+        return self.lease_dir / f"{key}.lease"
+
+    def _read_lease(self, key: str) -> Optional[dict]:
+        return self._read_lease_file(self._lease_path(key))
+
+    @staticmethod
+    def _read_lease_file(path: Path) -> Optional[dict]:
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # 刚创建还没写完内容：按文件修改时间估计心跳
+            try:
+                return {'node': None, 'heartbeat': path.stat().st_mtime}
+            except OSError:
+                return None
+
+    def _lease_body(self, rel_path: str) -> str:
+        return json.dumps({'node': self.node_id, 'path': rel_path, 'heartbeat': time.time()},
+                          ensure_ascii=False)
+
+    def _is_expired(self, lease: dict) -> bool:
+        return time.time() - lease.get('heartbeat', 0) > self.lease_seconds
+
+    def try_claim(self, key: str, rel_path: str) -> bool:
+        """尝试领取一张图片；租约已失效时接管"""
+        if key in self.held or self.is_done(key):
+            return False
+
+        lease_path = self._lease_path(key)
+        stolen = False
+        lease = self._read_lease(key)
+        if lease is not None:
+            if not self._is_expired(lease):
+                return False
+            # 先把失效租约改名：改名是原子的，多个节点同时接管时只有一个成功
+            stale = lease_path.with_name(f"{lease_path.name}.stale-{self.node_id}-{random.randrange(1 << 30)}")
+            try:
+                os.rename(lease_path, stale)
+            except OSError:
+                return False
+            # 读取和改名之间原节点可能刷新了心跳，或另一个节点已接管并写入了新租约：
+            # 改名拿到的不是刚才判定失效的那份租约时原样放回
+            taken = self._read_lease_file(stale)
+            if (taken is None or not self._is_expired(taken)
+                    or (taken.get('node'), taken.get('heartbeat')) != (lease.get('node'), lease.get('heartbeat'))):
+                self._restore_lease(stale, lease_path)
+                return False
+            os.remove(stale)
+            stolen = True
+
+        try:
+            fd = os.open(str(lease_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(self._lease_body(rel_path))
+
+        # 领取期间另一个节点可能刚好完成并删除了租约
+        if self.is_done(key):
+            self._remove_lease(key)
+            return False
+
+        self.held[key] = rel_path
+        self.stats['claimed'] += 1
+        if stolen:
+            self.stats['stolen'] += 1
+            print(f"   ↩️  接管失效租约: {rel_path}（原节点 {lease.get('node') or '未知'}）")
+        return True
+
+    @staticmethod
+    def _restore_lease(stale: Path, lease_path: Path):
+        """把误改名的租约放回原处（原处已有新租约时以新租约为准）"""
+        try:
+            body = stale.read_bytes()
+            fd = os.open(str(lease_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+        except OSError:
+            pass
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+
+    def _owns(self, key: str) -> bool:
+        lease = self._read_lease(key)
+        return lease is not None and lease.get('node') == self.node_id
+
+    def renew_all(self):
+        """刷新本节点持有的所有租约的心跳；已被其他节点接管的租约不再刷新"""
+        for key, rel_path in list(self.held.items()):
+            if not self._owns(key):
+                self._lose(key, rel_path)
+                continue
+            tmp = self._lease_path(key).with_name(f"{key}.lease.tmp-{self.node_id}")
+            tmp.write_text(self._lease_body(rel_path), encoding='utf-8')
+            # 写临时文件期间（网络共享盘上可能较慢）租约可能已被接管：替换前再确认一次，
+            # 不覆盖其他节点刚写入的租约
+            if key not in self.held or not self._owns(key):
+                os.remove(tmp)
+                if key in self.held:
+                    self._lose(key, rel_path)
+                continue
+            os.replace(tmp, self._lease_path(key))
+
+    def _lose(self, key: str, rel_path: str):
+        print(f"   ⚠️  租约已被接管: {rel_path}（心跳中断过久？）")
+        self.held.pop(key, None)
+        self.stats['lost'] += 1
+
+    def _remove_lease(self, key: str):
+        if self._owns(key):
+            try:
+                os.remove(self._lease_path(key))
+            except OSError:
+                pass
+
+    def complete(self, key: str, rel_path: str, success: bool, output: Optional[str] = None):
+        """
+        记录处理结果：成功或失败次数用尽时写完成标记，否则释放租约让其他节点重试
+
+        文件都在共享目录中，在事件循环中调用时应放到线程中执行
+        """
+        self.held.pop(key, None)
+        attempts = 1
+        failed_path = self.failed_dir / f"{key}.json"
+        if not success:
+            try:
+                attempts = json.loads(failed_path.read_text(encoding='utf-8')).get('attempts', 0) + 1
+            except (OSError, ValueError):
+                attempts = 1
+            failed_path.write_text(json.dumps({'path': rel_path, 'attempts': attempts,
+                                               'node': self.node_id}, ensure_ascii=False), encoding='utf-8')
+
+        if success or attempts >= self.max_attempts:
+            done_path = self.done_dir / f"{key}.json"
+            tmp = done_path.with_name(f"{key}.json.tmp-{self.node_id}")
+            tmp.write_text(json.dumps({
+                'path': rel_path, 'success': success, 'output': output, 'node': self.node_id,
+                'attempts': attempts, 'finished': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }, ensure_ascii=False), encoding='utf-8')
+            os.replace(tmp, done_path)
+            self.stats['completed'] += 1
+        else:
+            self.stats['released'] += 1
+        self._remove_lease(key)
+
+    def release_all(self):
+        """释放本节点持有的所有租约（正常退出时调用，其他节点无需等待超时）"""
+        for key in list(self.held):
+            self.held.pop(key)
+            self._remove_lease(key)
+
+    def status(self) -> dict:
+        """队列整体进度（所有节点）"""
+        items = self.scan()
+        summary = {'total': len(items), 'done': 0, 'failed': 0, 'leased': 0, 'expired': 0, 'pending': 0,
+                   'nodes': {}}
+        for key, _ in items:
+            done_path = self.done_dir / f"{key}.json"
+            if done_path.exists():
+                try:
+                    record = json.loads(done_path.read_text(encoding='utf-8'))
+                except (OSError, ValueError):
+                    record = {'success': True}
+                summary['done'] += 1
+                if not record.get('success'):
+                    summary['failed'] += 1
+                continue
+            lease = self._read_lease(key)
+            if lease is None:
+                summary['pending'] += 1
+            elif self._is_expired(lease):
+                summary['expired'] += 1
+            else:
+                summary['leased'] += 1
+                node = lease.get('node') or '未知'
+                summary['nodes'][node] = summary['nodes'].get(node, 0) + 1
+        return summary
+
+
+class LeaseNode:
+    """一个处理节点：在本机的多个工作页上从租约队列领取图片"""
+
+    def __init__(self, client, lease_queue: LeaseQueue, concurrency: Optional[int] = None,
+                 rescan_seconds: float = 10.0, follow: bool = False):
+        """
+        Args:
+            client: 已启动并登录的 BaiduPicFilter
+            lease_queue: 租约队列
+            concurrency: 并行页数（默认使用 client.concurrency）
+            rescan_seconds: 没有可领取的图片时重新扫描的间隔
+            follow: 队列清空后是否继续等待新图片
+        """
+        self.client = client
+        self.queue = lease_queue
+        # 共享输出目录：每个节点写自己的结果清单（不使用 WAL）
+        client.manifest_node = lease_queue.node_id
+        self.concurrency = max(1, concurrency or client.concurrency)
+        self.rescan_seconds = rescan_seconds
+        self.follow = follow
+        self.results: List[dict] = []
+        self._items: List[tuple] = []  # 本轮扫描中尚未尝试的图片
+        self._busy = 0  # 本轮扫描中被其他节点持有的图片数
+        self._round_claims = 0  # 本轮扫描中领取的图片数
+        self._claim_lock = asyncio.Lock()
+
+    def _claim_from_items(self) -> Optional[tuple]:
+        """依次尝试领取候选图片，跳过已完成的，记下被其他节点持有的"""
+        while self._items:
+            key, rel_path = self._items.pop()
+            if key in self.queue.held or self.queue.is_done(key):
+                continue
+            if self.queue.try_claim(key, rel_path):
+                self._round_claims += 1
+                return key, rel_path
+            self._busy += 1
+        return None
+
+    async def _claim_next(self) -> Optional[tuple]:
+        """领取下一张图片；队列已全部完成时返回 None"""
+        loop = asyncio.get_event_loop()
+        while True:
+            async with self._claim_lock:
+                if not self._items:
+                    self._items = await loop.run_in_executor(None, self.queue.scan)
+                    # 各节点打乱顺序，减少同时争抢同一个文件
+                    random.shuffle(self._items)
+                    self._busy = 0
+                    self._round_claims = 0
+
+                # 文件操作可能落在网络共享盘上，放到线程中执行，不阻塞其他页面
+                claimed = await loop.run_in_executor(None, self._claim_from_items)
+                if claimed is not None:
+                    return claimed
+                if not self._busy:
+                    if self._round_claims:
+                        continue  # 本轮领取过图片，立即重新扫描（失败释放的图片需要重试）
+                    if not self.follow:
+                        return None  # 完整一轮扫描没有可领取的图片：全部完成
+            # 剩余图片都被其他节点持有：等待它们完成，或租约过期后接管
+            await asyncio.sleep(self.rescan_seconds)
+
+    async def _slot_loop(self, worker):
+        """一个页面的工作循环：领取 → 处理 → 写完成标记"""
+        while True:
+            claimed = await self._claim_next()
+            if claimed is None:
+                return
+            key, rel_path = claimed
+
+            # 输出目录镜像输入目录结构，所有节点写入同一棵共享输出树
+            worker.output_dir = self.queue.output_dir / Path(rel_path).parent
+            worker.output_dir.mkdir(parents=True, exist_ok=True)
+            worker.last_output_path = None
+
+            started = time.monotonic()
+            index = len(self.results) + 1
+            try:
+                success = await worker.process_image(str(self.queue.input_dir / rel_path), index, index)
+            except Exception as e:
+                print(f"❌ 处理出错: {e}")
+                success = False
+            output = str(worker.last_output_path) if success and worker.last_output_path else None
+            # 完成标记和租约都在共享目录中，放到线程中写入，不阻塞其他页面
+            await asyncio.get_event_loop().run_in_executor(
+                None, self.queue.complete, key, rel_path, success, output
+            )
+            self.results.append({'path': rel_path, 'success': success, 'output': output,
+                                 'elapsed': time.monotonic() - started})
+
+    async def _heartbeat_loop(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.queue.heartbeat_seconds)
+            try:
+                await loop.run_in_executor(None, self.queue.renew_all)
+            except OSError as e:
+                print(f"⚠️  心跳写入失败: {e}")
+
+    async def run(self) -> dict:
+        """处理直到队列全部完成（follow 模式下一直运行）"""
+        print(f"🛰️  节点 {self.queue.node_id} 开始领取任务（{self.concurrency} 个页面）")
+        workers = await self.client._ensure_workers(self.concurrency)
+        heartbeat = asyncio.ensure_future(self._heartbeat_loop())
+        slots = [asyncio.ensure_future(self._slot_loop(w)) for w in workers]
+        try:
+            await asyncio.gather(*slots)
+        finally:
+            for task in slots + [heartbeat]:
+                task.cancel()
+            await asyncio.gather(*slots, heartbeat, return_exceptions=True)
+            await asyncio.get_event_loop().run_in_executor(None, self.queue.release_all)
+            await self.client.flush_outputs()
+
+        success = sum(1 for r in self.results if r['success'])
+        return dict(self.queue.stats, success=success, failed=len(self.results) - success)
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="多台电脑通过共享目录协同批量去手写")
+    parser.add_argument('input', help="共享输入目录")
+    parser.add_argument('-o', '--output', required=True, help="共享输出目录")
+    parser.add_argument('--node-id', help="节点标识（默认 主机名-进程号）")
+    parser.add_argument('--concurrency', type=int, default=2, help="本节点的并行页数")
+    parser.add_argument('--lease', type=float, default=90.0, help="租约超时（秒）")
+    parser.add_argument('--heartbeat', type=float, default=15.0, help="心跳间隔（秒）")
+    parser.add_argument('--follow', action='store_true', help="队列清空后继续等待新图片")
+    parser.add_argument('--cookie-file', default="baidu_cookies.json", help="账号Cookie文件")
+    parser.add_argument('--show-browser', action='store_true', help="显示浏览器窗口")
+    parser.add_argument('--status', action='store_true', help="只显示队列进度")
+    args = parser.parse_args()
+
+    lease_queue = LeaseQueue(args.input, args.output, node_id=args.node_id,
+                             lease_seconds=args.lease, heartbeat_seconds=args.heartbeat)
+    if args.status:
+        status = lease_queue.status()
+        print(f"📊 总数: {status['total']}  已完成: {status['done']}（失败 {status['failed']}）  "
+              f"处理中: {status['leased']}  租约过期: {status['expired']}  待处理: {status['pending']}")
+        for node, count in sorted(status['nodes'].items()):
+            print(f"   🛰️  {node}: {count} 张处理中")
+        return
+
+    from baidu_automation import BaiduPicFilter
+
+    async def run():
+        client = BaiduPicFilter(headless=not args.show_browser, output_dir=args.output,
+                                concurrency=args.concurrency, cookie_file=args.cookie_file)
+        try:
+            await client.start()
+            await client.ensure_login()
+            return await LeaseNode(client, lease_queue, follow=args.follow).run()
+        finally:
+            await client.close()
+
+    try:
+        stats = asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n⏹️  已停止（持有的租约已释放）")
+        return
+    print(f"\n{'='*60}")
+    print(f"📊 节点 {lease_queue.node_id}: ✅ 成功 {stats['success']}  ❌ 失败 {stats['failed']}  "
+          f"接管 {stats['stolen']}  丢失 {stats['lost']}")
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
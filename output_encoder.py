@@ -0,0 +1,149 @@
+"""
+输出编码
+对处理结果做格式转换、质量控制、灰度/黑白转换和尺寸/体积限制
+
+encode_and_save 是纯 CPU 工作，设计为在进程池中运行（参数和返回值均可 pickle）
+"""
+from io import BytesIO
+from pathlib import Path
+from typing import Optional, Tuple
+
+from PIL import Image
+
+
+# data URL 的 MIME 类型到文件后缀
+MIME_SUFFIXES = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/bmp': '.bmp',
+}
+
+FORMAT_SUFFIXES = {
+    'jpeg': '.jpg',
+    'webp': '.webp',
+    'png': '.png',
+}
+
+
+class OutputOptions:
+    """输出编码选项"""
+
+    def __init__(self, format: Optional[str] = None, quality: int = 85, color: str = 'color',
+                 max_side: Optional[int] = None, max_bytes: Optional[int] = None,
+                 bilevel_threshold: int = 160):
+        """
+        Args:
+            format: 输出格式 'jpeg' / 'webp' / 'png'，None 表示保持服务端返回的格式
+            quality: JPEG/WebP 质量（1-100）
+            color: 'color' 彩色 / 'gray' 灰度 / 'bilevel' 黑白二值（适合打印）
+            max_side: 最长边上限（像素），超过则等比缩小
+            max_bytes: 单个文件体积上限（字节），有损格式会逐步降低质量和尺寸
+            bilevel_threshold: 黑白二值化阈值（0-255）
+        """
+        if format is not None and format not in FORMAT_SUFFIXES:
+            raise ValueError(f"不支持的输出格式: {format}")
+        if color not in ('color', 'gray', 'bilevel'):
+            raise ValueError(f"不支持的颜色模式: {color}")
+        self.format = format
+        self.quality = max(1, min(100, quality))
+        self.color = color
+        self.max_side = max_side
+        self.max_bytes = max_bytes
+        self.bilevel_threshold = bilevel_threshold
+
+    @property
+    def is_passthrough(self) -> bool:
+        """是否无需重新编码（直接写入服务端返回的字节）"""
+        return self.format is None and self.color == 'color' and not self.max_side and not self.max_bytes
+
+
+def suffix_for_mime(mime: str, default: str = '.jpg') -> str:
+    """根据 MIME 类型返回文件后缀"""
+    return MIME_SUFFIXES.get(mime.lower(), default)
+
+
+def target_format(options: OutputOptions, source_format: str = 'jpeg') -> str:
+    """实际输出格式：未指定时沿用服务端返回的格式"""
+    return options.format or (source_format if source_format in FORMAT_SUFFIXES else 'jpeg')
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    buffer = BytesIO()
+    if fmt == 'jpeg':
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('L' if img.mode == '1' else 'RGB')
+        img.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    elif fmt == 'webp':
+        if img.mode == '1':
+            img = img.convert('L')
+        img.save(buffer, 'WEBP', quality=quality, method=4)
+    else:
+        img.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def encode_image(data: bytes, options: OutputOptions, source_format: str = 'jpeg') -> Tuple[bytes, str]:
+    """
+    按选项重新编码图片
+
+    Args:
+        data: 服务端返回的图片字节
+        options: 输出编码选项
+        source_format: 保持原格式时使用的格式（'jpeg' / 'png' / 'webp'）
+
+    Returns:
+        (编码后的字节, 文件后缀)
+    """
+    fmt = target_format(options, source_format)
+
+    with Image.open(BytesIO(data)) as src:
+        img = src.convert('RGB') if src.mode not in ('RGB', 'L') else src.copy()
+
+    if options.color == 'gray':
+        img = img.convert('L')
+    elif options.color == 'bilevel':
+        threshold = options.bilevel_threshold
+        img = img.convert('L').point(lambda v: 255 if v >= threshold else 0, mode='1')
+
+    if options.max_side and max(img.size) > options.max_side:
+        img.thumbnail((options.max_side, options.max_side), Image.Resampling.LANCZOS)
+
+    quality = options.quality
+    encoded = _encode(img, fmt, quality)
+
+    # 体积上限：先降低质量，仍超出再逐步缩小尺寸
+    if options.max_bytes:
+        while len(encoded) > options.max_bytes:
+            if fmt != 'png' and quality > 40:
+                quality = max(40, quality - 10)
+            elif min(img.size) > 256:
+                img = img.resize((int(img.width * 0.85), int(img.height * 0.85)), Image.Resampling.LANCZOS)
+            else:
+                break
+            encoded = _encode(img, fmt, quality)
+
+    img.close()
+    return encoded, FORMAT_SUFFIXES[fmt]
+
+
+def encode_and_save(data: bytes, options: OutputOptions, output_stem: str, source_format: str = 'jpeg') -> str:
+    """
+    重新编码并写入文件
+
+    Args:
+        data: 服务端返回的图片字节
+        options: 输出编码选项
+        output_stem: 不含后缀的输出路径
+        source_format: 保持原格式时使用的格式
+
+    Returns:
+        str: 实际写入的文件路径
+    """
+    encoded, suffix = encode_image(data, options, source_format)
+    output_path = Path(output_stem + suffix)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(encoded)
+    return str(output_path)
@@ -0,0 +1,230 @@
+"""
+输出目录布局与结果清单
+批量处理上万张图片时，结果不再全部平铺在输出文件夹中：
+
+- mirror 模式按输入文件夹的层级在输出文件夹中建立相同的子文件夹，已创建的目录只记一次，不重复 mkdir
+- 单个输入文件夹的图片数超过阈值时，按文件名哈希前缀再分一层子文件夹，避免单个目录过大
+- 每张图片的源路径、内容哈希、输出路径、耗时和状态写入 SQLite 清单（带索引），
+  查找某张图片的结果是一次索引查询，不需要扫描输出文件夹；
+  计算哈希和写数据库都在清单自己的后台线程中进行，记录结果不阻塞事件循环
+- 多个进程或多台电脑共用一个输出文件夹（分片、租约队列）时，每个节点写自己的清单文件，
+  且不使用 WAL（WAL 依赖共享内存，不能用于网络文件系统）
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+MANIFEST_NAME = ".manifest.sqlite3"
+
+LAYOUT_MODES = ('flat', 'mirror')
+
+
+def manifest_name(node: Optional[str] = None) -> str:
+    """清单文件名；指定节点时每个节点一个文件（.manifest.<节点>.sqlite3）"""
+    if not node:
+        return MANIFEST_NAME
+    safe = re.sub(r'[^\w.-]', '_', node)
+    return f".manifest.{safe}.sqlite3"
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> Optional[str]:
+    """文件内容的 SHA-1（文件不可读时返回 None）"""
+    digest = hashlib.sha1()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+class OutputLayout:
+    """决定每张图片的结果写入哪个子文件夹"""
+
+    def __init__(self, mode: str = 'flat', shard_threshold: int = 2000, shard_width: int = 2):
+        """
+        Args:
+            mode: flat（全部写入输出文件夹）或 mirror（按输入文件夹层级建立子文件夹）
+            shard_threshold: 单个输入文件夹的图片数超过该值时按哈希前缀分子文件夹（0 表示不分）
+            shard_width: 哈希前缀的字符数（2 个十六进制字符即最多 256 个子文件夹）
+        """
+        if mode not in LAYOUT_MODES:
+            raise ValueError(f"未知的输出布局: {mode}")
+        self.mode = mode
+        self.shard_threshold = shard_threshold
+        self.shard_width = shard_width
+        self.roots: List[Path] = []
+        self._sharded: set = set()  # 需要分片的输入文件夹
+        self._created: set = set()  # 已确认存在的输出目录
+
+    def plan(self, image_paths: Iterable[str], roots: Optional[Iterable[str]] = None):
+        """
+        按本批图片确定镜像的根目录和需要分片的文件夹
+
+        Args:
+            image_paths: 本批图片路径
+            roots: 输入根目录（默认取所有图片所在文件夹的公共上级）
+        """
+        parents = Counter(str(Path(p).absolute().parent) for p in image_paths)
+        self._created = set()  # 两批之间输出目录可能被删除
+        if roots:
+            self.roots = sorted((Path(r).absolute() for r in roots), key=lambda r: len(r.parts), reverse=True)
+        elif parents:
+            try:
+                self.roots = [Path(os.path.commonpath(list(parents)))]
+            except ValueError:
+                # Windows 上不同盘符的文件没有公共上级
+                self.roots = []
+        if self.shard_threshold:
+            self._sharded = {folder for folder, count in parents.items() if count > self.shard_threshold}
+
+    def relative_dir(self, source_path: str) -> Path:
+        """源文件对应的输出子文件夹（相对输出文件夹）"""
+        relative = Path()
+        if self.mode == 'flat':
+            return relative
+        source = Path(source_path).absolute()
+        for root in self.roots:
+            try:
+                relative = source.parent.relative_to(root)
+                break
+            except ValueError:
+                continue
+        if str(source.parent) in self._sharded:
+            shard = hashlib.sha1(source.name.encode('utf-8')).hexdigest()[:self.shard_width]
+            relative = relative / shard
+        return relative
+
+    def directory_for(self, source_path: str, output_dir: Path) -> Path:
+        """源文件的输出目录（不存在时创建，同一目录只创建一次）"""
+        directory = output_dir / self.relative_dir(source_path)
+        if directory not in self._created:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._created.add(directory)
+        return directory
+
+
+class Manifest:
+    """结果清单：源文件 -> 输出文件、内容哈希、耗时和状态（SQLite，按源路径和哈希建索引）"""
+
+    def __init__(self, path: str, commit_every: int = 64, wal: bool = True):
+        """
+        Args:
+            path: 清单数据库文件
+            commit_every: 每记录多少条提交一次（关闭或查询时也会提交）
+            wal: 是否使用 WAL 日志（清单位于网络共享盘上时应关闭）
+        """
+        self.path = Path(path)
+        self.commit_every = max(1, commit_every)
+        self.wal = wal
+        self._uncommitted = 0
+        self._lock = threading.Lock()  # GUI 线程也可能查询
+        self._db: Optional[sqlite3.Connection] = None
+        # 单线程按提交顺序写入；打开数据库也在其中进行
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rhw-manifest")
+        self._writer.submit(self._open)
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        if self.wal:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        else:
+            self._db.execute("PRAGMA journal_mode=DELETE")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " source TEXT PRIMARY KEY, source_hash TEXT, output TEXT, status TEXT,"
+            " seconds REAL, error TEXT, updated REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_hash ON results (source_hash)")
+        self._db.commit()
+
+    def record(self, source: str, status: str, output: Optional[str] = None, seconds: Optional[float] = None,
+               error: Optional[str] = None, source_hash: Optional[str] = None):
+        """
+        记录（或覆盖）一张图片的处理结果
+
+        立即返回：读取文件计算哈希和写入数据库在后台线程中按顺序完成
+
+        Args:
+            source: 源文件路径
+            status: done / failed
+            output: 输出文件路径
+            seconds: 处理耗时
+            error: 失败原因
+            source_hash: 源文件内容哈希（默认读取文件计算）
+        """
+        self._writer.submit(self._write, str(Path(source).absolute()), status,
+                            str(output) if output else None, seconds, error, source_hash, time.time())
+
+    def _write(self, source: str, status: str, output: Optional[str], seconds: Optional[float],
+               error: Optional[str], source_hash: Optional[str], updated: float):
+        try:
+            if source_hash is None:
+                source_hash = file_digest(source)
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (source, source_hash, output, status, seconds, error, updated),
+                )
+                self._uncommitted += 1
+                if self._uncommitted >= self.commit_every:
+                    self._commit()
+        except Exception as e:
+            print(f"   ⚠️  写入结果清单失败: {e}")
+
+    def _commit(self):
+        if self._uncommitted:
+            self._db.commit()
+            self._uncommitted = 0
+
+    def _settle(self):
+        """等待已提交给后台线程的记录全部写入（查询前调用，保证查到刚记录的结果）"""
+        self._writer.submit(lambda: None).result()
+
+    def flush(self):
+        """等待后台写入完成并提交（会阻塞，在事件循环中调用时应放到线程中执行）"""
+        self._settle()
+        with self._lock:
+            self._commit()
+
+    @staticmethod
+    def _row(row) -> dict:
+        keys = ('source', 'source_hash', 'output', 'status', 'seconds', 'error', 'updated')
+        return dict(zip(keys, row))
+
+    def lookup(self, source: str) -> Optional[dict]:
+        """按源文件路径查找结果记录"""
+        self._settle()
+        with self._lock:
+            self._commit()
+            row = self._db.execute(
+                "SELECT * FROM results WHERE source = ?", (str(Path(source).absolute()),)
+            ).fetchone()
+        return self._row(row) if row else None
+
+    def lookup_hash(self, source_hash: str) -> List[dict]:
+        """按源文件内容哈希查找结果记录（文件被移动或改名后仍能找到）"""
+        self._settle()
+        with self._lock:
+            self._commit()
+            rows = self._db.execute(
+                "SELECT * FROM results WHERE source_hash = ? ORDER BY updated DESC", (source_hash,)
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        with self._lock:
+            if self._db is not None:
+                self._commit()
+                self._db.close()
@@ -0,0 +1,142 @@
+"""
+页面状态探针与驱动往返计数
+把登录状态、上传控件、处理进度、结果和错误提示的检查合并为页面内的一个函数，
+每次检查只需一次 evaluate；探针通过 add_init_script 每个页面安装一次，之后的导航自动生效
+（执行环境与初始化脚本隔离时，每个文档首次调用前补装一次）
+
+CountingPage 包装 Playwright 页面，统计每个客户端发出的驱动调用（往返）次数
+"""
+import inspect
+import time
+from typing import Callable, Optional
+
+
+PROBE_SCRIPT = r'''
+(() => {
+    const visible = (el) => {
+        if (!el || !el.getClientRects().length) return false;
+        const style = getComputedStyle(el);
+        return style.visibility !== 'hidden' && style.display !== 'none';
+    };
+    // 与 Playwright 的 text=/.../ 选择器类似：返回包含该文本的可见元素（逐个文本节点匹配）
+    const findText = (re) => {
+        const root = document.body || document.documentElement;
+        if (!root) return null;
+        const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT);
+        for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+            if (re.test(node.data) && visible(node.parentElement)) return node.parentElement;
+        }
+        return null;
+    };
+
+    window.__rhwProbe = (baseUrl) => {
+        const href = location.href;
+        const onLoginPage = href.includes('passport.baidu.com') || href.toLowerCase().includes('login');
+        const loginVisible = !!findText(/登录|登入/i);
+        const uploadVisible = !!findText(/上传图片|选择本地图片/i);
+
+        const fileInput = document.querySelector('input[type="file"][accept*="image"]');
+        const loginMask = document.querySelector('.aiTools-upload-file__login-check');
+        const uploadButton = document.querySelector('button.aiTools-upload-local__button');
+        const uploadTargets = [];
+        if (fileInput) uploadTargets.push('input');
+        if (loginMask) uploadTargets.push('mask');
+        if (uploadButton) uploadTargets.push('button');
+        if (findText(/选择本地图片|选择|上传/i)) uploadTargets.push('text');
+
+        const img = document.querySelector('img#resultImg');
+        const hasResult = !!(img && img.src && img.offsetParent !== null);
+
+        const bodyText = document.body ? document.body.innerText : '';
+        const resultReady = !!findText(/下载|download/i) || bodyText.includes('处理完成') || bodyText.includes('下载');
+        let errorText = null;
+        const errorAt = bodyText.search(/失败|错误/);
+        if (!resultReady && errorAt >= 0) {
+            errorText = bodyText.slice(Math.max(0, errorAt - 20), errorAt + 20).replace(/\s+/g, ' ').trim();
+        }
+
+        return {
+            loggedIn: !onLoginPage && !loginVisible && (uploadVisible || href.includes(baseUrl)),
+            onLoginPage,
+            uploadReady: !!(fileInput || loginMask || uploadButton),
+            uploadVia: uploadTargets[0] || null,
+            uploadTargets,
+            hasResult,
+            processing: !resultReady && !errorText && /处理中|正在处理|识别中|生成中/.test(bodyText),
+            resultReady,
+            errorText,
+        };
+    };
+})()
+'''
+
+# 调用已安装的探针；当前文档还没有探针时返回 null（由调用方安装后重试）
+PROBE_CALL = "(baseUrl) => window.__rhwProbe ? window.__rhwProbe(baseUrl) : null"
+
+
+class RoundTripCounter:
+    """驱动往返计数（设置 listener 后每次调用还会回报方法名、耗时和异常，用于诊断）"""
+
+    def __init__(self):
+        self.count = 0
+        self.listener: Optional[Callable[[str, float, Optional[BaseException]], None]] = None
+
+
+def _unwrap(value):
+    return value._target if isinstance(value, _CountingProxy) else value
+
+
+class _CountingProxy:
+    """透明代理：每个异步方法调用计一次往返，返回的元素句柄同样被包装"""
+
+    def __init__(self, target, counter: RoundTripCounter):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_counter', counter)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+        counter = self._counter
+
+        async def call(*args, **kwargs):
+            counter.count += 1
+            listener = counter.listener
+            started = time.perf_counter() if listener is not None else 0.0
+            try:
+                result = await attr(*[_unwrap(a) for a in args], **{k: _unwrap(v) for k, v in kwargs.items()})
+            except Exception as e:
+                if listener is not None:
+                    listener(name, time.perf_counter() - started, e)
+                raise
+            if listener is not None:
+                listener(name, time.perf_counter() - started, None)
+            if result is not None and type(result).__name__ in ('ElementHandle', 'JSHandle'):
+                return _CountingProxy(result, counter)
+            return result
+
+        return call
+
+    def __bool__(self):
+        return True
+
+
+class CountingPage(_CountingProxy):
+    """带往返计数的页面（记录探针是否已安装、缓存的上传控件句柄）"""
+
+    def __init__(self, page, counter: RoundTripCounter):
+        super().__init__(page, counter)
+        object.__setattr__(self, 'probe_installed', False)
+        object.__setattr__(self, 'upload_handles', None)
+
+
+def unwrap_page(page):
+    """取出被包装的原始页面（传给不经过计数代理的 API，例如 new_cdp_session）"""
+    return _unwrap(page)
+
+
+def wrap_page(page, counter: RoundTripCounter) -> Optional[CountingPage]:
+    """包装页面；已包装或为 None 时原样返回"""
+    if page is None or isinstance(page, CountingPage):
+        return page
+    return CountingPage(page, counter)
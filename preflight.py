@@ -0,0 +1,214 @@
+"""
+输入预检
+上传前检查文件：空文件、文件不完整（被截断）、无法识别的格式、尺寸过小/过大、体积超限。
+只读取文件头和文件末尾（Pillow 懒加载），坏文件在毫秒级被拒绝，不再经过上传重试和浏览器重启；
+能修正的问题（格式转换、EXIF 方向、CMYK 等色彩模式、尺寸/体积超限）生成修正后的副本继续处理
+
+check_image 的参数和返回值均可 pickle，可在线程池或进程池中运行
+"""
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+import document_input
+
+
+class PreflightLimits:
+    """预检限制"""
+
+    def __init__(self, max_bytes: int = 10 * 1024 * 1024, max_side: int = 8192, min_side: int = 32,
+                 formats: tuple = ('JPEG', 'PNG', 'WEBP'), tile_max_side: Optional[int] = None,
+                 tile_max_pixels: Optional[int] = None):
+        """
+        Args:
+            max_bytes: 单个文件体积上限（字节），超过时重新编码为 JPEG
+            max_side: 最长边上限（像素），超过时等比缩小
+            min_side: 最短边下限（像素），低于该值直接拒绝
+            formats: 可直接上传的格式，其他可读格式转换为 PNG/JPEG
+            tile_max_side: 启用分块处理时的分块阈值（超过阈值的图片会被切块，不受尺寸/体积上限限制）
+            tile_max_pixels: 启用分块处理时的像素数阈值
+        """
+        self.max_bytes = max_bytes
+        self.max_side = max_side
+        self.min_side = min_side
+        self.formats = formats
+        self.tile_max_side = tile_max_side
+        self.tile_max_pixels = tile_max_pixels
+
+
+# 可以直接上传的色彩模式（其他模式如 CMYK、16 位灰度先转换）
+_UPLOAD_MODES = ('1', 'L', 'LA', 'P', 'RGB', 'RGBA')
+
+
+def _truncated(path: Path, fmt: str) -> bool:
+    """
+    检查文件是否缺少结束标记（JPEG 的 EOI、PNG 的 IEND）
+
+    先看最后 1KB；结束标记之后还附带了较长数据（动态照片的视频、厂商尾部信息）时，
+    再按段/块结构从头找到真正的结束标记
+    """
+    if fmt not in ('JPEG', 'PNG'):
+        return False
+    with open(path, 'rb') as f:
+        f.seek(max(0, path.stat().st_size - 1024))
+        tail = f.read()
+        if (b'\xff\xd9' if fmt == 'JPEG' else b'IEND') in tail:
+            return False
+        f.seek(0)
+        return not (_jpeg_has_eoi(f) if fmt == 'JPEG' else _png_has_iend(f))
+
+
+def _jpeg_has_eoi(f) -> bool:
+    """按 JPEG 段结构查找图像数据之后的 EOI（跳过段内容，扫描数据中的 FF00 填充和 RST 标记）"""
+    data = f.read()
+    pos = 2  # SOI 之后
+    while pos + 1 < len(data):
+        if data[pos] != 0xFF:
+            return False
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1  # 填充字节
+            continue
+        if marker == 0xD9:
+            return True
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            pos += 2
+            continue
+        if pos + 3 >= len(data):
+            return False
+        pos += 2 + int.from_bytes(data[pos + 2:pos + 4], 'big')
+        if marker != 0xDA:
+            continue
+        # 扫描数据：下一个不是 FF00 / RST 的 FFxx 即下一个标记
+        while True:
+            pos = data.find(b'\xff', pos)
+            if pos < 0 or pos + 1 >= len(data):
+                return False
+            following = data[pos + 1]
+            if following == 0x00 or 0xD0 <= following <= 0xD7 or following == 0xFF:
+                pos += 1 if following == 0xFF else 2
+                continue
+            break
+    return False
+
+
+def _png_has_iend(f) -> bool:
+    """按 PNG 块结构逐块跳到 IEND（只读块头）"""
+    f.seek(8)  # 文件签名
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return False
+        if header[4:8] == b'IEND':
+            return True
+        f.seek(int.from_bytes(header[:4], 'big') + 4, 1)  # 块数据 + CRC
+
+
+def _fixed_path(path: Path, fix_dir: str, suffix: str) -> Path:
+    # 每个源文件一个子目录，保持原文件名（输出文件按原文件名命名）
+    digest = hashlib.sha1(str(path.resolve()).encode('utf-8')).hexdigest()[:12]
+    target = Path(fix_dir) / digest / f"{path.stem}{suffix}"
+    target.parent.mkdir(parents=True, exist_ok=True)
+    return target
+
+
+def check_image(path: str, limits: PreflightLimits, fix_dir: str) -> dict:
+    """
+    检查一个输入文件
+
+    Args:
+        path: 文件路径
+        limits: 预检限制
+        fix_dir: 修正后的副本保存目录
+
+    Returns:
+        dict: status 为 'ok' / 'fixed' / 'rejected'；path 为实际要处理的文件；
+              reason 为拒绝原因；fixes 为做过的修正
+    """
+    source = Path(path)
+    result = {'source': str(path), 'path': str(path), 'status': 'ok', 'reason': None, 'fixes': []}
+
+    def reject(reason: str) -> dict:
+        result.update(status='rejected', reason=reason, path=None)
+        return result
+
+    try:
+        size = source.stat().st_size
+    except OSError as e:
+        return reject(f"无法读取文件: {e.strerror or e}")
+    if size == 0:
+        return reject("空文件（0 字节）")
+    if document_input.is_document(source):
+        # 多页文档逐页栅格化后再处理，这里只检查文件存在且非空
+        return result
+
+    try:
+        with Image.open(source) as img:
+            fmt = img.format
+            width, height = img.size
+            mode = img.mode
+            orientation = img.getexif().get(0x0112, 1) if fmt in ('JPEG', 'WEBP', 'PNG') else 1
+    except Exception as e:
+        return reject(f"无法识别的图片: {e}")
+
+    if _truncated(source, fmt):
+        return reject("文件不完整（可能未保存或传输完）")
+    if min(width, height) < limits.min_side:
+        return reject(f"尺寸过小（{width}×{height}）")
+
+    tiled = (
+        (limits.tile_max_side is not None and max(width, height) > limits.tile_max_side)
+        or (limits.tile_max_pixels is not None and width * height > limits.tile_max_pixels)
+    )
+
+    fixes = []
+    if fmt not in limits.formats:
+        fixes.append(f"{fmt} 转换格式")
+    if orientation not in (None, 1):
+        fixes.append("按 EXIF 方向旋转")
+    if mode not in _UPLOAD_MODES:
+        fixes.append(f"{mode} 转换为 RGB")
+    if not tiled and max(width, height) > limits.max_side:
+        fixes.append(f"最长边 {max(width, height)} 缩小到 {limits.max_side}")
+    if not tiled and size > limits.max_bytes:
+        fixes.append(f"体积 {size / 1024 / 1024:.1f}MB 重新压缩")
+    if not fixes:
+        return result
+
+    try:
+        with Image.open(source) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in _UPLOAD_MODES:
+                img = img.convert('RGB')
+            if not tiled and max(img.size) > limits.max_side:
+                img.thumbnail((limits.max_side, limits.max_side), Image.Resampling.LANCZOS)
+
+            # 有透明通道或原本是 PNG 时输出 PNG，其余输出 JPEG
+            lossless = fmt == 'PNG' or img.mode in ('RGBA', 'LA', 'P', '1')
+            if lossless and (tiled or size <= limits.max_bytes):
+                target = _fixed_path(source, fix_dir, '.png')
+                img.save(target, format='PNG', optimize=True)
+            else:
+                target = _fixed_path(source, fix_dir, '.jpg')
+                img = img.convert('RGB') if img.mode != 'L' else img
+                quality = 92
+                encoded_size = img.size
+                img.save(target, format='JPEG', quality=quality)
+                # 先降低质量，质量降到 68 仍超限时逐步缩小尺寸
+                while not tiled and target.stat().st_size > limits.max_bytes:
+                    if quality > 68:
+                        quality -= 8
+                    elif min(img.size) * 0.8 >= limits.min_side:
+                        img = img.resize((int(img.width * 0.8), int(img.height * 0.8)), Image.Resampling.LANCZOS)
+                    else:
+                        return reject(f"体积过大（{size / 1024 / 1024:.1f}MB），压缩后仍超过上限")
+                    img.save(target, format='JPEG', quality=quality)
+                if img.size != encoded_size:
+                    fixes.append(f"缩小到 {img.width}×{img.height}")
+    except Exception as e:
+        return reject(f"修正失败（{'、'.join(fixes)}）: {e}")
+
+    result.update(status='fixed', path=str(target), fixes=fixes)
+    return result
@@ -0,0 +1,310 @@
+"""
+处理前后对比预览
+在程序内左右对照查看原图和结果，不必逐个打开输出文件夹中的文件：
+
+- 缩略图在后台线程池中按需生成，内存中按 LRU 限制总字节数，可选写入磁盘缓存（下次打开直接读取）
+- 翻页时先显示缩略图，停止翻页后才解码屏幕尺寸的图片；JPEG 用 draft 在解码阶段直接缩小，
+  不会把整张大图读入内存
+- 预取前后几张的缩略图，翻页离开后尚未开始的生成任务会被取消
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import tkinter as tk
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+from PIL import Image, ImageOps, ImageTk
+
+
+def decode_reduced(path: str, max_side: int) -> Image.Image:
+    """
+    按目标尺寸解码图片
+
+    JPEG 通过 draft 直接以 1/2、1/4、1/8 的尺寸解码，其他格式解码后缩小；同时按 EXIF 方向旋转
+    """
+    with Image.open(path) as img:
+        img.draft('RGB', (max_side, max_side))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_side, max_side))
+        return img.convert('RGB')
+
+
+class ImageCache:
+    """缩小后的图片缓存：后台线程池生成，内存中按 LRU 限制总字节数，可选磁盘缓存"""
+
+    def __init__(self, max_side: int = 256, max_bytes: int = 64 * 1024 * 1024,
+                 disk_dir: Optional[str] = None, workers: int = 2):
+        """
+        Args:
+            max_side: 缓存图片的最长边（像素）
+            max_bytes: 内存中缓存图片的总字节数上限（按解码后的像素计算）
+            disk_dir: 磁盘缓存目录（None 表示只缓存在内存中）
+            workers: 生成图片的线程数
+        """
+        self.max_side = max_side
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._images: 'OrderedDict[tuple, Image.Image]' = OrderedDict()
+        self._bytes = 0
+        self._pending: Dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rhw-preview")
+
+    @staticmethod
+    def _key(path: str) -> Optional[tuple]:
+        # 文件被覆盖后修改时间或大小变化，缓存自动失效
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (str(path), stat.st_mtime_ns, stat.st_size)
+
+    def _disk_path(self, key: tuple) -> Optional[Path]:
+        if self.disk_dir is None:
+            return None
+        digest = hashlib.sha1(f"{key}|{self.max_side}".encode('utf-8')).hexdigest()
+        return self.disk_dir / digest[:2] / f"{digest}.jpg"
+
+    def get(self, path: str) -> Optional[Image.Image]:
+        """只查内存缓存"""
+        key = self._key(path)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+            return image
+
+    def request(self, path: str, callback: Optional[Callable[[str, Optional[Image.Image]], None]] = None
+                ) -> Optional[Image.Image]:
+        """
+        取缩小后的图片：已缓存时直接返回；否则提交后台生成并返回 None
+
+        Args:
+            path: 图片路径
+            callback: 生成完成后以 callback(path, image) 调用（在工作线程中执行，无法解码时 image 为 None）
+        """
+        key = self._key(path)
+        if key is None:
+            return None
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image
+            future = self._pending.get(key)
+            if future is None:
+                self.misses += 1
+                future = self._pending[key] = self._pool.submit(self._load, key)
+        if callback is not None:
+            future.add_done_callback(
+                lambda f: None if f.cancelled() else callback(path, None if f.exception() else f.result())
+            )
+        return None
+
+    def _load(self, key: tuple) -> Image.Image:
+        try:
+            image = None
+            disk_path = self._disk_path(key)
+            if disk_path is not None and disk_path.exists():
+                try:
+                    with Image.open(disk_path) as cached:
+                        image = cached.convert('RGB')
+                    self.disk_hits += 1
+                except Exception:
+                    image = None
+            if image is None:
+                image = decode_reduced(key[0], self.max_side)
+                if disk_path is not None:
+                    try:
+                        disk_path.parent.mkdir(parents=True, exist_ok=True)
+                        image.save(disk_path, format='JPEG', quality=85)
+                    except OSError:
+                        pass
+            with self._lock:
+                self._store(key, image)
+            return image
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _store(self, key: tuple, image: Image.Image):
+        size = image.width * image.height * len(image.getbands())
+        previous = self._images.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.width * previous.height * len(previous.getbands())
+        self._images[key] = image
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(self._images) > 1:
+            _, evicted = self._images.popitem(last=False)
+            self._bytes -= evicted.width * evicted.height * len(evicted.getbands())
+
+    def cancel_pending(self, keep: Tuple[str, ...] = ()):
+        """取消尚未开始、且不在 keep 中的生成任务（快速翻页时不必等过时的图片）"""
+        keep = set(keep)
+        with self._lock:
+            for key, future in list(self._pending.items()):
+                if key[0] not in keep and future.cancel():
+                    del self._pending[key]
+
+    def close(self):
+        self.cancel_pending()
+        self._pool.shutdown(wait=False)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'images': len(self._images),
+                'mb': round(self._bytes / 1024 / 1024, 1),
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+            }
+
+
+class PreviewWindow(tk.Toplevel):
+    """处理前后对比预览窗口：左侧原图、右侧结果，←/→ 翻页"""
+
+    SETTLE_MS = 200  # 停止翻页多久后解码屏幕尺寸的图片
+    PREFETCH = 5  # 预取后面几张的缩略图
+
+    def __init__(self, parent, pairs: List[Tuple[str, str]], thumbnails: ImageCache, screen: ImageCache,
+                 start: int = 0):
+        """
+        Args:
+            parent: 父窗口
+            pairs: (原图, 结果) 路径列表
+            thumbnails: 缩略图缓存
+            screen: 屏幕尺寸图片缓存
+            start: 起始序号
+        """
+        super().__init__(parent)
+        self.title("处理结果对比")
+        self.geometry("1200x760")
+        self.pairs = pairs
+        self.thumbnails = thumbnails
+        self.screen = screen
+        self.index = 0
+        self._settle_job = None
+        self._shown_sizes: Dict[str, int] = {}  # 当前显示的图片来源尺寸（不用缩略图覆盖已显示的大图）
+
+        header = ttk.Frame(self, padding=(10, 10, 10, 0))
+        header.pack(fill=X)
+        self.title_var = tk.StringVar()
+        ttk.Label(header, textvariable=self.title_var, font=('Microsoft YaHei UI', 11, 'bold')).pack(side=LEFT)
+
+        body = ttk.Frame(self, padding=10)
+        body.pack(fill=BOTH, expand=True)
+        body.grid_rowconfigure(1, weight=1)
+        body.grid_columnconfigure(0, weight=1, uniform='side')
+        body.grid_columnconfigure(1, weight=1, uniform='side')
+        self.panels = []
+        for column, caption in enumerate(("原图", "去手写结果")):
+            ttk.Label(body, text=caption).grid(row=0, column=column, pady=(0, 5))
+            panel = ttk.Label(body, anchor='center', font=('Microsoft YaHei UI', 10))
+            panel.grid(row=1, column=column, sticky='nsew', padx=5)
+            self.panels.append(panel)
+
+        footer = ttk.Frame(self, padding=(10, 0, 10, 10))
+        footer.pack(fill=X)
+        ttk.Button(footer, text="◀ 上一张", command=lambda: self.show(self.index - 1),
+                   bootstyle="secondary").pack(side=LEFT)
+        ttk.Button(footer, text="下一张 ▶", command=lambda: self.show(self.index + 1),
+                   bootstyle="secondary").pack(side=LEFT, padx=(5, 0))
+        ttk.Label(footer, text="← / → 翻页，Home / End 跳到首尾").pack(side=RIGHT)
+
+        self.bind('<Left>', lambda e: self.show(self.index - 1))
+        self.bind('<Right>', lambda e: self.show(self.index + 1))
+        self.bind('<Prior>', lambda e: self.show(self.index - 10))
+        self.bind('<Next>', lambda e: self.show(self.index + 10))
+        self.bind('<Home>', lambda e: self.show(0))
+        self.bind('<End>', lambda e: self.show(len(self.pairs) - 1))
+        body.bind('<Configure>', lambda e: self._schedule_screen())
+
+        self.after(50, lambda: self.show(start))
+
+    def current_paths(self) -> Tuple[str, str]:
+        return self.pairs[self.index]
+
+    def show(self, index: int):
+        """显示第 index 组：先用缩略图，停止翻页后换成屏幕尺寸的图片"""
+        if not self.pairs:
+            return
+        self.index = max(0, min(index, len(self.pairs) - 1))
+        source, output = self.current_paths()
+        self.title_var.set(f"{self.index + 1}/{len(self.pairs)}  {Path(source).name}")
+        self._shown_sizes = {}
+
+        for panel, path in zip(self.panels, (source, output)):
+            image = self.screen.get(path) or self.thumbnails.request(path, self._on_ready)
+            self._display(panel, path, image)
+
+        # 预取附近的缩略图，放弃已经翻过去的
+        nearby = self.pairs[max(0, self.index - 2):self.index + self.PREFETCH + 1]
+        wanted = tuple(p for pair in nearby for p in pair)
+        self.thumbnails.cancel_pending(keep=wanted)
+        for path in wanted:
+            self.thumbnails.request(path)
+        self._schedule_screen()
+
+    def _schedule_screen(self):
+        if self._settle_job is not None:
+            self.after_cancel(self._settle_job)
+        self._settle_job = self.after(self.SETTLE_MS, self._load_screen)
+
+    def _load_screen(self):
+        self._settle_job = None
+        paths = self.current_paths()
+        self.screen.cancel_pending(keep=paths)
+        for panel, path in zip(self.panels, paths):
+            image = self.screen.request(path, self._on_ready)
+            if image is not None:
+                self._display(panel, path, image)
+
+    def _on_ready(self, path: str, image: Optional[Image.Image]):
+        # 在工作线程中调用，转到主线程更新界面
+        try:
+            self.after(0, lambda: self._refresh(path, image))
+        except (RuntimeError, tk.TclError):
+            pass
+
+    def _refresh(self, path: str, image: Optional[Image.Image]):
+        if not self.winfo_exists():
+            return
+        for panel, current in zip(self.panels, self.current_paths()):
+            if current != path:
+                continue
+            if image is None and path not in self._shown_sizes:
+                panel.config(image='', text="⚠️  无法预览该文件")
+                panel.image = None
+            else:
+                self._display(panel, path, image)
+
+    def _display(self, panel, path: str, image: Optional[Image.Image]):
+        if image is None:
+            if path in self._shown_sizes:
+                return
+            panel.config(image='', text="⏳ 加载中..." if Path(path).exists() else "⚠️  文件不存在")
+            panel.image = None
+            return
+        if max(image.size) < self._shown_sizes.get(path, 0):
+            return
+        self._shown_sizes[path] = max(image.size)
+
+        width = max(50, panel.winfo_width() - 4)
+        height = max(50, panel.winfo_height() - 4)
+        scale = min(width / image.width, height / image.height)
+        fitted = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+                              Image.Resampling.BILINEAR)
+        photo = ImageTk.PhotoImage(fitted)
+        panel.config(image=photo, text='')
+        panel.image = photo  # 保持引用
@@ -0,0 +1,127 @@
+"""
+扫码登录事件监听
+监听主框架导航、登录 Cookie 写入和二维码图片响应，登录状态可能变化时立即唤醒等待方，
+扫码后不必等到下一次轮询；二维码图片直接从网络响应中取出字节，不落地临时文件，
+页面自动刷新二维码时也能拿到新图片
+"""
+import asyncio
+import re
+from typing import Optional
+
+
+# 登录成功后百度写入的 Cookie
+LOGIN_COOKIES = ('BDUSS', 'STOKEN')
+# Set-Cookie 中写入（而不是清除）登录 Cookie
+LOGIN_SET_COOKIE = re.compile(r'(?:^|[\s,])(?:%s)=[^;\s]' % '|'.join(LOGIN_COOKIES))
+
+# 二维码失效时点击页面上的刷新提示；返回是否点击了刷新
+REFRESH_EXPIRED_QRCODE = r'''
+() => {
+    const visible = (el) => el && el.getClientRects().length > 0;
+    const scope = document.querySelectorAll('[class*="qrcode"], [class*="Qrcode"], [id*="Qrcode"], [id*="qrcode"]');
+    for (const container of scope) {
+        if (!visible(container) || !/已失效|已过期|过期|失效/.test(container.textContent)) continue;
+        const target = [...container.querySelectorAll('a, button, span, p, div')]
+            .find(el => visible(el) && el.children.length === 0 && /刷新/.test(el.textContent)) || container;
+        target.click();
+        return true;
+    }
+    return false;
+}
+'''
+
+
+class LoginEventWatcher:
+    """
+    登录过程中的页面事件监听
+
+    用法：
+        watcher = LoginEventWatcher(page)
+        watcher.attach()
+        await watcher.snapshot_cookies()
+        try:
+            while ...:
+                watcher.changed.clear()
+                ...  # 检查登录状态、显示 watcher.qrcode_bytes
+                await watcher.wait(超时)
+        finally:
+            watcher.detach()
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.changed = asyncio.Event()
+        self.qrcode_bytes: Optional[bytes] = None
+        self.qrcode_version = 0  # 每收到一张新二维码加 1
+        self.login_cookie_seen = False
+        self.navigations = 0
+        self._initial_cookies: Optional[dict] = None  # 开始登录时已有的登录 Cookie（可能是过期的旧值）
+
+    def attach(self):
+        self.page.on('framenavigated', self._on_navigated)
+        self.page.on('response', self._on_response)
+
+    def detach(self):
+        for event, handler in (('framenavigated', self._on_navigated), ('response', self._on_response)):
+            try:
+                self.page.remove_listener(event, handler)
+            except Exception:
+                pass
+
+    def _on_navigated(self, frame):
+        if frame.parent_frame is None:
+            self.navigations += 1
+            self.changed.set()
+
+    async def _on_response(self, response):
+        try:
+            # response.headers 不含 set-cookie，需要单独取（多个 Set-Cookie 以换行连接）
+            if not self.login_cookie_seen:
+                set_cookie = await response.header_value('set-cookie') or ''
+                if LOGIN_SET_COOKIE.search(set_cookie):
+                    self.login_cookie_seen = True
+                    self.changed.set()
+                    return
+
+            if response.request.resource_type != 'image' or 'qrcode' not in response.url.lower():
+                return
+            body = await response.body()
+            if body and body != self.qrcode_bytes:
+                self.qrcode_bytes = body
+                self.qrcode_version += 1
+                self.changed.set()
+        except Exception:
+            # 页面关闭或响应体已释放时忽略
+            pass
+
+    async def _login_cookies(self) -> dict:
+        cookies = await self.page.context.cookies()
+        return {c['name']: c['value'] for c in cookies if c['name'] in LOGIN_COOKIES and c['value']}
+
+    async def snapshot_cookies(self):
+        """记下开始登录时已有的登录 Cookie，之后只有新写入的值才算登录"""
+        try:
+            self._initial_cookies = await self._login_cookies()
+        except Exception:
+            self._initial_cookies = {}
+
+    async def poll_cookies(self) -> bool:
+        """直接检查浏览器上下文中是否写入了新的登录 Cookie（响应头里没看到时的兜底）"""
+        if self._initial_cookies is None:
+            await self.snapshot_cookies()
+            return self.login_cookie_seen
+        try:
+            current = await self._login_cookies()
+        except Exception:
+            return self.login_cookie_seen
+        if any(self._initial_cookies.get(name) != value for name, value in current.items()):
+            self.login_cookie_seen = True
+        return self.login_cookie_seen
+
+    async def wait(self, timeout: float) -> bool:
+        """等待下一个事件；超时返回 False"""
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
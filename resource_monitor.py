@@ -0,0 +1,137 @@
+"""
+浏览器资源监控
+长时间运行时 Chromium 的内存会持续增长（结果图片以 data: URL 留在页面中、DOM 状态累积）。
+定期采样浏览器进程树的内存和 CPU（需要 psutil），并通过 CDP 读取每个页面的 JS 堆大小；
+超过上限或处理张数达到阈值时，在两张图片之间回收页面或浏览器上下文，不丢失进行中的任务
+"""
+import time
+from collections import deque
+from typing import Dict, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# Chromium 各进程名（chrome / chromium / chrome-headless-shell / headless_shell）
+BROWSER_PROCESS_NAMES = ('chrom', 'headless_shell')
+
+
+class ResourceMonitor:
+    """浏览器内存/CPU 采样与回收决策（同一浏览器的所有页面共享）"""
+
+    def __init__(self, max_rss_mb: float = 3072, max_heap_mb: float = 512, recycle_every: int = 200,
+                 heap_check_every: int = 10, sample_interval: float = 60.0, history: int = 1440):
+        """
+        Args:
+            max_rss_mb: 浏览器进程树内存上限（MB），超过后回收所有页面（顺序处理时回收整个上下文）
+            max_heap_mb: 单个页面 JS 堆上限（MB），超过后回收该页面
+            recycle_every: 每个页面处理多少张图片后回收（0 表示不按张数回收）
+            heap_check_every: 每个页面每处理多少张图片读取一次 JS 堆
+            sample_interval: 浏览器进程采样间隔（秒）
+            history: 保留的采样记录数（默认 1 分钟一次保留一天）
+        """
+        self.max_rss_mb = max_rss_mb
+        self.max_heap_mb = max_heap_mb
+        self.recycle_every = recycle_every
+        self.heap_check_every = max(1, heap_check_every)
+        self.sample_interval = sample_interval
+        self.history = deque(maxlen=history)
+
+        # 浏览器内存超限时加 1，各页面发现自己的代数落后即在下一张图片前回收
+        self.generation = 0
+        self.page_recycles = 0
+        self.context_recycles = 0
+        self.peak_rss_mb = 0.0
+        self.peak_heap_mb = 0.0
+        self.cdp_available = True
+        self._last_sample = 0.0
+        self._processes: Dict[int, 'psutil.Process'] = {}
+        self._heap_mb: Dict[int, float] = {}  # 页面 -> 最近一次读取的 JS 堆
+
+    def _browser_processes(self) -> list:
+        """当前进程启动的所有 Chromium 进程（进程对象跨采样复用，CPU 占用才有意义）"""
+        alive = {}
+        for child in psutil.Process().children(recursive=True):
+            try:
+                name = child.name().lower()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            if any(part in name for part in BROWSER_PROCESS_NAMES):
+                alive[child.pid] = self._processes.get(child.pid, child)
+        self._processes = alive
+        return list(alive.values())
+
+    def sample(self, images: int = 0, force: bool = False) -> Optional[dict]:
+        """
+        采样浏览器进程树（距上次采样不足 sample_interval 时跳过）
+
+        Args:
+            images: 到目前为止处理的图片数（写入采样记录）
+            force: 忽略采样间隔
+
+        Returns:
+            dict: 本次采样记录；跳过时返回 None
+        """
+        now = time.time()
+        if not force and now - self._last_sample < self.sample_interval:
+            return None
+        self._last_sample = now
+
+        record = {
+            'time': now,
+            'images': images,
+            'rss_mb': None,
+            'cpu_percent': None,
+            'processes': None,
+            'heap_mb': round(sum(self._heap_mb.values()), 1) if self._heap_mb else None,
+        }
+        if psutil is not None:
+            rss = 0
+            cpu = 0.0
+            processes = self._browser_processes()
+            for process in processes:
+                try:
+                    rss += process.memory_info().rss
+                    cpu += process.cpu_percent(None)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+            record['rss_mb'] = round(rss / 1024 / 1024, 1)
+            record['cpu_percent'] = round(cpu, 1)
+            record['processes'] = len(processes)
+            self.peak_rss_mb = max(self.peak_rss_mb, record['rss_mb'])
+
+            if record['rss_mb'] > self.max_rss_mb:
+                self.generation += 1
+                print(f"   🧹 浏览器内存 {record['rss_mb']:.0f}MB 超过上限 {self.max_rss_mb:.0f}MB，"
+                      f"将在下一张图片前回收页面")
+
+        self.history.append(record)
+        parts = [f"已处理 {images} 张"]
+        if record['rss_mb'] is not None:
+            parts.append(f"浏览器内存 {record['rss_mb']:.0f}MB（{record['processes']} 个进程，CPU {record['cpu_percent']:.0f}%）")
+        if record['heap_mb'] is not None:
+            parts.append(f"JS 堆 {record['heap_mb']:.0f}MB")
+        print(f"   📈 资源占用: {'，'.join(parts)}")
+        return record
+
+    def record_heap(self, page_key: int, heap_mb: float):
+        """记录页面的 JS 堆大小"""
+        self._heap_mb[page_key] = heap_mb
+        self.peak_heap_mb = max(self.peak_heap_mb, heap_mb)
+
+    def forget_page(self, page_key: int):
+        self._heap_mb.pop(page_key, None)
+
+    def snapshot(self) -> dict:
+        """峰值、回收次数和最近的采样记录"""
+        return {
+            'peak_rss_mb': self.peak_rss_mb,
+            'peak_heap_mb': round(self.peak_heap_mb, 1),
+            'page_recycles': self.page_recycles,
+            'context_recycles': self.context_recycles,
+            'psutil': psutil is not None,
+            'cdp': self.cdp_available,
+            'history': list(self.history)[-60:],
+        }
@@ -0,0 +1,156 @@
+"""
+图片处理顺序调度
+批量处理时不再按文件对话框或 rglob 返回的顺序依次处理：
+
+- 优先级：可按文件或文件夹指定，高优先级先处理
+- 短作业优先：同一文件夹、同一优先级内按文件大小从小到大处理，降低平均完成时间
+- 文件夹轮转：一次处理多个文件夹时，同优先级的文件夹轮流推进，小文件夹不必等大文件夹处理完；
+  等待越久有效优先级越高，低优先级文件夹不会饿死
+- 截止时间：按当前平均耗时估算，来不及完成时该文件夹立即插队，并按截止时间先后处理
+"""
+import heapq
+import itertools
+import math
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def _lookup(mapping: Optional[dict], path: str):
+    """按文件路径或其所在的任意上级文件夹查找设置（最具体的匹配优先）"""
+    if not mapping:
+        return None
+    current = Path(path)
+    for candidate in [current, *current.parents]:
+        for key in (str(candidate), str(candidate.resolve()) if candidate.exists() else None):
+            if key is not None and key in mapping:
+                return mapping[key]
+    return None
+
+
+class _Group:
+    """一个文件夹中等待处理的图片"""
+
+    def __init__(self, key: str, created: float):
+        self.key = key
+        self.created = created
+        self.last_served = 0.0
+        self.served_order = -1  # 最近一次被选中的序号（同一时刻多次选取时用于轮转）
+        self.heap: list = []
+        self.deadline_items = 0
+
+    def head(self):
+        return self.heap[0] if self.heap else None
+
+
+class ImageScheduler:
+    """优先级 + 截止时间 + 短作业优先 + 文件夹轮转的图片调度器"""
+
+    def __init__(self, aging_seconds: float = 60.0, parallelism: int = 1, estimated_seconds: float = 30.0):
+        """
+        Args:
+            aging_seconds: 文件夹等待多久相当于提升一级优先级
+            parallelism: 同时处理的图片数（估算能否赶上截止时间）
+            estimated_seconds: 单张图片的初始估计耗时（之后按实际耗时更新）
+        """
+        self.aging_seconds = aging_seconds
+        self.parallelism = max(1, parallelism)
+        self.avg_seconds = estimated_seconds
+        self._groups: Dict[str, _Group] = {}
+        self._seq = itertools.count()
+        self._served = itertools.count()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, path: str, priority: int = 0, deadline: Optional[float] = None,
+            group: Optional[str] = None, cost: Optional[float] = None):
+        """
+        加入一张图片
+
+        Args:
+            path: 图片路径
+            priority: 优先级（越大越先处理）
+            deadline: 截止时间（time.time() 时间戳）
+            group: 轮转分组（默认按所在文件夹）
+            cost: 作业大小（默认取文件字节数）
+        """
+        path = str(path)
+        if cost is None:
+            try:
+                cost = os.path.getsize(path)
+            except OSError:
+                cost = 0
+        key = group if group is not None else str(Path(path).parent)
+        entry = self._groups.get(key)
+        if entry is None:
+            entry = self._groups[key] = _Group(key, time.time())
+        heapq.heappush(entry.heap, (-priority, deadline if deadline is not None else math.inf,
+                                    cost, next(self._seq), path))
+        if deadline is not None:
+            entry.deadline_items += 1
+        self._size += 1
+
+    def add_many(self, paths: List[str], priorities: Optional[Dict[str, int]] = None,
+                 deadlines: Optional[Dict[str, float]] = None, priority: int = 0,
+                 deadline: Optional[float] = None, keep_order: bool = False):
+        """
+        批量加入图片
+
+        Args:
+            paths: 图片路径
+            priorities: 文件或文件夹路径 -> 优先级
+            deadlines: 文件或文件夹路径 -> 截止时间戳
+            priority: 未在 priorities 中指定时的优先级
+            deadline: 未在 deadlines 中指定时的截止时间
+            keep_order: 保持输入顺序（不按文件夹轮转和文件大小排序，优先级和截止时间仍然生效）
+        """
+        for position, path in enumerate(paths):
+            item_priority = _lookup(priorities, str(path))
+            item_deadline = _lookup(deadlines, str(path))
+            self.add(path, priority if item_priority is None else item_priority,
+                     deadline if item_deadline is None else item_deadline,
+                     group='' if keep_order else None, cost=position if keep_order else None)
+
+    def _at_risk(self, entry: _Group, now: float) -> bool:
+        """按平均耗时估算，该文件夹中有截止时间的图片是否已经来不及按正常顺序处理"""
+        head = entry.head()
+        if head is None or head[1] == math.inf:
+            return False
+        needed = entry.deadline_items * self.avg_seconds / self.parallelism
+        return head[1] - now <= needed
+
+    def pop(self) -> Optional[str]:
+        """取出下一张要处理的图片；没有图片时返回 None"""
+        now = time.time()
+        candidates = [g for g in self._groups.values() if g.heap]
+        if not candidates:
+            return None
+
+        def rank(entry: _Group):
+            head = entry.head()
+            waited = now - max(entry.last_served, entry.created)
+            at_risk = self._at_risk(entry, now)
+            return (
+                at_risk,
+                -head[1] if at_risk else 0,  # 来不及的文件夹之间按截止时间先后
+                -head[0] + waited / self.aging_seconds,
+                -entry.served_order,
+            )
+
+        entry = max(candidates, key=rank)
+        item = heapq.heappop(entry.heap)
+        if item[1] != math.inf:
+            entry.deadline_items -= 1
+        entry.last_served = now
+        entry.served_order = next(self._served)
+        self._size -= 1
+        if not entry.heap:
+            del self._groups[entry.key]
+        return item[4]
+
+    def observe(self, seconds: float):
+        """记录一张图片的实际耗时（指数滑动平均），用于估算能否赶上截止时间"""
+        self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * seconds
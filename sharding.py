@@ -0,0 +1,272 @@
+"""
+多进程分片执行
+M 个工作进程各自运行独立的事件循环、BaiduPicFilter 和浏览器（可使用各自的账号 Cookie），
+协调进程每次给空闲的工作进程派发一张图片（动态负载均衡），并记录每个进程手上的图片：
+进程意外退出时它手上的图片一定能找回并重新派发，处理结果和统计信息汇总回协调进程
+
+用法：
+    python sharding.py 图片或文件夹 [...] -o ./output -w 4
+    python sharding.py ./scans -w 4 --cookie-file a.json --cookie-file b.json
+"""
+import argparse
+import asyncio
+import multiprocessing
+import queue
+import socket
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from document_input import collect_input_files
+
+
+def _worker_main(worker_id: int, task_queue, result_queue, client_options: dict):
+    """工作进程入口：独立事件循环 + 独立浏览器"""
+    try:
+        asyncio.run(_worker_async(worker_id, task_queue, result_queue, client_options))
+    except Exception as e:
+        result_queue.put(('error', worker_id, str(e)))
+
+
+async def _worker_async(worker_id: int, task_queue, result_queue, client_options: dict):
+    from baidu_automation import BaiduPicFilter
+
+    client = BaiduPicFilter(**client_options)
+    # 各工作进程共用输出文件夹（可能在网络共享盘上）：每个进程写自己的结果清单
+    client.manifest_node = f"{socket.gethostname()}-shard{worker_id}"
+    loop = asyncio.get_event_loop()
+    try:
+        await client.start()
+        await client.ensure_login()
+        result_queue.put(('ready', worker_id, None))
+
+        while True:
+            # 阻塞的跨进程队列放到线程里等待，不阻塞本进程的事件循环
+            item = await loop.run_in_executor(None, task_queue.get)
+            if item is None:
+                break
+
+            index, total, image_path = item
+            started = time.monotonic()
+            success = await client.process_image(image_path, index, total)
+            result_queue.put(('result', worker_id, {
+                'path': image_path,
+                'success': success,
+                'elapsed': time.monotonic() - started,
+            }))
+
+        await client.flush_outputs()
+        result_queue.put(('stats', worker_id, client.get_stats()))
+    finally:
+        await client.close()
+
+
+def merge_stats(stats_list: List[dict]) -> dict:
+    """汇总多个客户端的统计信息：数值相加，失败文件列表合并"""
+    merged = {'total': 0, 'success': 0, 'failed': 0, 'failed_files': []}
+    for stats in stats_list:
+        for key, value in stats.items():
+            if isinstance(value, bool):
+                continue
+            if isinstance(value, (int, float)):
+                merged[key] = merged.get(key, 0) + value
+            elif isinstance(value, list):
+                merged.setdefault(key, []).extend(value)
+    return merged
+
+
+class ShardCoordinator:
+    """多进程分片协调器"""
+
+    def __init__(self, workers: int = 2, output_dir: str = "./output", headless: bool = True,
+                 cookie_files: Optional[List[str]] = None, **client_options):
+        """
+        Args:
+            workers: 工作进程数（每个进程一个浏览器）
+            output_dir: 输出文件夹
+            headless: 工作进程的浏览器是否无头运行
+            cookie_files: 各工作进程使用的Cookie文件（账号），按进程序号轮流分配；
+                          多个进程共用同一账号时，Cookie失效后只应由一个进程重新登录
+            client_options: 传给 BaiduPicFilter 的其他参数（需可 pickle）
+        """
+        self.workers = max(1, workers)
+        self.cookie_files = cookie_files or ["baidu_cookies.json"]
+        self.client_options = dict(client_options, output_dir=output_dir, headless=headless)
+        self.stats: dict = {}
+        self.worker_stats: dict = {}
+
+    def run(self, image_paths: List[str], on_result: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        分片处理一批图片（阻塞直到全部完成）
+
+        Args:
+            image_paths: 图片路径列表
+            on_result: 每张图片完成时的回调，参数包含 path / success / elapsed / worker
+
+        Returns:
+            dict: 汇总后的统计信息
+        """
+        # 重复的路径（例如同时给出文件夹和其中的文件）只处理一次，否则完成数永远达不到总数
+        image_paths = list(dict.fromkeys(str(p) for p in image_paths))
+        total = len(image_paths)
+        worker_count = min(self.workers, total) or 1
+        # spawn 方式启动，避免 fork 继承事件循环和浏览器驱动的状态
+        ctx = multiprocessing.get_context('spawn')
+        result_queue = ctx.Queue()
+        positions = {image_path: index for index, image_path in enumerate(image_paths, 1)}
+
+        processes = {}
+        try:
+            self._run_workers(ctx, processes, worker_count, result_queue, positions, total, on_result)
+        finally:
+            # 非守护进程（工作进程内部还要启动编码/分块进程池），需要显式回收
+            for process in processes.values():
+                process.join(timeout=10)
+            for process in processes.values():
+                if process.is_alive():
+                    print(f"⚠️  工作进程 {process.name} 未能按时退出，强制结束")
+                    process.terminate()
+                    process.join(timeout=5)
+        return self.stats
+
+    def _run_workers(self, ctx, processes: dict, worker_count: int, result_queue,
+                     positions: dict, total: int, on_result: Optional[Callable[[dict], None]]):
+        """启动工作进程，逐张派发图片并收集结果，直到所有工作进程结束"""
+        task_queues = {}  # 每个工作进程一个任务队列：派发给谁由协调进程记录，不依赖进程自己上报
+        for worker_id in range(worker_count):
+            options = dict(self.client_options, cookie_file=self.cookie_files[worker_id % len(self.cookie_files)])
+            task_queues[worker_id] = ctx.Queue()
+            process = ctx.Process(target=_worker_main, args=(worker_id, task_queues[worker_id], result_queue, options),
+                                  name=f"rhw-shard-{worker_id}")
+            process.start()
+            processes[worker_id] = process
+
+        print(f"🚀 已启动 {worker_count} 个工作进程，共 {total} 张图片")
+
+        pending = deque(positions)  # 尚未派发的图片
+        assigned = {}  # worker_id -> 已派发、尚未收到结果的图片
+        idle = set()  # 已就绪、手上没有图片的工作进程
+        done = 0
+        failed_files = []
+        self.worker_stats = {}
+        finished = set()
+        dead = set()
+        stopped = set()  # 已发送结束标记的工作进程
+        last_check = time.monotonic()
+
+        def dispatch():
+            """给空闲的进程派发图片；没有剩余图片且没有进程在处理时让空闲进程退出"""
+            while idle and pending:
+                worker_id = idle.pop()
+                image_path = pending.popleft()
+                assigned[worker_id] = image_path
+                task_queues[worker_id].put((positions[image_path], total, image_path))
+            if not pending and not assigned:
+                # 处理中的图片可能因进程退出被放回，全部完成前空闲进程继续等待
+                for worker_id in idle - stopped:
+                    task_queues[worker_id].put(None)
+                    stopped.add(worker_id)
+
+        def lose(worker_id: int):
+            """进程退出：它手上的图片放回队首，交给其他进程"""
+            dead.add(worker_id)
+            idle.discard(worker_id)
+            lost = assigned.pop(worker_id, None)
+            if lost:
+                print(f"   ↩️  重新分配: {Path(lost).name}")
+                pending.appendleft(lost)
+            dispatch()
+
+        while len(finished | dead) < worker_count:
+            try:
+                kind, worker_id, payload = result_queue.get(timeout=1)
+            except queue.Empty:
+                kind = None
+
+            # 即使结果不断到达也定期检查意外退出的进程
+            if kind is None or time.monotonic() - last_check > 1:
+                last_check = time.monotonic()
+                for dead_id, process in processes.items():
+                    if dead_id in finished or dead_id in dead or process.is_alive():
+                        continue
+                    print(f"⚠️  工作进程 {dead_id} 意外退出（退出码 {process.exitcode}）")
+                    lose(dead_id)
+            if kind is None or worker_id in dead:
+                continue
+
+            if kind == 'ready':
+                print(f"   ✓ 工作进程 {worker_id} 已就绪")
+                idle.add(worker_id)
+                dispatch()
+            elif kind == 'result':
+                if assigned.get(worker_id) != payload['path']:
+                    continue  # 不是协调进程派发给它的图片（不应发生）
+                del assigned[worker_id]
+                done += 1
+                payload['worker'] = worker_id
+                status = '✅' if payload['success'] else '❌'
+                if not payload['success']:
+                    failed_files.append(Path(payload['path']).name)
+                print(f"{status} [{done}/{total}] 进程{worker_id}: {Path(payload['path']).name} "
+                      f"({payload['elapsed']:.1f}s)")
+                if on_result:
+                    on_result(payload)
+                idle.add(worker_id)
+                dispatch()
+            elif kind == 'stats':
+                self.worker_stats[worker_id] = payload
+                finished.add(worker_id)
+            elif kind == 'error':
+                print(f"❌ 工作进程 {worker_id} 出错: {payload}")
+                lose(worker_id)
+
+        # 成功/失败以协调进程收到的逐张结果为准（意外退出的进程不会上报统计）
+        self.stats = merge_stats(list(self.worker_stats.values()))
+        self.stats['total'] = total
+        self.stats['success'] = done - len(failed_files)
+        self.stats['failed'] = len(failed_files)
+        self.stats['failed_files'] = failed_files
+        # 所有工作进程都退出后仍未处理的图片
+        self.stats['unprocessed'] = total - done
+        self.stats['workers'] = {wid: {'success': s['success'], 'failed': s['failed']}
+                                 for wid, s in self.worker_stats.items()}
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="多进程分片批量去手写")
+    parser.add_argument('inputs', nargs='+', help="图片文件或文件夹")
+    parser.add_argument('-o', '--output', default="./output", help="输出文件夹")
+    parser.add_argument('-w', '--workers', type=int, default=max(1, multiprocessing.cpu_count() // 4),
+                        help="工作进程数（每个进程一个浏览器）")
+    parser.add_argument('--cookie-file', action='append', dest='cookie_files',
+                        help="账号Cookie文件，可重复指定，按进程轮流分配")
+    parser.add_argument('--concurrency', type=int, default=1, help="每个进程内的并行页数")
+    parser.add_argument('--show-browser', action='store_true', help="显示浏览器窗口")
+    args = parser.parse_args()
+
+    image_paths = collect_input_files(args.inputs)
+    if not image_paths:
+        print("⚠️  未找到有效的图片文件")
+        return
+
+    coordinator = ShardCoordinator(
+        workers=args.workers,
+        output_dir=args.output,
+        headless=not args.show_browser,
+        cookie_files=args.cookie_files,
+        concurrency=args.concurrency,
+    )
+    stats = coordinator.run(image_paths)
+
+    print(f"\n{'='*60}")
+    print(f"📊 总数: {stats['total']}  ✅ 成功: {stats['success']}  ❌ 失败: {stats['failed']}"
+          f"  ⏸️  未处理: {stats['unprocessed']}")
+    for name in stats['failed_files']:
+        print(f"  - {name}")
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
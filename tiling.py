@@ -0,0 +1,165 @@
+"""
+大图分块处理
+将超大扫描件切分为带重叠的图块，分别去手写后再羽化拼接回原始分辨率
+
+切分和拼接都是纯 CPU 工作，设计为可在进程池中运行（参数和返回值均可 pickle）
+"""
+import math
+from pathlib import Path
+from typing import List, Optional
+
+from PIL import Image, ImageChops, ImageOps
+
+
+def needs_tiling(image_path: str, max_side: int = 4096, max_pixels: int = 16_000_000) -> bool:
+    """
+    判断图片是否需要分块（只读取文件头，不解码像素）
+
+    Args:
+        image_path: 图片路径
+        max_side: 允许直接上传的最长边
+        max_pixels: 允许直接上传的最大像素数
+
+    Returns:
+        bool: 是否超过限制
+    """
+    try:
+        with Image.open(image_path) as img:
+            width, height = img.size
+    except Exception:
+        return False
+    return max(width, height) > max_side or width * height > max_pixels
+
+
+def _tile_positions(length: int, tile: int, overlap: int) -> List[int]:
+    """计算一个方向上各图块的起点，均匀分布且相邻重叠不小于 overlap"""
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - overlap) / (tile - overlap))
+    count = max(count, 2)
+    span = length - tile
+    return [round(i * span / (count - 1)) for i in range(count)]
+
+
+def split_image(image_path: str, work_dir: str, tile_size: int = 2048, overlap: int = 128) -> dict:
+    """
+    将图片切分为带重叠的图块并写入工作目录
+
+    Args:
+        image_path: 原始图片路径
+        work_dir: 图块输出目录
+        tile_size: 图块边长（像素）
+        overlap: 相邻图块的重叠宽度（像素）
+
+    Returns:
+        dict: 分块方案，包含原图尺寸和每个图块的位置与路径
+    """
+    work = Path(work_dir)
+    work.mkdir(parents=True, exist_ok=True)
+
+    with Image.open(image_path) as src:
+        is_jpeg = src.format == 'JPEG'
+        img = ImageOps.exif_transpose(src).convert('RGB')
+
+    width, height = img.size
+    suffix = '.jpg' if is_jpeg else '.png'
+    xs = _tile_positions(width, tile_size, overlap)
+    ys = _tile_positions(height, tile_size, overlap)
+
+    tiles = []
+    for row, y in enumerate(ys):
+        for col, x in enumerate(xs):
+            w = min(tile_size, width - x)
+            h = min(tile_size, height - y)
+            tile_path = work / f"tile_r{row:02d}_c{col:02d}{suffix}"
+            tile = img.crop((x, y, x + w, y + h))
+            if is_jpeg:
+                tile.save(tile_path, 'JPEG', quality=95)
+            else:
+                tile.save(tile_path, 'PNG')
+            tiles.append({'row': row, 'col': col, 'box': (x, y, w, h), 'path': str(tile_path)})
+
+    img.close()
+    return {
+        'source': str(image_path),
+        'size': (width, height),
+        'rows': len(ys),
+        'cols': len(xs),
+        'overlap': overlap,
+        'tiles': tiles,
+    }
+
+
+def _ramp(width: int, height: int, horizontal: bool) -> Image.Image:
+    """生成线性渐变：水平方向自左向右、垂直方向自上而下由 0 过渡到 255"""
+    gradient = Image.linear_gradient('L')  # 自上而下由黑到白
+    if horizontal:
+        gradient = gradient.rotate(90)  # 逆时针旋转后自左向右由黑到白
+    return gradient.resize((width, height))
+
+
+def _feather_mask(size: tuple, left: int, top: int) -> Optional[Image.Image]:
+    """生成图块的羽化遮罩：左/上重叠区从 0 线性过渡到 255，其余为 255"""
+    width, height = size
+    if not left and not top:
+        return None
+
+    mask = Image.new('L', size, 255)
+    if left:
+        mask.paste(_ramp(left, height, horizontal=True), (0, 0))
+    if top:
+        top_mask = Image.new('L', size, 255)
+        top_mask.paste(_ramp(width, top, horizontal=False), (0, 0))
+        # 左上角同时存在两个方向的重叠，取两者乘积保证平滑
+        mask = ImageChops.multiply(mask, top_mask)
+    return mask
+
+
+def stitch_tiles(plan: dict, result_paths: List[str], output_path: str, quality: int = 95) -> str:
+    """
+    将处理后的图块按分块方案羽化拼接为完整图片
+
+    逐块读取并粘贴，内存占用约为一张完整画布加一个图块
+
+    Args:
+        plan: split_image 返回的分块方案
+        result_paths: 与 plan['tiles'] 一一对应的处理结果路径
+        output_path: 拼接结果保存路径
+        quality: JPEG 输出质量
+
+    Returns:
+        str: 输出路径
+    """
+    canvas = Image.new('RGB', tuple(plan['size']), 'white')
+    boxes = {(t['row'], t['col']): t['box'] for t in plan['tiles']}
+
+    for tile_info, result_path in zip(plan['tiles'], result_paths):
+        x, y, w, h = tile_info['box']
+        row, col = tile_info['row'], tile_info['col']
+
+        with Image.open(result_path) as result:
+            tile = result.convert('RGB')
+        # 服务端可能缩小了图块，还原到原始尺寸
+        if tile.size != (w, h):
+            tile = tile.resize((w, h), Image.Resampling.LANCZOS)
+
+        # 与左侧、上方已粘贴图块的实际重叠宽度
+        left = top = 0
+        if col > 0:
+            px, _, pw, _ = boxes[(row, col - 1)]
+            left = max(0, min(px + pw - x, w))
+        if row > 0:
+            _, py, _, ph = boxes[(row - 1, col)]
+            top = max(0, min(py + ph - y, h))
+
+        canvas.paste(tile, (x, y), _feather_mask((w, h), left, top))
+        tile.close()
+
+    output = Path(output_path)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if output.suffix.lower() in ('.jpg', '.jpeg'):
+        canvas.save(output, 'JPEG', quality=quality)
+    else:
+        canvas.save(output)
+    canvas.close()
+    return str(output)
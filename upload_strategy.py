@@ -0,0 +1,80 @@
+"""
+上传方式选择
+页面上可能有多种上传入口（文件输入框、登录检查遮罩层、上传按钮、文字按钮），
+记住当前页面布局下成功的方式并优先使用，按方式统计成功次数和耗时
+"""
+from typing import Dict, Iterable, List, Optional
+
+
+# 方式名 -> (选择器, 类型, 日志名称)；类型 'input' 直接设置文件，'chooser' 点击后等待文件选择框
+STRATEGIES = {
+    'input': ('input[type="file"][accept*="image"]', 'input', '文件输入框'),
+    'mask': ('.aiTools-upload-file__login-check', 'chooser', '遮罩层'),
+    'button': ('button.aiTools-upload-local__button', 'chooser', '按钮'),
+    'text': ('text=/选择本地图片|选择|上传/i', 'chooser', '文字按钮'),
+}
+
+DEFAULT_ORDER = ('input', 'mask', 'button', 'text')
+
+
+class UploadStrategyLearner:
+    """记录各上传方式的效果，决定尝试顺序（同一浏览器的所有页面共享）"""
+
+    def __init__(self, demote_after: int = 2):
+        """
+        Args:
+            demote_after: 首选方式连续失败多少次后不再优先
+        """
+        self.demote_after = demote_after
+        self.preferred: Optional[str] = None
+        self.counters: Dict[str, dict] = {
+            name: {'success': 0, 'failed': 0, 'seconds': 0.0, 'streak': 0} for name in STRATEGIES
+        }
+
+    def _success_rate(self, name: str) -> float:
+        counter = self.counters[name]
+        attempts = counter['success'] + counter['failed']
+        # 没有记录的方式视为中等，排在成功过的方式之后、总是失败的方式之前
+        return counter['success'] / attempts if attempts else 0.5
+
+    def order(self, available: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        尝试顺序：首选方式在前，其余按成功率排序，成功率相同时按默认顺序
+
+        Args:
+            available: 页面上当前存在的方式（None 表示全部）
+        """
+        names = [n for n in DEFAULT_ORDER if available is None or n in available]
+        names.sort(key=lambda n: (n != self.preferred, -self._success_rate(n), DEFAULT_ORDER.index(n)))
+        return names
+
+    def record(self, name: str, success: bool, seconds: float):
+        """记录一次尝试结果"""
+        counter = self.counters[name]
+        counter['seconds'] += seconds
+        if success:
+            counter['success'] += 1
+            counter['streak'] = 0
+            if self.preferred != name:
+                print(f"   ℹ️  上传方式改为优先使用: {STRATEGIES[name][2]}")
+            self.preferred = name
+        else:
+            counter['failed'] += 1
+            counter['streak'] += 1
+            if self.preferred == name and counter['streak'] >= self.demote_after:
+                self.preferred = None
+
+    def snapshot(self) -> dict:
+        """各方式的成功/失败次数和平均耗时"""
+        result = {}
+        for name, counter in self.counters.items():
+            attempts = counter['success'] + counter['failed']
+            if not attempts:
+                continue
+            result[name] = {
+                'success': counter['success'],
+                'failed': counter['failed'],
+                'avg_seconds': round(counter['seconds'] / attempts, 2),
+                'preferred': name == self.preferred,
+            }
+        return result